@@ -47,19 +47,47 @@ class Config:
     # Pi-hole - Optional with defaults
     PIHOLE_API: str = ""
     PIHOLE_PASSWORD: str = ""
+    PIHOLE_CACHE_TTL: float = 10.0
+    DNS_SERVER: str = ""
 
     # Paths - Optional with defaults
     DATA_DIR: str = ""
     DEVICES_DB: str = ""
+    OUI_DB: str = ""
+    DEVICES_FLUSH_INTERVAL: int = 30
 
     # Network - Optional with defaults
     LOCAL_NETWORK: str = ""
     PI_IP: str = ""
     GATEWAY: str = ""
+    NETWORK_INTERFACE: str = ""
+
+    # Barrido ARP nativo
+    ARP_RATE: int = 300
+    ARP_RETRIES: int = 2
+
+    # Escaneo TCP connect nativo
+    PORT_SCAN_CONCURRENCY: int = 128
+    PORT_SCAN_TIMEOUT: float = 1.0
+
+    # Historial de dispositivos: límites y caducidad
+    HISTORY_MAX_DEVICES: int = 5000
+    HISTORY_MAX_AGE_DAYS: int = 365
+    HISTORY_RANDOM_MAC_MAX_AGE_DAYS: int = 30
+    NETWORK_CACHE_MAX: int = 1000
+
+    # Pi-hole - Ficheros montados desde el host
+    DHCP_LEASES_FILE: str = "/etc/pihole/dhcp.leases"
+    PIHOLE_FTL_DB: str = "/etc/pihole/pihole-FTL.db"
+
+    # Docker Engine API
+    DOCKER_SOCKET: str = "/var/run/docker.sock"
 
     # Monitoring - Optional with defaults
     SCAN_INTERVAL: int = 300
     TEMP_ALERT_THRESHOLD: float = 75.0
+    SYSTEM_SAMPLE_INTERVAL: float = 5.0
+    SYSTEM_SAMPLE_HISTORY: int = 720
 
     @classmethod
     def from_env(cls) -> "Config":
@@ -90,13 +118,31 @@ class Config:
             ALERT_CHAT_ID=alert_chat_id,
             PIHOLE_API=os.getenv("PIHOLE_API_URL", "http://localhost/api"),
             PIHOLE_PASSWORD=os.getenv("PIHOLE_PASSWORD", ""),
+            PIHOLE_CACHE_TTL=float(os.getenv("PIHOLE_CACHE_TTL", "10")),
+            DNS_SERVER=os.getenv("DNS_SERVER", ""),
             DATA_DIR=data_dir,
             DEVICES_DB=os.getenv("DEVICES_DB", f"{data_dir}/devices.json"),
+            OUI_DB=os.getenv("OUI_DB", f"{data_dir}/oui.bin"),
+            DEVICES_FLUSH_INTERVAL=int(os.getenv("DEVICES_FLUSH_INTERVAL", "30")),
             LOCAL_NETWORK=network_range,
             PI_IP=pi_ip,
             GATEWAY=gateway,
+            NETWORK_INTERFACE=os.getenv("NETWORK_INTERFACE", ""),
+            ARP_RATE=int(os.getenv("ARP_RATE", "300")),
+            ARP_RETRIES=int(os.getenv("ARP_RETRIES", "2")),
+            PORT_SCAN_CONCURRENCY=int(os.getenv("PORT_SCAN_CONCURRENCY", "128")),
+            PORT_SCAN_TIMEOUT=float(os.getenv("PORT_SCAN_TIMEOUT", "1.0")),
+            HISTORY_MAX_DEVICES=int(os.getenv("HISTORY_MAX_DEVICES", "5000")),
+            HISTORY_MAX_AGE_DAYS=int(os.getenv("HISTORY_MAX_AGE_DAYS", "365")),
+            HISTORY_RANDOM_MAC_MAX_AGE_DAYS=int(os.getenv("HISTORY_RANDOM_MAC_MAX_AGE_DAYS", "30")),
+            NETWORK_CACHE_MAX=int(os.getenv("NETWORK_CACHE_MAX", "1000")),
+            DHCP_LEASES_FILE=os.getenv("DHCP_LEASES_FILE", "/etc/pihole/dhcp.leases"),
+            PIHOLE_FTL_DB=os.getenv("PIHOLE_FTL_DB", "/etc/pihole/pihole-FTL.db"),
+            DOCKER_SOCKET=os.getenv("DOCKER_SOCKET", "/var/run/docker.sock"),
             SCAN_INTERVAL=int(os.getenv("SCAN_INTERVAL", "300")),
             TEMP_ALERT_THRESHOLD=float(os.getenv("TEMP_ALERT_THRESHOLD", "75.0")),
+            SYSTEM_SAMPLE_INTERVAL=float(os.getenv("SYSTEM_SAMPLE_INTERVAL", "5")),
+            SYSTEM_SAMPLE_HISTORY=int(os.getenv("SYSTEM_SAMPLE_HISTORY", "720")),
         )
 
     @classmethod
@@ -1,5 +1,7 @@
 """Handlers de callbacks (botones inline)."""
+import asyncio
 import logging
+import httpx
 from telegram import Update
 from telegram.ext import ContextTypes, CallbackQueryHandler, Application
 
@@ -16,6 +18,15 @@ def is_authorized(user_id: int) -> bool:
     return user_id in config.AUTHORIZED_USERS
 
 
+async def docker_restart(system_svc: SystemService, name: str) -> bool:
+    """Reinicia un contenedor vía Docker Engine API."""
+    try:
+        return await system_svc.docker.restart(name)
+    except httpx.HTTPError as e:
+        logger.error(f"Error reiniciando {name}: {e}")
+        return False
+
+
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler principal de callbacks."""
     query = update.callback_query
@@ -49,7 +60,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ip_line = "🌐  Sin conexión"
 
         # Pi-hole
-        pihole_status = pihole_svc.get_status()
+        pihole_status = await pihole_svc.get_status_async()
         if pihole_status.get("online"):
             blocked = pihole_status.get("blocked_today", 0)
             enabled = pihole_status.get("enabled", True)
@@ -120,8 +131,10 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.network_menu())
 
     elif data == "menu:pihole":
-        stats = pihole_svc.get_stats()
-        status = pihole_svc.get_status()
+        # Precarga tops y resumen: los submenús salen del cache
+        dashboard = await pihole_svc.get_dashboard_async()
+        stats = dashboard.stats
+        status = await pihole_svc.get_status_async()
 
         if stats and status.get("online"):
             enabled = status.get("enabled", True)
@@ -147,7 +160,7 @@ Verifica el contenedor Docker."""
 
     elif data == "menu:system":
         stats = system_svc.get_stats()
-        containers = system_svc.get_containers()
+        containers = await system_svc.get_containers_async()
 
         if stats:
             cpu = stats.cpu_percent
@@ -257,10 +270,9 @@ No se pudo obtener el estado."""
     elif data == "net:new_devices":
         await query.edit_message_text("🔍 *Buscando dispositivos nuevos...*", parse_mode="Markdown")
 
-        devices = await network_svc.scan_all()
-
-        # Filtrar no confiables
-        unknown = [d for d in devices if not device_svc.is_trusted(d.mac)]
+        # El escaneo publica su delta y el monitor actualiza los no confiables
+        await network_svc.scan_all()
+        unknown = context.bot_data['monitor'].get_unverified_devices()
 
         if not unknown:
             await query.edit_message_text(
@@ -321,7 +333,7 @@ No se pudo obtener el estado."""
     # ═══════════════════════════════════════════════════════════
 
     elif data == "pihole:stats":
-        stats = pihole_svc.get_stats()
+        stats = await pihole_svc.get_stats_async()
 
         if not stats:
             await query.edit_message_text(
@@ -345,7 +357,7 @@ No se pudo obtener el estado."""
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_pihole())
 
     elif data == "pihole:top_blocked":
-        domains = pihole_svc.get_top_blocked(5)
+        domains = await pihole_svc.get_top_blocked_async(5)
 
         if not domains:
             text = "🚫 *Top Bloqueados*\n\n_Sin datos_"
@@ -360,7 +372,7 @@ No se pudo obtener el estado."""
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_pihole())
 
     elif data == "pihole:top_clients":
-        clients = pihole_svc.get_top_clients(5)
+        clients = await pihole_svc.get_top_clients_async(5)
 
         if not clients:
             text = "👥 *Top Clientes*\n\n_Sin datos_"
@@ -375,7 +387,7 @@ No se pudo obtener el estado."""
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_pihole())
 
     elif data == "pihole:disable":
-        success = pihole_svc.disable(300)
+        success = await pihole_svc.disable_async(300)
         if success:
             text = "⏸️ *Pi-hole pausado 5 minutos*\n\n_Los anuncios se mostrarán temporalmente_"
         else:
@@ -384,7 +396,7 @@ No se pudo obtener el estado."""
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_pihole())
 
     elif data == "pihole:enable":
-        success = pihole_svc.enable()
+        success = await pihole_svc.enable_async()
         if success:
             text = "▶️ *Pi-hole activado*\n\n_Bloqueo de anuncios activo_"
         else:
@@ -428,7 +440,7 @@ No se pudo obtener el estado."""
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_system())
 
     elif data == "sys:docker":
-        containers = system_svc.get_containers()
+        containers = await system_svc.get_containers_async()
 
         if not containers:
             text = "🐳 *Contenedores Docker*\n\n_No hay contenedores_"
@@ -450,6 +462,14 @@ No se pudo obtener el estado."""
 
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_system())
 
+    elif data.startswith("sys:history"):
+        window = data.split(":")[2] if data.count(":") == 2 else "1h"
+        if window not in ("1h", "24h", "30d"):
+            window = "1h"
+
+        text = system_svc.format_history_message(window)
+        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.history_menu(window))
+
     elif data == "sys:speedtest":
         await query.edit_message_text("📈 *Ejecutando Speedtest...*\n\n_30-60 segundos_", parse_mode="Markdown")
 
@@ -469,10 +489,10 @@ No se pudo obtener el estado."""
     elif data == "sys:restart_pihole":
         await query.edit_message_text("🔄 *Reiniciando Pi-hole...*", parse_mode="Markdown")
 
-        await run_async("docker restart pihole", timeout=60)
+        success = await docker_restart(system_svc, "pihole")
 
         await query.edit_message_text(
-            "✅ *Pi-hole reiniciado*",
+            "✅ *Pi-hole reiniciado*" if success else "❌ *Error reiniciando Pi-hole*",
             parse_mode="Markdown",
             reply_markup=Keyboards.back_to_system()
         )
@@ -560,16 +580,24 @@ No se pudo obtener el estado."""
         )
 
     elif data == "dev:offline":
-        offline = network_svc.get_offline_devices()
+        recent = context.bot_data['monitor'].get_recently_left(5)
+        offline = network_svc.get_offline_devices(limit=10 + len(recent))
         if not offline:
             text = "📴 *Dispositivos Offline*\n\n_Todos los dispositivos conocidos están online_"
         else:
             lines = ["📴 *Dispositivos Offline*", ""]
-            for d in offline[:10]:
+            if recent:
+                lines.append("🕐 *Desconectados recientemente*")
+                for d, when in recent:
+                    name = device_svc.get_device_name(d.mac) or d.display_name
+                    lines.append(f"• {escape_md(name)} - {when.strftime('%H:%M')}")
+                lines.append("")
+            recent_macs = {d.mac for d, _ in recent}
+            for d in [d for d in offline if d.mac not in recent_macs][:10]:
                 name = device_svc.get_device_name(d.mac) or d.display_name
                 lines.append(f"• {escape_md(name)}")
                 lines.append(f"  `{d.ip}` - {escape_md(d.vendor or 'Desconocido')}")
-            lines.append(f"\n_Total: {len(offline)} offline_")
+            lines.append(f"\n_Total: {network_svc.count_offline_devices()} offline_")
             text = "\n".join(lines)
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_devices())
 
@@ -632,7 +660,7 @@ No se pudo obtener el estado."""
             await query.edit_message_text("❌ Dispositivo no encontrado", parse_mode="Markdown", reply_markup=Keyboards.back_to_devices())
             return
 
-        await query.edit_message_text(f"🔌 *Escaneando puertos de {device.ip}...*\n\n_30-60 segundos_", parse_mode="Markdown")
+        await query.edit_message_text(f"🔌 *Escaneando puertos de {device.ip}...*\n\n_Unos segundos_", parse_mode="Markdown")
 
         ports = await network_svc.scan_device_ports(device.ip)
 
@@ -670,16 +698,18 @@ No se pudo obtener el estado."""
 
     elif data == "menu:tools":
         # Tests rápidos
-        dns_out, _, dns_code = await run_async("dig +short google.com @127.0.0.1 -p 5335 2>/dev/null | head -1", timeout=3)
-        gw_out, _, _ = await run_async(f"ping -c 1 -W 1 {config.GATEWAY} 2>/dev/null | grep time= | awk -F'time=' '{{print $2}}'", timeout=3)
-        inet_out, _, _ = await run_async("ping -c 1 -W 2 8.8.8.8 2>/dev/null | grep time= | awk -F'time=' '{print $2}'", timeout=4)
+        (dns_out, _, dns_code), pings = await asyncio.gather(
+            run_async("dig +short google.com @127.0.0.1 -p 5335 2>/dev/null | head -1", timeout=3),
+            network_svc.ping_many([config.GATEWAY, "8.8.8.8"], timeout=2.0)
+        )
+        gw, inet = pings[config.GATEWAY], pings["8.8.8.8"]
 
         dns_ok = "🟢" if dns_out and dns_code == 0 else "🔴"
-        gw_ok = "🟢" if gw_out else "🔴"
-        inet_ok = "🟢" if inet_out else "🔴"
+        gw_ok = "🟢" if gw.ok else "🔴"
+        inet_ok = "🟢" if inet.ok else "🔴"
 
-        gw_ms = gw_out.strip() if gw_out else "timeout"
-        inet_ms = inet_out.strip() if inet_out else "timeout"
+        gw_ms = f"{gw.avg:.1f} ms" if gw.ok else "timeout"
+        inet_ms = f"{inet.avg:.1f} ms" if inet.ok else "timeout"
 
         text = f"""*HERRAMIENTAS*
 
@@ -779,16 +809,21 @@ No se pudo obtener el estado."""
 
     elif data == "sys:restart_unbound":
         await query.edit_message_text("🔄 *Reiniciando Unbound...*", parse_mode="Markdown")
-        await run_async("docker restart unbound", timeout=60)
-        await query.edit_message_text("✅ *Unbound reiniciado*", parse_mode="Markdown", reply_markup=Keyboards.back_to_system())
+        success = await docker_restart(system_svc, "unbound")
+        text = "✅ *Unbound reiniciado*" if success else "❌ *Error reiniciando Unbound*"
+        await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_system())
 
     elif data == "sys:pihole_logs":
-        stdout, _, _ = await run_async("docker logs pihole --tail 15 2>&1", timeout=10)
+        try:
+            stdout = (await system_svc.docker.logs("pihole", tail=15)).strip()
+        except httpx.HTTPError as e:
+            logger.error(f"Error leyendo logs de Pi-hole: {e}")
+            stdout = ""
         text = f"📋 *Logs Pi-hole*\n\n```\n{stdout[:1500] if stdout else 'Sin logs'}\n```"
         await query.edit_message_text(text, parse_mode="Markdown", reply_markup=Keyboards.back_to_system())
 
     elif data == "pihole:top_permitted":
-        domains = pihole_svc.get_top_permitted(5)
+        domains = await pihole_svc.get_top_permitted_async(5)
         if not domains:
             text = "✅ *Top Permitidos*\n\n_Sin datos_"
         else:
@@ -36,7 +36,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ip_text = "🌍 No disponible"
 
     # Pi-hole stats
-    pihole_status = pihole_svc.get_status()
+    pihole_status = await pihole_svc.get_status_async()
     if pihole_status.get("online"):
         blocked = pihole_status.get("blocked_today", 0)
         pihole_text = f"🛡️ {blocked:,} bloqueados"
@@ -1,6 +1,7 @@
 """Handlers de mensajes de texto."""
 import logging
 import re
+import time
 from telegram import Update
 from telegram.ext import ContextTypes, MessageHandler, Application, filters
 
@@ -11,6 +12,9 @@ from utils import escape_md
 
 logger = logging.getLogger(__name__)
 
+# Segundos mínimos entre ediciones del mensaje de traceroute
+TRACEROUTE_EDIT_INTERVAL = 1.0
+
 
 def is_valid_ip(ip: str) -> bool:
     """Valida formato de IP."""
@@ -92,7 +96,7 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        success = pihole_svc.block_domain(domain)
+        success = await pihole_svc.block_domain_async(domain)
 
         if success:
             await update.message.reply_text(
@@ -124,7 +128,7 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        success = pihole_svc.allow_domain(domain)
+        success = await pihole_svc.allow_domain_async(domain)
 
         if success:
             await update.message.reply_text(
@@ -264,25 +268,29 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             result = await net_svc.dns_lookup(domain)
             lines = [f"🌐 *DNS Lookup: {escape_md(domain)}*\n"]
 
+            def ttl(rtype: str) -> str:
+                return f" _({result.records[rtype].ttl}s)_"
+
             if result.get('A'):
-                lines.append(f"📍 *IPv4:* `{', '.join(result['A'])}`")
+                lines.append(f"📍 *IPv4:* `{', '.join(result['A'])}`{ttl('A')}")
             if result.get('AAAA'):
-                lines.append(f"📍 *IPv6:* `{', '.join(result['AAAA'][:2])}`")
+                lines.append(f"📍 *IPv6:* `{', '.join(result['AAAA'][:2])}`{ttl('AAAA')}")
             if result.get('MX'):
                 mx_list = [f"`{m}`" for m in result['MX'][:3]]
-                lines.append(f"📧 *MX:* {', '.join(mx_list)}")
+                lines.append(f"📧 *MX:* {', '.join(mx_list)}{ttl('MX')}")
             if result.get('NS'):
                 ns_list = [f"`{n}`" for n in result['NS'][:3]]
-                lines.append(f"🖥️ *NS:* {', '.join(ns_list)}")
+                lines.append(f"🖥️ *NS:* {', '.join(ns_list)}{ttl('NS')}")
             if result.get('CNAME'):
-                lines.append(f"🔗 *CNAME:* `{result['CNAME'][0]}`")
+                lines.append(f"🔗 *CNAME:* `{result['CNAME'][0]}`{ttl('CNAME')}")
             if result.get('TXT'):
                 txt = result['TXT'][0][:100]
-                lines.append(f"📝 *TXT:* `{escape_md(txt)}`")
+                lines.append(f"📝 *TXT:* `{escape_md(txt)}`{ttl('TXT')}")
 
             if len(lines) == 1:
                 lines.append("⚠️ Sin registros encontrados")
 
+            lines.append(f"\n_Servidor: {result.server} · {result.elapsed_ms:.0f} ms_")
             await msg.edit_text("\n".join(lines), parse_mode="Markdown", reply_markup=Keyboards.back_to_tools())
         except Exception as e:
             logger.error(f"DNS lookup error: {e}")
@@ -304,24 +312,43 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        msg = await update.message.reply_text(f"🛤️ Traceroute a `{host}`...\n_Esto puede tardar 30-60s_", parse_mode="Markdown")
+        msg = await update.message.reply_text(f"🛤️ Traceroute a `{host}`...", parse_mode="Markdown")
         net_svc: NetworkService = context.bot_data['network_service']
 
-        try:
-            hops = await net_svc.traceroute(host)
+        def render(hops: dict, done: bool) -> str:
             lines = [f"🛤️ *Traceroute: {host}*\n"]
-
-            for hop in hops[:15]:
-                if hop['ip'] == '*':
-                    lines.append(f"`{hop['hop']:2}` * * *")
+            # Nada más allá del destino (respuestas de sondas con TTL sobrante)
+            dest = min((h.hop for h in hops.values() if h.reached), default=None)
+            if dest is not None:
+                hops = {n: h for n, h in hops.items() if n <= dest}
+            for hop in sorted(hops.values(), key=lambda h: h.hop)[:15]:
+                if hop.ip == '*':
+                    lines.append(f"`{hop.hop:2}` * * *")
                 else:
-                    rtt = f"{hop['rtt']:.1f}ms" if hop['rtt'] else "?"
-                    lines.append(f"`{hop['hop']:2}` {hop['ip']} ({rtt})")
-
+                    rtt = f"{hop.rtt:.1f}ms" if hop.rtt else "?"
+                    flag = f" {hop.flag}" if hop.flag else ""
+                    lines.append(f"`{hop.hop:2}` {hop.ip} ({rtt}){flag}")
             if len(hops) > 15:
                 lines.append(f"_...y {len(hops) - 15} saltos más_")
+            if not done:
+                lines.append("\n_⏳ Esperando respuestas..._")
+            return "\n".join(lines)
 
-            await msg.edit_text("\n".join(lines), parse_mode="Markdown", reply_markup=Keyboards.back_to_tools())
+        try:
+            hops = {}
+            last_edit = 0.0
+            async for hop in net_svc.traceroute_stream(host):
+                hops[hop.hop] = hop
+                # Telegram limita las ediciones: como mucho una por segundo
+                now = time.monotonic()
+                if now - last_edit >= TRACEROUTE_EDIT_INTERVAL:
+                    last_edit = now
+                    try:
+                        await msg.edit_text(render(hops, done=False), parse_mode="Markdown")
+                    except Exception as e:
+                        logger.debug(f"Traceroute edit skipped: {e}")
+
+            await msg.edit_text(render(hops, done=True), parse_mode="Markdown", reply_markup=Keyboards.back_to_tools())
         except Exception as e:
             logger.error(f"Traceroute error: {e}")
             await msg.edit_text(f"❌ Error en traceroute", reply_markup=Keyboards.back_to_tools())
@@ -402,7 +429,7 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-        msg = await update.message.reply_text(f"📡 Escaneando puertos en `{ip}`...\n_Esto puede tardar 1-2 min_", parse_mode="Markdown")
+        msg = await update.message.reply_text(f"📡 Escaneando puertos en `{ip}`...\n_Esto puede tardar unos segundos_", parse_mode="Markdown")
         net_svc: NetworkService = context.bot_data['network_service']
 
         try:
@@ -442,29 +469,20 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         net_svc: NetworkService = context.bot_data['network_service']
 
         try:
-            result = await net_svc.check_connectivity()
-            # Hacer ping específico
-            from utils.shell import run_async
-            output = await run_async(f"ping -c 4 -W 2 {host}")
-
-            if "0% packet loss" in output or "0.0% packet loss" in output:
-                # Extraer RTT
-                import re as re_mod
-                rtt_match = re_mod.search(r'rtt min/avg/max/mdev = ([\d.]+)/([\d.]+)/([\d.]+)', output)
-                if rtt_match:
-                    min_rtt, avg_rtt, max_rtt = rtt_match.groups()
-                    await msg.edit_text(
-                        f"🏓 *Ping: {escape_md(host)}*\n\n"
-                        f"✅ *Host alcanzable*\n"
-                        f"⏱️ Min: `{min_rtt}ms`\n"
-                        f"⏱️ Avg: `{avg_rtt}ms`\n"
-                        f"⏱️ Max: `{max_rtt}ms`",
-                        parse_mode="Markdown",
-                        reply_markup=Keyboards.back_to_tools()
-                    )
-                else:
-                    await msg.edit_text(f"✅ *{escape_md(host)}* alcanzable", parse_mode="Markdown", reply_markup=Keyboards.back_to_tools())
-            elif "100% packet loss" in output:
+            result = await net_svc.ping(host, count=4)
+
+            if result.ok and result.received == result.sent:
+                await msg.edit_text(
+                    f"🏓 *Ping: {escape_md(host)}*\n\n"
+                    f"✅ *Host alcanzable*\n"
+                    f"⏱️ Min: `{result.min:.1f}ms`\n"
+                    f"⏱️ Avg: `{result.avg:.1f}ms`\n"
+                    f"⏱️ Max: `{result.max:.1f}ms`"
+                    + (f"\n📶 Jitter: `{result.mdev:.1f}ms`" if result.mdev is not None else ""),
+                    parse_mode="Markdown",
+                    reply_markup=Keyboards.back_to_tools()
+                )
+            elif not result.ok:
                 await msg.edit_text(
                     f"❌ *{escape_md(host)}* no responde\n\n_100% packet loss_",
                     parse_mode="Markdown",
@@ -472,10 +490,10 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
             else:
                 # Parcial
-                loss_match = re_mod.search(r'(\d+)% packet loss', output)
-                loss = loss_match.group(1) if loss_match else "?"
                 await msg.edit_text(
-                    f"⚠️ *{escape_md(host)}* inestable\n\n_Packet loss: {loss}%_",
+                    f"⚠️ *{escape_md(host)}* inestable\n\n"
+                    f"_Packet loss: {result.loss:.0f}%_\n"
+                    f"⏱️ Avg: `{result.avg:.1f}ms`",
                     parse_mode="Markdown",
                     reply_markup=Keyboards.back_to_tools()
                 )
@@ -494,13 +512,10 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = text.strip().lower()
 
         net_svc: NetworkService = context.bot_data['network_service']
-        devices = await net_svc.scan_all(use_cache=True)
+        await net_svc.scan_all(use_cache=True)
 
-        found = None
-        for dev in devices:
-            if query in dev.mac.lower() or (dev.hostname and query in dev.hostname.lower()):
-                found = dev
-                break
+        matches = net_svc.search_devices(query, limit=1, online_only=True)
+        found = matches[0] if matches else None
 
         if not found:
             # Buscar en dispositivos guardados
@@ -82,6 +82,7 @@ class Keyboards:
         return InlineKeyboardMarkup([
             [InlineKeyboardButton("📊 Estado Completo", callback_data="sys:stats")],
             [InlineKeyboardButton("🐳 Contenedores", callback_data="sys:docker")],
+            [InlineKeyboardButton("🕒 Historial", callback_data="sys:history:1h")],
             [InlineKeyboardButton("📈 Speedtest", callback_data="sys:speedtest")],
             [
                 InlineKeyboardButton("🔄 Restart Pi-hole", callback_data="sys:restart_pihole"),
@@ -91,6 +92,18 @@ class Keyboards:
             [InlineKeyboardButton("⬅️ Volver", callback_data="menu:main")]
         ])
 
+    @staticmethod
+    def history_menu(current: str = "1h") -> InlineKeyboardMarkup:
+        """Selector de ventana del historial de métricas."""
+        windows = ["1h", "24h", "30d"]
+        return InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton(f"• {w} •" if w == current else w, callback_data=f"sys:history:{w}")
+                for w in windows
+            ],
+            [InlineKeyboardButton("⬅️ Volver", callback_data="menu:system")]
+        ])
+
     @staticmethod
     def devices_menu() -> InlineKeyboardMarkup:
         """Menú de dispositivos."""
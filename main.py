@@ -11,9 +11,10 @@ import sys
 from telegram.ext import Application
 
 from config import config
-from services import NetworkService, PiholeService, SystemService, DeviceService
+from services import NetworkService, PiholeService, SystemService, DeviceService, DockerEngine
 from handlers import setup_command_handlers, setup_callback_handlers, setup_message_handlers
 from monitor import NetworkMonitor
+from utils.events import EventBus
 
 # Configurar logging
 logging.basicConfig(
@@ -28,6 +29,14 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 async def post_init(app: Application):
     """Inicialización post-arranque."""
+    # Cache de contenedores alimentado por /events de Docker
+    docker: DockerEngine = app.bot_data['docker']
+    await docker.start()
+
+    # Muestreo de CPU/RAM/temperatura en background
+    system_service: SystemService = app.bot_data['system_service']
+    await system_service.start()
+
     # Iniciar monitor de red
     monitor: NetworkMonitor = app.bot_data['monitor']
     await monitor.start()
@@ -36,9 +45,33 @@ async def post_init(app: Application):
 
 async def post_shutdown(app: Application):
     """Limpieza al apagar."""
+    network_service: NetworkService = app.bot_data.get('network_service')
+    if network_service:
+        # Dejar terminar a los suscriptores asíncronos antes de cerrar lo que usan
+        await network_service.events.drain()
+
     monitor: NetworkMonitor = app.bot_data.get('monitor')
     if monitor:
         await monitor.stop()
+
+    if network_service:
+        await network_service.close()
+
+    system_service: SystemService = app.bot_data.get('system_service')
+    if system_service:
+        await system_service.stop()
+
+    pihole_service: PiholeService = app.bot_data.get('pihole_service')
+    if pihole_service:
+        await pihole_service.aclose()
+
+    device_service: DeviceService = app.bot_data.get('device_service')
+    if device_service:
+        device_service.flush()
+
+    docker: DockerEngine = app.bot_data.get('docker')
+    if docker:
+        await docker.aclose()
     logger.info("Bot apagado correctamente")
 
 
@@ -52,9 +85,11 @@ def main():
     config.ensure_data_dir()
 
     # Crear servicios (singleton-like)
-    network_service = NetworkService()
+    docker = DockerEngine()
+    events = EventBus()
+    network_service = NetworkService(docker=docker, events=events)
     pihole_service = PiholeService()
-    system_service = SystemService()
+    system_service = SystemService(docker=docker)
     device_service = DeviceService()
 
     logger.info("Servicios inicializados")
@@ -63,6 +98,7 @@ def main():
     app = Application.builder().token(config.BOT_TOKEN).build()
 
     # Almacenar servicios en bot_data para acceso global
+    app.bot_data['docker'] = docker
     app.bot_data['network_service'] = network_service
     app.bot_data['pihole_service'] = pihole_service
     app.bot_data['system_service'] = system_service
@@ -1,15 +1,21 @@
 """Monitor de red en background."""
 import asyncio
 import logging
+from collections import OrderedDict
 from datetime import datetime
+from typing import Dict, List, Set
 from telegram.ext import Application
 
 from config import config
 from services import NetworkService, SystemService, DeviceService
+from services.network import NETWORK_DELTA, NetworkDevice, ScanDelta
 from utils.formatting import get_device_icon, get_vendor_short
 
 logger = logging.getLogger(__name__)
 
+# Desconexiones recientes que se recuerdan para el menú de offline
+RECENTLY_LEFT_MAX = 50
+
 
 class NetworkMonitor:
     """Monitor de red que corre en background."""
@@ -27,6 +33,13 @@ class NetworkMonitor:
         self.device_svc = device_service
         self._running = False
         self._task = None
+        self._alert_tasks = set()
+        self._unsubscribe = None
+
+        # Estado mantenido a partir de los deltas de red
+        self.unverified: Dict[str, NetworkDevice] = {}                  # online y no confiables
+        self.recently_left: OrderedDict[str, datetime] = OrderedDict()   # MAC -> hora de desconexión
+        self._deferred: Set[str] = set()                                # MAC aleatorias sin nombre pendientes de alerta
 
     async def start(self):
         """Inicia el monitor."""
@@ -35,11 +48,20 @@ class NetworkMonitor:
 
         self._running = True
         self._task = asyncio.create_task(self._monitor_loop())
+
+        # Cambios de red (escaneos y presencia netlink) vía bus de eventos
+        self._unsubscribe = self.network_svc.events.subscribe(NETWORK_DELTA, self._on_network_delta)
+        self.network_svc.start_neighbour_listener()
+
         logger.info("Monitor de red iniciado")
 
     async def stop(self):
         """Detiene el monitor."""
         self._running = False
+        self.network_svc.stop_neighbour_listener()
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
         if self._task:
             self._task.cancel()
             try:
@@ -64,42 +86,104 @@ class NetworkMonitor:
             await asyncio.sleep(config.SCAN_INTERVAL)
 
     async def _check_network(self):
-        """Verifica dispositivos nuevos en la red."""
+        """Escaneo periódico: las alertas llegan por el delta que publica."""
         try:
             devices = await self.network_svc.scan_all()
+            self.device_svc.touch_many(d.mac for d in devices)
 
-            for device in devices:
-                mac = device.mac
+            # Caducidad del historial (los dispositivos registrados no se borran)
+            self.network_svc.prune_history(protected=(d.mac for d in self.device_svc.get_all_devices()))
 
-                # Skip si ya conocemos o ya alertamos
-                if self.device_svc.is_known(mac):
-                    self.device_svc.update_last_seen(mac)
-                    continue
+        except Exception as e:
+            logger.error(f"Error verificando red: {e}")
 
-                if self.device_svc.was_alerted(mac):
+    def _on_network_delta(self, delta: ScanDelta):
+        """Aplica un delta de red: estado de presencia y alertas de nuevos."""
+        for device in delta.left:
+            self.unverified.pop(device.mac, None)
+            self._deferred.discard(device.mac)
+            self.recently_left[device.mac] = delta.timestamp
+            self.recently_left.move_to_end(device.mac)
+        while len(self.recently_left) > RECENTLY_LEFT_MAX:
+            self.recently_left.popitem(last=False)
+
+        candidates: List[NetworkDevice] = []
+        for device in delta.joined:
+            self.recently_left.pop(device.mac, None)
+            if not self.device_svc.is_trusted(device.mac):
+                self.unverified[device.mac] = device
+            if delta.source == "netlink":
+                self.device_svc.update_last_seen(device.mac)
+                # MAC aleatoria sin nombre: esperar al escaneo (DHCP/mDNS) para
+                # poder agruparla con su identidad antes de alertar
+                if device.is_random_mac and not device.hostname:
+                    self._deferred.add(device.mac)
                     continue
+            candidates.append(device)
 
-                # Nuevo dispositivo - alertar
-                self.device_svc.mark_alerted(mac)
-
-                icon = get_device_icon(device.vendor, device.hostname)
-                vendor = get_vendor_short(device.vendor)
-                now = datetime.now().strftime("%H:%M:%S")
+        if delta.source == "scan":
+            # Las pendientes que siguen online se alertan ahora (ya agrupadas con su identidad)
+            candidates += [d for d in map(self.network_svc.get_device_by_mac, self._deferred) if d and d.is_online]
+            self._deferred.clear()
 
-                message = (
-                    f"🚨 *NUEVO DISPOSITIVO*\n\n"
-                    f"{icon} Dispositivo desconocido conectado\n\n"
-                    f"📍 *IP:* `{device.ip}`\n"
-                    f"📱 *MAC:* `{device.mac}`\n"
-                    f"🏭 *Fabricante:* {vendor}\n"
-                    f"⏰ *Hora:* {now}\n\n"
-                    f"_Usa /start > Dispositivos para identificarlo_"
-                )
-
-                await self._send_alert(message)
+        if not self._running:
+            return
+        for device in {d.mac: d for d in candidates}.values():
+            task = asyncio.create_task(self._alert_if_unknown(device))
+            self._alert_tasks.add(task)
+            task.add_done_callback(self._alert_tasks.discard)
+
+    def get_unverified_devices(self) -> List[NetworkDevice]:
+        """Dispositivos online que aún no son confiables."""
+        devices = {}
+        for mac in list(self.unverified):
+            # Resuelve MACs rotadas a su identidad canónica
+            device = self.network_svc.get_device_by_mac(mac)
+            if device is None or not device.is_online:
+                self.unverified.pop(mac, None)
+            elif not self.device_svc.is_trusted(device.mac):
+                devices[device.mac] = device
+        return list(devices.values())
+
+    def get_recently_left(self, limit: int = 10) -> List[tuple]:
+        """(dispositivo, hora de desconexión) de los últimos en salir, más reciente primero."""
+        result = []
+        for mac, when in reversed(self.recently_left.items()):
+            device = self.network_svc.get_device_by_mac(mac)
+            if device and not device.is_online:
+                result.append((device, when))
+            if len(result) >= limit:
+                break
+        return result
+
+    async def _alert_if_unknown(self, device):
+        """Alerta si el dispositivo no es conocido ni fue alertado."""
+        mac = device.mac
+
+        # Skip si ya conocemos o ya alertamos
+        if self.device_svc.is_known(mac) or self.device_svc.was_alerted(mac):
+            return
 
-        except Exception as e:
-            logger.error(f"Error verificando red: {e}")
+        # Nuevo dispositivo - alertar
+        self.device_svc.mark_alerted(mac)
+
+        icon = get_device_icon(device.vendor, device.hostname)
+        vendor = get_vendor_short(device.vendor)
+        now = datetime.now().strftime("%H:%M:%S")
+        random_mac = "🎭 _MAC aleatoria (privada)_\n" if device.is_random_mac else ""
+
+        message = (
+            f"🚨 *NUEVO DISPOSITIVO*\n\n"
+            f"{icon} Dispositivo desconocido conectado\n\n"
+            f"📍 *IP:* `{device.ip}`\n"
+            f"📱 *MAC:* `{device.mac}`\n"
+            f"{random_mac}"
+            f"🏭 *Fabricante:* {vendor}\n"
+            f"⏰ *Hora:* {now}\n\n"
+            f"_Usa /start > Dispositivos para identificarlo_"
+        )
+
+        await self._send_alert(message)
 
     async def _check_temperature(self):
         """Verifica temperatura del sistema."""
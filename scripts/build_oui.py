@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Genera el registro OUI binario (data/oui.bin) a partir de los CSV del IEEE.
+
+Uso:
+    python scripts/build_oui.py --download
+    python scripts/build_oui.py oui.csv mam.csv oui36.csv -o data/oui.bin
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import httpx
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.oui import build_registry, parse_ieee_csv  # noqa: E402
+
+IEEE_REGISTRIES = (
+    "https://standards-oui.ieee.org/oui/oui.csv",       # MA-L (24 bits)
+    "https://standards-oui.ieee.org/oui28/mam.csv",     # MA-M (28 bits)
+    "https://standards-oui.ieee.org/oui36/oui36.csv",   # MA-S (36 bits)
+)
+
+
+def main() -> int:
+    data_dir = os.getenv("DATA_DIR", "/home/judariva/pibot/data")
+    default_output = Path(os.getenv("OUI_DB") or f"{data_dir}/oui.bin")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="*", help="CSV del IEEE ya descargados")
+    parser.add_argument("--download", action="store_true", help="Descarga los CSV del IEEE")
+    parser.add_argument("-o", "--output", type=Path, default=default_output)
+    args = parser.parse_args()
+
+    if not args.csv and not args.download:
+        parser.error("indica ficheros CSV o --download")
+
+    texts = [Path(p).read_text(encoding="utf-8", errors="replace") for p in args.csv]
+    if args.download:
+        with httpx.Client(timeout=60.0, follow_redirects=True,
+                          headers={"User-Agent": "pi-command-center"}) as client:
+            for url in IEEE_REGISTRIES:
+                print(f"Descargando {url}...")
+                response = client.get(url)
+                response.raise_for_status()
+                texts.append(response.text)
+
+    entries = [entry for text in texts for entry in parse_ieee_csv(text)]
+    count = build_registry(entries, args.output)
+    size = args.output.stat().st_size
+    print(f"{count} prefijos -> {args.output} ({size / 1024:.0f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -92,6 +92,10 @@ source venv/bin/activate
 pip install --upgrade pip
 pip install -r requirements.txt
 
+log "Descargando registro de fabricantes (IEEE OUI)..."
+python scripts/build_oui.py --download || \
+    warn "No se pudo descargar el registro OUI (se usará la tabla interna)"
+
 log "Instalando VPN Manager..."
 sudo cp scripts/vpn-manager /usr/local/bin/
 sudo chmod +x /usr/local/bin/vpn-manager
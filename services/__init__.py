@@ -3,5 +3,6 @@ from services.network import NetworkService
 from services.pihole import PiholeService
 from services.system import SystemService
 from services.devices import DeviceService
+from services.docker_engine import DockerEngine
 
-__all__ = ['NetworkService', 'PiholeService', 'SystemService', 'DeviceService']
+__all__ = ['NetworkService', 'PiholeService', 'SystemService', 'DeviceService', 'DockerEngine']
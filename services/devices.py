@@ -1,10 +1,12 @@
 """Servicio de gestión de dispositivos conocidos."""
+import asyncio
 import json
 import logging
 import os
+import time
 from dataclasses import dataclass, asdict
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterable, List, Optional, Set
 
 from config import config
 from utils.formatting import format_mac
@@ -29,12 +31,21 @@ class KnownDevice:
 
 
 class DeviceService:
-    """Servicio para gestionar dispositivos conocidos."""
+    """
+    Servicio para gestionar dispositivos conocidos.
+
+    Los cambios marcan la MAC como sucia y programan un volcado diferido:
+    como mucho una escritura cada DEVICES_FLUSH_INTERVAL segundos.
+    """
 
     def __init__(self):
         self._db_path = config.DEVICES_DB
         self._devices: Dict[str, KnownDevice] = {}
         self._alerted: Set[str] = set()
+        self._dirty: Set[str] = set()
+        self._flush_interval = config.DEVICES_FLUSH_INTERVAL
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._last_flush = 0.0
         self._load()
 
     def _load(self):
@@ -42,7 +53,7 @@ class DeviceService:
         config.ensure_data_dir()
 
         if not os.path.exists(self._db_path):
-            self._save()
+            self._write()
             return
 
         try:
@@ -66,8 +77,35 @@ class DeviceService:
         except Exception as e:
             logger.error(f"Error cargando base de datos: {e}")
 
-    def _save(self):
-        """Guardar base de datos a archivo."""
+    def _mark_dirty(self, *macs: str):
+        """Registra cambios y programa el volcado a disco."""
+        self._dirty.update(macs)
+        if self._flush_handle is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sin event loop (arranque, scripts): escribir ya
+            self.flush()
+            return
+
+        delay = max(0.0, self._last_flush + self._flush_interval - time.monotonic())
+        self._flush_handle = loop.call_later(delay, self.flush)
+
+    def flush(self):
+        """Escribe los cambios pendientes (si los hay)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+        self._dirty.clear()
+        self._last_flush = time.monotonic()
+        self._write()
+
+    def _write(self):
+        """Guardar base de datos a archivo (escritura atómica)."""
         config.ensure_data_dir()
 
         data = {
@@ -79,9 +117,13 @@ class DeviceService:
             "updated": datetime.now().isoformat()
         }
 
+        tmp_path = f"{self._db_path}.tmp"
         try:
-            with open(self._db_path, 'w') as f:
+            with open(tmp_path, 'w') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._db_path)
         except Exception as e:
             logger.error(f"Error guardando base de datos: {e}")
 
@@ -109,8 +151,9 @@ class DeviceService:
 
     def mark_alerted(self, mac: str):
         """Marcar dispositivo como alertado."""
-        self._alerted.add(format_mac(mac))
-        self._save()
+        mac = format_mac(mac)
+        self._alerted.add(mac)
+        self._mark_dirty(mac)
 
     def add_device(
         self,
@@ -138,7 +181,7 @@ class DeviceService:
             )
             self._devices[mac] = device
 
-        self._save()
+        self._mark_dirty(mac)
         return device
 
     def remove_device(self, mac: str) -> bool:
@@ -147,7 +190,7 @@ class DeviceService:
         if mac in self._devices:
             del self._devices[mac]
             self._alerted.discard(mac)
-            self._save()
+            self._mark_dirty(mac)
             return True
         return False
 
@@ -156,16 +199,25 @@ class DeviceService:
         mac = format_mac(mac)
         if mac in self._devices:
             self._devices[mac].trusted = trusted
-            self._save()
+            self._mark_dirty(mac)
             return True
         return False
 
     def update_last_seen(self, mac: str):
         """Actualizar última vez visto."""
-        mac = format_mac(mac)
-        if mac in self._devices:
-            self._devices[mac].last_seen = datetime.now().isoformat()
-            self._save()
+        self.touch_many([mac])
+
+    def touch_many(self, macs: Iterable[str]):
+        """Actualizar última vez visto de varios dispositivos de una vez."""
+        now = datetime.now().isoformat()
+        touched = []
+        for mac in macs:
+            mac = format_mac(mac)
+            if mac in self._devices:
+                self._devices[mac].last_seen = now
+                touched.append(mac)
+        if touched:
+            self._mark_dirty(*touched)
 
     def get_all_devices(self) -> List[KnownDevice]:
         """Obtener todos los dispositivos."""
@@ -181,8 +233,10 @@ class DeviceService:
 
     def clear_alerts(self):
         """Limpiar lista de alertas."""
+        cleared = list(self._alerted)
         self._alerted.clear()
-        self._save()
+        if cleared:
+            self._mark_dirty(*cleared)
 
     def get_stats(self) -> Dict[str, int]:
         """Obtener estadísticas de dispositivos."""
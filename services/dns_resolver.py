@@ -0,0 +1,270 @@
+"""Resolver DNS asíncrono en proceso (dnspython + un solo socket UDP)."""
+import asyncio
+import logging
+import random
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_TYPES = ('A', 'AAAA', 'MX', 'NS', 'CNAME', 'TXT')
+
+# TTL para respuestas vacías sin SOA (NXDOMAIN/NODATA)
+NEGATIVE_TTL = 30
+
+# Entradas máximas del cache (dominio, tipo)
+CACHE_MAX_ENTRIES = 1024
+
+
+@dataclass
+class DnsAnswer:
+    """Respuesta para un tipo de registro."""
+    rtype: str
+    values: List[str] = field(default_factory=list)
+    ttl: int = 0
+    rcode: str = "NOERROR"
+
+
+@dataclass
+class DnsLookupResult:
+    """Resultado de un lookup multi-registro."""
+    domain: str
+    server: str
+    records: Dict[str, DnsAnswer] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+    cached: int = 0          # Cuántos tipos salieron del cache
+
+    def get(self, rtype: str) -> List[str]:
+        answer = self.records.get(rtype)
+        return answer.values if answer else []
+
+    def __getitem__(self, rtype: str) -> List[str]:
+        return self.get(rtype)
+
+
+def default_nameserver() -> str:
+    """Primer nameserver de /etc/resolv.conf (o localhost)."""
+    try:
+        with open("/etc/resolv.conf") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    return parts[1]
+    except OSError:
+        pass
+    return "127.0.0.1"
+
+
+def _format_rdata(rdata) -> str:
+    rtype = rdata.rdtype
+    if rtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+        return rdata.address
+    if rtype == dns.rdatatype.MX:
+        return rdata.exchange.to_text().rstrip('.')
+    if rtype in (dns.rdatatype.NS, dns.rdatatype.CNAME):
+        return rdata.target.to_text().rstrip('.')
+    if rtype == dns.rdatatype.TXT:
+        return b''.join(rdata.strings).decode(errors='replace')
+    return rdata.to_text()
+
+
+def parse_answer(response: dns.message.Message, rtype: str) -> DnsAnswer:
+    """Extrae los registros del tipo pedido (ignorando CNAMEs intermedios)."""
+    wanted = dns.rdatatype.from_text(rtype)
+    answer = DnsAnswer(rtype=rtype, rcode=dns.rcode.to_text(response.rcode()))
+    ttls = []
+    for rrset in response.answer:
+        if rrset.rdtype != wanted:
+            continue
+        ttls.append(rrset.ttl)
+        items = list(rrset)
+        if wanted == dns.rdatatype.MX:
+            items.sort(key=lambda r: r.preference)
+        answer.values.extend(_format_rdata(r) for r in items)
+
+    if ttls:
+        answer.ttl = min(ttls)
+    else:
+        # TTL negativo: mínimo del SOA de la sección authority (RFC 2308)
+        soa = [rr for rr in response.authority if rr.rdtype == dns.rdatatype.SOA]
+        answer.ttl = min(soa[0].ttl, soa[0][0].minimum) if soa else NEGATIVE_TTL
+    return answer
+
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver: "DnsResolver"):
+        self.resolver = resolver
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.resolver._on_response(data)
+
+    def error_received(self, exc: Exception):
+        self.resolver._fail_pending(exc)
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.resolver._on_connection_lost(exc)
+
+
+class DnsResolver:
+    """
+    Consultas concurrentes sobre un único socket UDP, emparejadas por ID.
+
+    Respuestas truncadas se repiten por TCP. Incluye un cache acotado que
+    respeta el TTL de cada respuesta.
+    """
+
+    def __init__(self, server: str = None, port: int = 53, timeout: float = 2.0, retries: int = 1):
+        self.server = server or config.DNS_SERVER or default_nameserver()
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._connecting: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, Tuple[asyncio.Future, dns.message.Message]] = {}
+        self._cache: Dict[Tuple[str, str], Tuple[float, DnsAnswer]] = {}
+
+    async def _ensure_transport(self):
+        if self._transport is not None:
+            return
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self._transport is None:
+                loop = asyncio.get_running_loop()
+                self._transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _DnsProtocol(self), remote_addr=(self.server, self.port)
+                )
+
+    def _on_response(self, data: bytes):
+        if len(data) < 2:
+            return
+        qid = struct.unpack_from('!H', data)[0]
+        pending = self._pending.get(qid)
+        if not pending:
+            return
+        future, query = pending
+        try:
+            response = dns.message.from_wire(data)
+        except Exception as e:
+            logger.debug(f"Respuesta DNS inválida: {e}")
+            return
+        # Descarta respuestas con ID reutilizado para otra pregunta
+        if not query.is_response(response):
+            return
+        if not future.done():
+            future.set_result(response)
+
+    def _fail_pending(self, exc: Exception):
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def _on_connection_lost(self, exc: Optional[Exception]):
+        self._transport = None
+        self._fail_pending(exc or ConnectionError("Socket DNS cerrado"))
+
+    def _new_id(self) -> int:
+        while True:
+            qid = random.getrandbits(16)
+            if qid not in self._pending:
+                return qid
+
+    async def _query_tcp(self, query: dns.message.Message) -> dns.message.Message:
+        wire = query.to_wire()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.server, self.port), self.timeout
+        )
+        try:
+            writer.write(struct.pack('!H', len(wire)) + wire)
+            await writer.drain()
+            length = struct.unpack('!H', await asyncio.wait_for(reader.readexactly(2), self.timeout))[0]
+            data = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        finally:
+            writer.close()
+        return dns.message.from_wire(data)
+
+    async def _query_udp(self, query: dns.message.Message) -> dns.message.Message:
+        await self._ensure_transport()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[query.id] = (future, query)
+        wire = query.to_wire()
+        try:
+            for attempt in range(self.retries + 1):
+                self._transport.sendto(wire)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                except asyncio.TimeoutError:
+                    if attempt == self.retries:
+                        raise
+        finally:
+            self._pending.pop(query.id, None)
+
+    async def query(self, name: str, rtype: str) -> DnsAnswer:
+        """Consulta un tipo de registro (con cache)."""
+        key = (name.lower().rstrip('.'), rtype)
+        cached = self._cache.get(key)
+        now = time.monotonic()
+        if cached and now < cached[0]:
+            answer = cached[1]
+            return DnsAnswer(rtype=answer.rtype, values=list(answer.values),
+                             ttl=int(cached[0] - now), rcode=answer.rcode)
+
+        query = dns.message.make_query(name, rtype)
+        query.id = self._new_id()
+        response = await self._query_udp(query)
+        if response.flags & dns.flags.TC:
+            response = await self._query_tcp(query)
+
+        answer = parse_answer(response, rtype)
+        if answer.rcode in ("NOERROR", "NXDOMAIN") and answer.ttl > 0:
+            self._store(key, answer)
+        return answer
+
+    def _store(self, key: Tuple[str, str], answer: DnsAnswer):
+        """Guarda en cache; al llenarse purga lo expirado y después lo más antiguo."""
+        self._cache.pop(key, None)
+        if len(self._cache) >= CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for stale in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+                del self._cache[stale]
+            while len(self._cache) >= CACHE_MAX_ENTRIES:
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (time.monotonic() + answer.ttl, answer)
+
+    async def lookup(self, domain: str, types: Tuple[str, ...] = LOOKUP_TYPES) -> DnsLookupResult:
+        """Consulta todos los tipos en paralelo."""
+        start = time.perf_counter()
+        hits_before = {t for t in types if self._is_cached(domain, t)}
+        answers = await asyncio.gather(*(self.query(domain, t) for t in types), return_exceptions=True)
+
+        result = DnsLookupResult(domain=domain, server=self.server, cached=len(hits_before))
+        errors = []
+        for rtype, answer in zip(types, answers):
+            if isinstance(answer, Exception):
+                errors.append(answer)
+                continue
+            result.records[rtype] = answer
+        if errors and not result.records:
+            raise errors[0] if not isinstance(errors[0], asyncio.TimeoutError) else \
+                TimeoutError(f"Sin respuesta de {self.server}")
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    def _is_cached(self, domain: str, rtype: str) -> bool:
+        cached = self._cache.get((domain.lower().rstrip('.'), rtype))
+        return bool(cached) and time.monotonic() < cached[0]
+
+    def close(self):
+        """Cierra el socket UDP."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
@@ -0,0 +1,261 @@
+"""Cliente asíncrono de la API de Docker Engine sobre el socket unix."""
+import asyncio
+import io
+import json
+import logging
+import struct
+import tarfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_FRAME_HEADER = struct.Struct('>BxxxI')
+
+
+@dataclass
+class ContainerInfo:
+    """Información de contenedor Docker."""
+    name: str
+    status: str
+    health: str
+    id: str = ""
+    state: str = ""
+
+
+def container_health(state: str, status: str) -> str:
+    """Deriva la salud a partir de State y Status de la API."""
+    if "(healthy)" in status:
+        return "healthy"
+    if "(unhealthy)" in status:
+        return "unhealthy"
+    if state == "running" or status.startswith("Up"):
+        return "running"
+    if state == "exited" or status.startswith("Exited"):
+        return "stopped"
+    return "unknown"
+
+
+class StreamDemuxer:
+    """
+    Separa el flujo multiplexado stdout/stderr de logs y exec.
+
+    Cada trama lleva cabecera de 8 bytes: tipo de stream, 3 bytes a cero
+    y longitud big-endian. Contenedores con TTY envían texto plano.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self._raw: Optional[bool] = None
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """Añade bytes y devuelve las tramas completas (stream, datos)."""
+        self._buffer += data
+        if self._raw is None and len(self._buffer) >= _FRAME_HEADER.size:
+            self._raw = not (self._buffer[0] in (0, 1, 2) and self._buffer[1:4] == b'\0\0\0')
+        if self._raw:
+            chunk, self._buffer = self._buffer, b''
+            return [(1, chunk)] if chunk else []
+
+        frames = []
+        while len(self._buffer) >= _FRAME_HEADER.size:
+            stream, size = _FRAME_HEADER.unpack_from(self._buffer)
+            end = _FRAME_HEADER.size + size
+            if len(self._buffer) < end:
+                break
+            frames.append((stream, self._buffer[_FRAME_HEADER.size:end]))
+            self._buffer = self._buffer[end:]
+        return frames
+
+    def flush(self) -> List[Tuple[int, bytes]]:
+        """Restos sin cabecera completa (flujo corto en modo TTY)."""
+        rest, self._buffer = self._buffer, b''
+        return [(1, rest)] if rest else []
+
+
+def demux(data: bytes) -> Tuple[str, str]:
+    """Demultiplexa un flujo completo en (stdout, stderr)."""
+    demuxer = StreamDemuxer()
+    out, err = [], []
+    for stream, chunk in demuxer.feed(data) + demuxer.flush():
+        (err if stream == 2 else out).append(chunk)
+    return b''.join(out).decode(errors='replace'), b''.join(err).decode(errors='replace')
+
+
+class DockerEngine:
+    """
+    Cliente de Docker Engine con conexión persistente por /var/run/docker.sock.
+
+    Mantiene un cache de contenedores que se refresca al llegar eventos de
+    /events (modo push) en lugar de consultar periódicamente.
+    """
+
+    def __init__(self, socket_path: str = None, api_version: str = "v1.41"):
+        self.socket_path = socket_path or config.DOCKER_SOCKET
+        self._client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=self.socket_path),
+            base_url=f"http://docker/{api_version}",
+            timeout=httpx.Timeout(10.0, connect=2.0),
+        )
+        self._containers: Dict[str, ContainerInfo] = {}
+        self._listeners: List[Callable[[List[ContainerInfo]], None]] = []
+        self._events_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._subscribed = False
+
+    # ─── Contenedores ───
+
+    async def list_containers(self, all: bool = True) -> List[ContainerInfo]:
+        """Lista contenedores con su salud."""
+        response = await self._client.get("/containers/json", params={"all": int(all)})
+        response.raise_for_status()
+        containers = []
+        for item in response.json():
+            names = item.get("Names") or [""]
+            status = item.get("Status", "")
+            state = item.get("State", "")
+            containers.append(ContainerInfo(
+                name=names[0].lstrip('/'),
+                status=status or state or "unknown",
+                health=container_health(state, status),
+                id=item.get("Id", ""),
+                state=state
+            ))
+        return containers
+
+    async def restart(self, name: str, timeout: int = 10) -> bool:
+        """Reinicia un contenedor."""
+        response = await self._client.post(
+            f"/containers/{name}/restart", params={"t": timeout}, timeout=timeout + 30
+        )
+        return response.status_code == 204
+
+    async def logs(self, name: str, tail: int = 100, since: int = 0) -> str:
+        """Últimas líneas de log (stdout y stderr intercalados)."""
+        params = {"stdout": 1, "stderr": 1, "tail": tail}
+        if since:
+            params["since"] = since
+        response = await self._client.get(f"/containers/{name}/logs", params=params)
+        response.raise_for_status()
+        demuxer = StreamDemuxer()
+        frames = demuxer.feed(response.content) + demuxer.flush()
+        return b''.join(chunk for _, chunk in frames).decode(errors='replace')
+
+    async def follow_logs(self, name: str, tail: int = 0, since: int = 0) -> AsyncIterator[str]:
+        """Sigue el log de un contenedor (follow=1) trama a trama."""
+        params = {"stdout": 1, "stderr": 1, "follow": 1, "tail": tail}
+        if since:
+            params["since"] = since
+        demuxer = StreamDemuxer()
+        async with self._client.stream("GET", f"/containers/{name}/logs", params=params, timeout=None) as response:
+            response.raise_for_status()
+            async for data in response.aiter_bytes():
+                for _, chunk in demuxer.feed(data):
+                    yield chunk.decode(errors='replace')
+
+    async def exec(self, name: str, cmd: List[str]) -> Tuple[str, str, int]:
+        """
+        Ejecuta un comando dentro del contenedor.
+
+        Returns:
+            Tuple (stdout, stderr, exit_code)
+        """
+        response = await self._client.post(
+            f"/containers/{name}/exec",
+            json={"AttachStdout": True, "AttachStderr": True, "Cmd": cmd}
+        )
+        response.raise_for_status()
+        exec_id = response.json()["Id"]
+
+        response = await self._client.post(f"/exec/{exec_id}/start", json={"Detach": False, "Tty": False})
+        response.raise_for_status()
+        stdout, stderr = demux(response.content)
+
+        inspect = await self._client.get(f"/exec/{exec_id}/json")
+        exit_code = inspect.json().get("ExitCode") if inspect.status_code == 200 else None
+        return stdout, stderr, exit_code if exit_code is not None else -1
+
+    async def read_file(self, name: str, path: str) -> bytes:
+        """Lee un fichero del contenedor mediante la API de archivos (tar)."""
+        response = await self._client.get(f"/containers/{name}/archive", params={"path": path})
+        response.raise_for_status()
+        with tarfile.open(fileobj=io.BytesIO(response.content)) as tar:
+            for member in tar:
+                if member.isfile():
+                    return tar.extractfile(member).read()
+        raise FileNotFoundError(path)
+
+    # ─── Cache en modo push ───
+
+    def add_listener(self, callback: Callable[[List[ContainerInfo]], None]):
+        """Registra callback llamado tras cada actualización del cache."""
+        self._listeners.append(callback)
+
+    def cached(self) -> List[ContainerInfo]:
+        """Contenedores en cache (sin E/S)."""
+        return list(self._containers.values())
+
+    async def containers(self) -> List[ContainerInfo]:
+        """Cache si la suscripción a eventos está viva; si no, consulta la API."""
+        if not self._subscribed:
+            await self._refresh()
+        return self.cached()
+
+    async def _refresh(self):
+        containers = await self.list_containers()
+        self._containers = {c.name: c for c in containers}
+        for callback in self._listeners:
+            try:
+                callback(containers)
+            except Exception as e:
+                logger.error(f"Error en listener de contenedores: {e}")
+
+    def _schedule_refresh(self):
+        # Varios eventos seguidos (die/stop/start) generan un solo refresco
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_soon())
+
+    async def _refresh_soon(self):
+        await asyncio.sleep(0.2)
+        try:
+            await self._refresh()
+        except httpx.HTTPError as e:
+            logger.debug(f"Error refrescando contenedores: {e}")
+
+    async def _events_loop(self):
+        filters = json.dumps({"type": ["container"]})
+        backoff = 1.0
+        while True:
+            try:
+                async with self._client.stream("GET", "/events", params={"filters": filters}, timeout=None) as response:
+                    response.raise_for_status()
+                    # Resincronizar tras (re)conectar: pudimos perder eventos
+                    await self._refresh()
+                    self._subscribed = True
+                    backoff = 1.0
+                    async for line in response.aiter_lines():
+                        if line.strip():
+                            self._schedule_refresh()
+            except (httpx.HTTPError, OSError) as e:
+                logger.debug(f"Suscripción a eventos de Docker caída: {e}")
+            self._subscribed = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def start(self):
+        """Arranca la suscripción a /events."""
+        if self._events_task is None:
+            self._events_task = asyncio.create_task(self._events_loop())
+
+    async def aclose(self):
+        """Cancela la suscripción y cierra la conexión."""
+        for task in (self._events_task, self._refresh_task):
+            if task:
+                task.cancel()
+        self._events_task = None
+        self._subscribed = False
+        await self._client.aclose()
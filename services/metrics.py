@@ -0,0 +1,314 @@
+"""Series temporales de métricas del sistema con persistencia mmap."""
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PCMT'
+VERSION = 1
+
+SYSTEM_METRICS = ('cpu', 'mem', 'temp', 'load')
+CONTAINER_SLOTS = 8
+NAME_SIZE = 32
+
+# (nombre, segundos por punto, horizonte en segundos, guarda min/max)
+TIERS = (
+    ('raw', None, 3600, False),
+    ('1m', 60, 24 * 3600, True),
+    ('15m', 900, 30 * 24 * 3600, True),
+)
+
+_HEADER = struct.Struct('<4sHHf')      # magic, versión, nº series, paso raw
+_TIER_STATE = struct.Struct('<III')    # capacidad, head, count
+_NAN = float('nan')
+
+
+@dataclass
+class MetricSummary:
+    """Resumen de una métrica en una ventana."""
+    min: float
+    max: float
+    avg: float
+    p95: float
+    count: int
+    tier: str
+
+
+class _Tier:
+    """Buffer circular de un nivel de resolución sobre el mmap."""
+
+    def __init__(self, store: "MetricsStore", index: int, name: str, step: float,
+                 capacity: int, rollup: bool, offset: int):
+        self.store = store
+        self.index = index
+        self.name = name
+        self.step = step
+        self.capacity = capacity
+        self.fields = 3 if rollup else 1    # avg[, min, max]
+        self.offset = offset
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * 4 * (1 + self.store.n_series * self.fields)
+
+    def bind(self, buf: memoryview):
+        region = buf[self.offset:self.offset + self.nbytes]
+        self.ts = region[:self.capacity * 4].cast('I')
+        values = region[self.capacity * 4:].cast('f')
+        cap = self.capacity
+        self.values = [
+            [values[(s * self.fields + f) * cap:(s * self.fields + f + 1) * cap] for f in range(self.fields)]
+            for s in range(self.store.n_series)
+        ]
+
+    def _state_offset(self) -> int:
+        return _HEADER.size + self.index * _TIER_STATE.size
+
+    def state(self) -> Tuple[int, int]:
+        _, head, count = _TIER_STATE.unpack_from(self.store._mm, self._state_offset())
+        return head, count
+
+    def append(self, ts: int, row: List[Tuple[float, float, float]]):
+        head, count = self.state()
+        self.ts[head] = ts
+        for s, (avg, mn, mx) in enumerate(row):
+            fields = self.values[s]
+            fields[0][head] = avg
+            if self.fields == 3:
+                fields[1][head] = mn
+                fields[2][head] = mx
+        _TIER_STATE.pack_into(self.store._mm, self._state_offset(),
+                              self.capacity, (head + 1) % self.capacity, min(count + 1, self.capacity))
+
+    def window(self, since: float):
+        """Índices de slot con ts >= since, de más reciente a más antiguo."""
+        head, count = self.state()
+        for k in range(count):
+            idx = (head - 1 - k) % self.capacity
+            if self.ts[idx] < since:
+                break
+            yield idx
+
+
+class _Rollup:
+    """Acumulador del bucket en curso de un nivel agregado."""
+
+    def __init__(self, n_series: int, step: int):
+        self.step = step
+        self.bucket: Optional[int] = None
+        self._reset(n_series)
+
+    def _reset(self, n_series: int):
+        self.total = [0.0] * n_series
+        self.count = [0] * n_series
+        self.low = [math.inf] * n_series
+        self.high = [-math.inf] * n_series
+
+    def add(self, ts: float, row: List[Tuple[float, float, float]]) -> Optional[Tuple[int, list]]:
+        """Añade una fila; devuelve (bucket, fila agregada) al cerrar un bucket."""
+        bucket = int(ts // self.step) * self.step
+        closed = None
+        if self.bucket is not None and bucket != self.bucket:
+            closed = (self.bucket, self.result())
+            self._reset(len(row))
+        self.bucket = bucket
+        for s, (avg, mn, mx) in enumerate(row):
+            if math.isnan(avg):
+                continue
+            self.total[s] += avg
+            self.count[s] += 1
+            self.low[s] = min(self.low[s], mn)
+            self.high[s] = max(self.high[s], mx)
+        return closed
+
+    def result(self) -> List[Tuple[float, float, float]]:
+        return [
+            (self.total[s] / self.count[s], self.low[s], self.high[s]) if self.count[s] else (_NAN, _NAN, _NAN)
+            for s in range(len(self.total))
+        ]
+
+
+class MetricsStore:
+    """
+    Métricas de CPU, memoria, temperatura, carga y contenedores.
+
+    Tres niveles de resolución en arrays float32 sobre un fichero mmap:
+    muestras crudas durante 1 h, agregados de 1 min durante 24 h y de
+    15 min durante 30 días (avg/min/max). Tamaño fijo (< 2 MB).
+    """
+
+    def __init__(self, path: Path, raw_step: float = 5.0):
+        self.path = Path(path)
+        self.raw_step = max(1.0, float(raw_step))
+        self.n_series = len(SYSTEM_METRICS) + CONTAINER_SLOTS
+        self._container_names: List[str] = [""] * CONTAINER_SLOTS
+        self._container_values: List[float] = [_NAN] * CONTAINER_SLOTS
+
+        names_offset = _HEADER.size + len(TIERS) * _TIER_STATE.size
+        offset = self._align(names_offset + CONTAINER_SLOTS * NAME_SIZE)
+        self._names_offset = names_offset
+        self.tiers: List[_Tier] = []
+        for i, (name, step, horizon, rollup) in enumerate(TIERS):
+            step = step or self.raw_step
+            tier = _Tier(self, i, name, step, math.ceil(horizon / step), rollup, offset)
+            self.tiers.append(tier)
+            offset = self._align(offset + tier.nbytes)
+        self.size = offset
+
+        self._rollups = [_Rollup(self.n_series, int(t.step)) for t in self.tiers[1:]]
+        self._open()
+
+    @staticmethod
+    def _align(n: int) -> int:
+        return (n + 7) & ~7
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != self.size
+            if fresh:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+            self._mm = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+        magic, version, n_series, raw_step = _HEADER.unpack_from(self._mm, 0)
+        if not fresh and (magic != MAGIC or version != VERSION or n_series != self.n_series
+                          or raw_step != struct.unpack('<f', struct.pack('<f', self.raw_step))[0]):
+            logger.warning("Formato de métricas distinto, se reinicia el histórico")
+            self._mm[:] = bytes(self.size)
+            fresh = True
+        if fresh:
+            _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.n_series, self.raw_step)
+            for tier in self.tiers:
+                _TIER_STATE.pack_into(self._mm, tier._state_offset(), tier.capacity, 0, 0)
+
+        self._buf = memoryview(self._mm)
+        for tier in self.tiers:
+            tier.bind(self._buf)
+        for slot in range(CONTAINER_SLOTS):
+            start = self._names_offset + slot * NAME_SIZE
+            self._container_names[slot] = bytes(self._mm[start:start + NAME_SIZE]).rstrip(b'\0').decode()
+
+    # ─── Escritura ───
+
+    def set_container_states(self, states: Dict[str, float]):
+        """Estado actual por contenedor (1 = ok, 0 = caído); se repite en cada muestra."""
+        for name, value in states.items():
+            slot = self._container_slot(name, create=True)
+            if slot is not None:
+                self._container_values[slot] = value
+        for slot, name in enumerate(self._container_names):
+            if name and name not in states:
+                self._container_values[slot] = _NAN
+
+    def _container_slot(self, name: str, create: bool = False) -> Optional[int]:
+        if name in self._container_names:
+            return self._container_names.index(name)
+        if not create or "" not in self._container_names:
+            return None
+        slot = self._container_names.index("")
+        self._container_names[slot] = name
+        start = self._names_offset + slot * NAME_SIZE
+        self._mm[start:start + NAME_SIZE] = name.encode()[:NAME_SIZE].ljust(NAME_SIZE, b'\0')
+        return slot
+
+    def record(self, values: Dict[str, float], ts: Optional[float] = None):
+        """Añade una muestra cruda y propaga a los niveles agregados."""
+        ts = time.time() if ts is None else ts
+        row = [(v, v, v) for v in
+               [float(values.get(m, _NAN)) for m in SYSTEM_METRICS] + self._container_values]
+        self.tiers[0].append(int(ts), row)
+
+        # raw -> 1m -> 15m
+        for i, rollup in enumerate(self._rollups):
+            closed = rollup.add(ts, row)
+            if closed is None:
+                break
+            bucket, row = closed
+            self.tiers[i + 1].append(bucket, row)
+            ts = bucket
+
+    # ─── Consultas ───
+
+    @property
+    def container_names(self) -> List[str]:
+        return [n for n in self._container_names if n]
+
+    def _series_index(self, metric: str) -> Optional[int]:
+        if metric in SYSTEM_METRICS:
+            return SYSTEM_METRICS.index(metric)
+        slot = self._container_slot(metric)
+        return len(SYSTEM_METRICS) + slot if slot is not None else None
+
+    def _tier_for(self, window: float) -> _Tier:
+        for tier in self.tiers:
+            if tier.capacity * tier.step >= window:
+                return tier
+        return self.tiers[-1]
+
+    def summary(self, metric: str, window: float) -> Optional[MetricSummary]:
+        """min/max/avg/p95 de una métrica en los últimos `window` segundos."""
+        series = self._series_index(metric)
+        if series is None:
+            return None
+        tier = self._tier_for(window)
+        fields = tier.values[series]
+        avgs, low, high = [], math.inf, -math.inf
+        for idx in tier.window(time.time() - window):
+            avg = fields[0][idx]
+            if math.isnan(avg):
+                continue
+            avgs.append(avg)
+            low = min(low, fields[1][idx] if tier.fields == 3 else avg)
+            high = max(high, fields[2][idx] if tier.fields == 3 else avg)
+        if not avgs:
+            return None
+        avgs.sort()
+        p95 = avgs[max(0, math.ceil(0.95 * len(avgs)) - 1)]
+        return MetricSummary(min=low, max=high, avg=sum(avgs) / len(avgs), p95=p95,
+                             count=len(avgs), tier=tier.name)
+
+    def series(self, metric: str, window: float, points: int = 24) -> List[Optional[float]]:
+        """Medias en `points` intervalos iguales (None si no hay datos)."""
+        index = self._series_index(metric)
+        if index is None:
+            return []
+        tier = self._tier_for(window)
+        now = time.time()
+        since = now - window
+        width = window / points
+        totals = [0.0] * points
+        counts = [0] * points
+        avgs = tier.values[index][0]
+        for idx in tier.window(since):
+            value = avgs[idx]
+            if math.isnan(value):
+                continue
+            bucket = min(points - 1, int((tier.ts[idx] - since) // width))
+            totals[bucket] += value
+            counts[bucket] += 1
+        return [totals[i] / counts[i] if counts[i] else None for i in range(points)]
+
+    def close(self):
+        """Vuelca y cierra el mmap."""
+        if self._mm is None:
+            return
+        for tier in self.tiers:
+            tier.ts.release()
+            for fields in tier.values:
+                for view in fields:
+                    view.release()
+        self._buf.release()
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
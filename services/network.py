@@ -1,16 +1,39 @@
 """Servicio avanzado de escaneo de red."""
+import abc
 import asyncio
+import ctypes
+import fcntl
+import heapq
+import ipaddress
 import logging
+import random
 import re
 import json
 import os
+import socket
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field, asdict
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
 from pathlib import Path
+from urllib.parse import urlparse
+import tarfile
+import xml.etree.ElementTree as ET
+
+import httpx
 
 from utils.shell import run_async, run_sync
+from utils.events import EventBus
+from utils.oui import shared_registry
 from config import config
+from services.docker_engine import DockerEngine
+from services.dns_resolver import DnsLookupResult, DnsResolver
 
 logger = logging.getLogger(__name__)
 
@@ -960,29 +983,304 @@ VENDOR_DEVICE_HINTS = {
 }
 
 
-@dataclass
+# Servicios mDNS -> tipo (en orden de prioridad)
+MDNS_DEVICE_HINTS = (
+    (('_airplay', '_raop'), 'Apple'),
+    (('_googlecast',), 'SmartTV'),
+    (('_ipp', '_printer'), 'Printer'),
+    (('_homekit',), 'IoT'),
+    (('_spotify',), 'SmartSpeaker'),
+    (('_hap',), 'IoT'),         # HomeKit Accessory Protocol
+    (('_smb', '_afpovertcp'), 'NAS'),
+)
+
+# Puertos más específicos primero
+PRIORITY_PORTS = (62078, 9100, 515, 631, 32400, 8008, 8009, 548, 3283, 554)
+
+# Último recurso: palabras clave en vendor/hostname/os/mdns
+TEXT_DEVICE_HINTS = (
+    (('android', 'samsung', 'xiaomi', 'huawei', 'galaxy', 'pixel'), 'Android'),
+    (('windows', 'microsoft', 'desktop-', 'laptop-'), 'Windows'),
+    (('linux', 'ubuntu', 'debian', 'raspberry', 'pi'), 'Linux'),
+    (('tv', 'roku', 'chromecast', 'fire', 'shield', 'webos', 'tizen'), 'SmartTV'),
+    (('alexa', 'echo', 'homepod', 'google home', 'nest mini', 'sonos'), 'SmartSpeaker'),
+    (('esp', 'tasmota', 'tuya', 'shelly', 'sonoff', 'smart'), 'IoT'),
+    (('router', 'gateway', 'vodafone', 'modem'), 'Router'),
+    (('printer', 'print', 'hp ', 'epson', 'canon', 'brother'), 'Printer'),
+    (('camera', 'cam', 'ring', 'nest cam', 'hikvision', 'reolink'), 'Camera'),
+    (('playstation', 'ps4', 'ps5', 'xbox', 'nintendo', 'switch'), 'Gaming'),
+    (('synology', 'qnap', 'nas', 'diskstation'), 'NAS'),
+)
+
+
+class DeviceClassifier:
+    """
+    Clasificador de tipo de dispositivo con tablas precompiladas.
+
+    Los patrones de hostname se unen en una sola alternancia (gana el
+    primero en orden, igual que probarlos uno a uno) y los fabricantes
+    se buscan en un trie de prefijos en minúsculas.
+    """
+
+    def __init__(self, hostname_patterns: Dict[str, Tuple[str, str]] = None,
+                 vendor_hints: Dict[str, str] = None):
+        hostname_patterns = HOSTNAME_PATTERNS if hostname_patterns is None else hostname_patterns
+        vendor_hints = VENDOR_DEVICE_HINTS if vendor_hints is None else vendor_hints
+
+        self._hostname_results = list(hostname_patterns.values())
+        alternatives = [
+            f"(?P<p{i}>(?:{pattern.removeprefix('(?i)')}))"
+            for i, pattern in enumerate(hostname_patterns)
+        ]
+        self._hostname_re = re.compile('|'.join(alternatives), re.IGNORECASE)
+
+        # Trie: nodo = dict de caracteres; '' guarda (orden, tipo) del fabricante
+        self._vendor_trie: dict = {}
+        for order, (key, hint) in enumerate(vendor_hints.items()):
+            node = self._vendor_trie
+            for char in key.lower():
+                node = node.setdefault(char, {})
+            node.setdefault('', (order, hint))
+
+    def match_hostname(self, hostname: str) -> Tuple[Optional[str], Optional[str]]:
+        """(nombre, tipo) del primer patrón de hostname que encaja."""
+        match = self._hostname_re.match(hostname)
+        if not match:
+            return None, None
+        return self._hostname_results[int(match.lastgroup[1:])]
+
+    def match_vendor(self, vendor: str) -> Optional[str]:
+        """Tipo del primer fabricante (en orden de la tabla) contenido en `vendor`."""
+        text = vendor.lower()
+        best = None
+        for start in range(len(text)):
+            node = self._vendor_trie
+            for char in text[start:]:
+                node = node.get(char)
+                if node is None:
+                    break
+                found = node.get('')
+                if found and (best is None or found[0] < best[0]):
+                    best = found
+        return best[1] if best else None
+
+    @staticmethod
+    def match_mdns(services: List[str]) -> Optional[str]:
+        joined = ' '.join(services).lower()
+        for keys, dev_type in MDNS_DEVICE_HINTS:
+            if any(k in joined for k in keys):
+                return dev_type
+        return None
+
+    @staticmethod
+    def match_ports(ports: List[int]) -> Optional[str]:
+        for port in PRIORITY_PORTS:
+            if port in ports:
+                for _, dev_type in PORT_FINGERPRINTS.get(port, []):
+                    if dev_type:
+                        return dev_type
+        return None
+
+    @staticmethod
+    def match_ssdp(ssdp_info: str) -> Optional[str]:
+        ssdp = ssdp_info.lower()
+        if 'tv' in ssdp or 'mediarenderer' in ssdp:
+            return 'SmartTV'
+        if 'printer' in ssdp:
+            return 'Printer'
+        if 'nas' in ssdp or 'storage' in ssdp:
+            return 'NAS'
+        return None
+
+    @staticmethod
+    def match_text(text: str) -> str:
+        if 'iphone' in text or 'ipad' in text:
+            return "iOS"
+        if 'apple' in text and 'tv' not in text:
+            return "Apple"
+        for keys, dev_type in TEXT_DEVICE_HINTS:
+            if any(k in text for k in keys):
+                return dev_type
+        return "Unknown"
+
+    def classify(self, device: "NetworkDevice") -> Tuple[Optional[str], str]:
+        """
+        Devuelve (nombre por hostname o None, tipo).
+
+        Prioridad: manual > hostname > mDNS > puertos > SSDP > fabricante > texto.
+        """
+        name, dtype = self.match_hostname(device.hostname or device.mdns_name or "")
+        if device.detected_type:
+            return name, device.detected_type
+        if dtype:
+            return name, dtype
+
+        dtype = (
+            (self.match_mdns(device.mdns_services) if device.mdns_services else None)
+            or (self.match_ports(device.open_ports) if device.open_ports else None)
+            or (self.match_ssdp(device.ssdp_info) if device.ssdp_info else None)
+            or (self.match_vendor(device.vendor) if device.vendor else None)
+        )
+        if dtype:
+            return name, dtype
+
+        text = f"{device.vendor} {device.hostname} {device.os_guess} {device.mdns_name}".lower()
+        return name, self.match_text(text)
+
+
+DEVICE_CLASSIFIER = DeviceClassifier()
+
+
+_NO_PORTS = array('H')
+
+
+def is_locally_administered(mac: str) -> bool:
+    """Bit U/L del primer octeto: MAC asignada localmente (aleatoria)."""
+    try:
+        return bool(int(mac[:2], 16) & 0x02)
+    except ValueError:
+        return False
+
+
+def _epoch(value) -> int:
+    """datetime/número/None -> segundos epoch (int)."""
+    if value is None:
+        return int(time.time())
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
 class NetworkDevice:
-    """Dispositivo de red con información completa."""
-    mac: str
-    ip: str
-    hostname: str = ""
-    vendor: str = ""
-    os_guess: str = ""
-    open_ports: List[int] = field(default_factory=list)
-    last_seen: datetime = field(default_factory=datetime.now)
-    first_seen: datetime = field(default_factory=datetime.now)
-    times_seen: int = 1
-    source: str = ""
-    is_online: bool = True
-    mdns_name: str = ""        # Nombre mDNS/Bonjour
-    mdns_services: List[str] = field(default_factory=list)  # Servicios anunciados
-    ssdp_info: str = ""        # Info SSDP/UPnP
-    detected_type: str = ""    # Tipo detectado manualmente
-
-    def __post_init__(self):
-        self.mac = self._format_mac(self.mac)
-        if not self.vendor:
-            self.vendor = self._lookup_vendor(self.mac)
+    """
+    Dispositivo de red con información completa.
+
+    Representación compacta para historiales grandes: __slots__, cadenas
+    repetidas (fabricante, origen, SO, servicios) internadas, puertos en
+    array('H') ordenado y marcas de tiempo como epoch. Las listas se
+    sustituyen por asignación, no se modifican in situ.
+    """
+
+    __slots__ = (
+        'mac', 'ip', 'hostname', '_vendor', '_os_guess', '_open_ports',
+        '_last_seen', '_first_seen', 'times_seen', '_source', 'is_online',
+        'mdns_name', '_mdns_services', 'ssdp_info', 'detected_type', 'client_id', '_classification',
+    )
+
+    def __init__(
+        self,
+        mac: str,
+        ip: str,
+        hostname: str = "",
+        vendor: str = "",
+        os_guess: str = "",
+        open_ports: Iterable[int] = (),
+        last_seen=None,
+        first_seen=None,
+        times_seen: int = 1,
+        source: str = "",
+        is_online: bool = True,
+        mdns_name: str = "",        # Nombre mDNS/Bonjour
+        mdns_services: Iterable[str] = (),  # Servicios anunciados
+        ssdp_info: str = "",        # Info SSDP/UPnP
+        detected_type: str = "",    # Tipo detectado manualmente
+        client_id: str = "",        # Client-ID DHCP (opción 61)
+    ):
+        self.mac = self._format_mac(mac)
+        self.ip = ip
+        self.hostname = hostname
+        self.vendor = vendor or self._lookup_vendor(self.mac)
+        self.os_guess = os_guess
+        self.open_ports = open_ports
+        now = int(time.time())
+        self._last_seen = now if last_seen is None else _epoch(last_seen)
+        self._first_seen = now if first_seen is None else _epoch(first_seen)
+        self.times_seen = times_seen
+        self.source = source
+        self.is_online = is_online
+        self.mdns_name = mdns_name
+        self.mdns_services = mdns_services
+        self.ssdp_info = ssdp_info
+        self.detected_type = detected_type
+        self.client_id = client_id
+        self._classification: Optional[tuple] = None
+
+    def __repr__(self) -> str:
+        return (f"NetworkDevice(mac={self.mac!r}, ip={self.ip!r}, hostname={self.hostname!r}, "
+                f"vendor={self.vendor!r}, source={self.source!r}, is_online={self.is_online})")
+
+    # ─── Campos compactos ───
+
+    @property
+    def vendor(self) -> str:
+        return self._vendor
+
+    @vendor.setter
+    def vendor(self, value: str):
+        self._vendor = sys.intern(value or "")
+
+    @property
+    def os_guess(self) -> str:
+        return self._os_guess
+
+    @os_guess.setter
+    def os_guess(self, value: str):
+        self._os_guess = sys.intern(value or "")
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    @source.setter
+    def source(self, value: str):
+        self._source = sys.intern(value or "")
+
+    @property
+    def open_ports(self) -> array:
+        """Puertos abiertos (array('H') ordenado, sin duplicados)."""
+        return self._open_ports
+
+    @open_ports.setter
+    def open_ports(self, ports: Iterable[int]):
+        self._open_ports = array('H', sorted(set(ports))) if ports else _NO_PORTS
+
+    @property
+    def mdns_services(self) -> Tuple[str, ...]:
+        """Servicios mDNS (tupla ordenada, sin duplicados)."""
+        return self._mdns_services
+
+    @mdns_services.setter
+    def mdns_services(self, services: Iterable[str]):
+        self._mdns_services = tuple(sorted({sys.intern(s) for s in services})) if services else ()
+
+    @property
+    def last_seen(self) -> datetime:
+        return datetime.fromtimestamp(self._last_seen)
+
+    @last_seen.setter
+    def last_seen(self, value):
+        self._last_seen = _epoch(value)
+
+    @property
+    def first_seen(self) -> datetime:
+        return datetime.fromtimestamp(self._first_seen)
+
+    @first_seen.setter
+    def first_seen(self, value):
+        self._first_seen = _epoch(value)
+
+    @property
+    def is_random_mac(self) -> bool:
+        """MAC localmente administrada (privada/aleatoria de iOS, Android, Windows...)."""
+        return is_locally_administered(self.mac)
+
+    @property
+    def last_seen_ts(self) -> int:
+        return self._last_seen
+
+    @property
+    def first_seen_ts(self) -> int:
+        return self._first_seen
 
     @staticmethod
     def _format_mac(mac: str) -> str:
@@ -996,9 +1294,14 @@ class NetworkDevice:
 
     @staticmethod
     def _lookup_vendor(mac: str) -> str:
-        """Busca fabricante en base de datos OUI."""
+        """Busca fabricante en el registro IEEE (prefijo más largo) o en OUI_DATABASE."""
         if not mac or len(mac) < 8:
             return ""
+        registry = shared_registry(config.OUI_DB)
+        if registry:
+            vendor = registry.lookup(mac)
+            if vendor:
+                return vendor
         prefix = mac[:8].upper()
         return OUI_DATABASE.get(prefix, "")
 
@@ -1014,134 +1317,29 @@ class NetworkDevice:
             return self.vendor
         return self.ip
 
-    def _detect_from_hostname(self) -> Tuple[Optional[str], Optional[str]]:
-        """Detecta tipo desde hostname con patrones."""
-        hostname = self.hostname or self.mdns_name or ""
-        for pattern, (name, dev_type) in HOSTNAME_PATTERNS.items():
-            if re.match(pattern, hostname):
-                return name, dev_type
-        return None, None
-
-    def _detect_from_ports(self) -> Optional[str]:
-        """Detecta tipo desde puertos abiertos."""
-        if not self.open_ports:
-            return None
-
-        # Priorizar puertos más específicos
-        priority_ports = [62078, 9100, 515, 631, 32400, 8008, 8009, 548, 3283, 554]
-        for port in priority_ports:
-            if port in self.open_ports:
-                for name, dev_type in PORT_FINGERPRINTS.get(port, []):
-                    if dev_type:
-                        return dev_type
-        return None
-
-    def _detect_from_mdns(self) -> Optional[str]:
-        """Detecta tipo desde servicios mDNS."""
-        services = ' '.join(self.mdns_services).lower()
-
-        if '_airplay' in services or '_raop' in services:
-            return 'Apple'
-        if '_googlecast' in services:
-            return 'SmartTV'
-        if '_ipp' in services or '_printer' in services:
-            return 'Printer'
-        if '_homekit' in services:
-            return 'IoT'
-        if '_spotify' in services:
-            return 'SmartSpeaker'
-        if '_hap' in services:  # HomeKit Accessory Protocol
-            return 'IoT'
-        if '_smb' in services or '_afpovertcp' in services:
-            return 'NAS'
-        return None
+    def _classify(self) -> Tuple[Optional[str], str]:
+        """(nombre, tipo) memoizado mientras no cambien los datos de entrada."""
+        key = (self.detected_type, self.hostname, self.mdns_name, self._mdns_services,
+               self._open_ports.tobytes(), self.ssdp_info, self._vendor, self._os_guess)
+        cached = self._classification
+        if cached is None or cached[0] != key:
+            cached = self._classification = (key, DEVICE_CLASSIFIER.classify(self))
+        return cached[1]
 
-    def _detect_from_vendor(self) -> Optional[str]:
-        """Detecta tipo desde vendor."""
-        if not self.vendor:
-            return None
-        vendor_lower = self.vendor.lower()
-        for vendor_key, hint in VENDOR_DEVICE_HINTS.items():
-            if vendor_key.lower() in vendor_lower:
-                return hint
-        return None
+    def invalidate_classification(self):
+        """Descarta el tipo memoizado (tras fusionar datos nuevos)."""
+        self._classification = None
 
     @property
     def device_type(self) -> str:
         """Tipo de dispositivo inferido con múltiples fuentes."""
-        # Si está manualmente detectado, usar ese
-        if self.detected_type:
-            return self.detected_type
-
-        # 1. Hostname patterns (más fiable)
-        name, dtype = self._detect_from_hostname()
-        if dtype:
-            return dtype
-
-        # 2. mDNS services
-        mdns_type = self._detect_from_mdns()
-        if mdns_type:
-            return mdns_type
-
-        # 3. Puertos específicos
-        port_type = self._detect_from_ports()
-        if port_type:
-            return port_type
-
-        # 4. SSDP info
-        if self.ssdp_info:
-            ssdp = self.ssdp_info.lower()
-            if 'tv' in ssdp or 'mediarenderer' in ssdp:
-                return 'SmartTV'
-            if 'printer' in ssdp:
-                return 'Printer'
-            if 'nas' in ssdp or 'storage' in ssdp:
-                return 'NAS'
-
-        # 5. Vendor hints
-        vendor_type = self._detect_from_vendor()
-        if vendor_type:
-            return vendor_type
-
-        # 6. Fallback: análisis de texto
-        text = f"{self.vendor} {self.hostname} {self.os_guess} {self.mdns_name}".lower()
-
-        if any(x in text for x in ['iphone', 'ipad']):
-            return "iOS"
-        if 'apple' in text and 'tv' not in text:
-            return "Apple"
-        if any(x in text for x in ['android', 'samsung', 'xiaomi', 'huawei', 'galaxy', 'pixel']):
-            return "Android"
-        if any(x in text for x in ['windows', 'microsoft', 'desktop-', 'laptop-']):
-            return "Windows"
-        if any(x in text for x in ['linux', 'ubuntu', 'debian', 'raspberry', 'pi']):
-            return "Linux"
-        if any(x in text for x in ['tv', 'roku', 'chromecast', 'fire', 'shield', 'webos', 'tizen']):
-            return "SmartTV"
-        if any(x in text for x in ['alexa', 'echo', 'homepod', 'google home', 'nest mini', 'sonos']):
-            return "SmartSpeaker"
-        if any(x in text for x in ['esp', 'tasmota', 'tuya', 'shelly', 'sonoff', 'smart']):
-            return "IoT"
-        if any(x in text for x in ['router', 'gateway', 'vodafone', 'modem']):
-            return "Router"
-        if any(x in text for x in ['printer', 'print', 'hp ', 'epson', 'canon', 'brother']):
-            return "Printer"
-        if any(x in text for x in ['camera', 'cam', 'ring', 'nest cam', 'hikvision', 'reolink']):
-            return "Camera"
-        if any(x in text for x in ['playstation', 'ps4', 'ps5', 'xbox', 'nintendo', 'switch']):
-            return "Gaming"
-        if any(x in text for x in ['synology', 'qnap', 'nas', 'diskstation']):
-            return "NAS"
-
-        return "Unknown"
+        return self._classify()[1]
 
     @property
     def device_name(self) -> str:
         """Nombre específico del dispositivo si se conoce."""
-        name, _ = self._detect_from_hostname()
-        if name:
-            return name
-        return self.device_type
+        name, dtype = self._classify()
+        return name or dtype
 
     @property
     def icon(self) -> str:
@@ -1177,395 +1375,2872 @@ class NetworkDevice:
         return icons.get(self.device_type, "📶")
 
 
-class NetworkService:
-    """Servicio avanzado de red."""
-
-    def __init__(self):
-        self._cache: Dict[str, NetworkDevice] = {}
-        self._last_scan: Optional[datetime] = None
-        self._history_file = Path(config.DATA_DIR) / "network_history.json"
-        self._load_history()
+# ═══════════════════════════════════════════════════════════════
+# BARRIDO ARP NATIVO
+# ═══════════════════════════════════════════════════════════════
 
-    def _load_history(self):
-        """Carga historial de dispositivos."""
-        if not self._history_file.exists():
-            return
+ETH_P_ARP = 0x0806
+BROADCAST_MAC = b'\xff' * 6
 
-        try:
-            with open(self._history_file) as f:
-                data = json.load(f)
-            for mac, info in data.items():
-                self._cache[mac] = NetworkDevice(
-                    mac=mac,
-                    ip=info.get('ip', ''),
-                    hostname=info.get('hostname', ''),
-                    vendor=info.get('vendor', ''),
-                    os_guess=info.get('os_guess', ''),
-                    open_ports=info.get('open_ports', []),
-                    first_seen=datetime.fromisoformat(info['first_seen']) if 'first_seen' in info else datetime.now(),
-                    last_seen=datetime.fromisoformat(info['last_seen']) if 'last_seen' in info else datetime.now(),
-                    times_seen=info.get('times_seen', 1),
-                    is_online=False
-                )
-        except Exception as e:
-            logger.error(f"Error cargando historial: {e}")
 
-    def _save_history(self):
-        """Guarda historial de dispositivos."""
-        try:
-            config.ensure_data_dir()
-            data = {}
-            for mac, device in self._cache.items():
-                data[mac] = {
-                    'ip': device.ip,
-                    'hostname': device.hostname,
-                    'vendor': device.vendor,
-                    'os_guess': device.os_guess,
-                    'open_ports': device.open_ports,
-                    'first_seen': device.first_seen.isoformat(),
-                    'last_seen': device.last_seen.isoformat(),
-                    'times_seen': device.times_seen,
-                }
-            with open(self._history_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error guardando historial: {e}")
+def _mac_to_str(raw: bytes) -> str:
+    """Convierte MAC binaria a formato AA:BB:CC:DD:EE:FF."""
+    return ':'.join(f'{b:02X}' for b in raw)
 
-    async def scan_all(self, deep: bool = False, use_cache: bool = False) -> List[NetworkDevice]:
-        """
-        Escaneo completo de red.
 
-        Args:
-            deep: Si True, hace escaneo nmap (más lento pero más info)
-            use_cache: Si True, devuelve cache si fue escaneado hace menos de 30s
-        """
-        # Si use_cache y el cache es reciente, devolver cache
-        if use_cache and self._last_scan:
-            age = (datetime.now() - self._last_scan).total_seconds()
-            if age < 30:
-                online = [d for d in self._cache.values() if d.is_online]
-                return sorted(online, key=lambda d: self._ip_sort_key(d.ip))
+def _mac_to_bytes(mac: str) -> bytes:
+    """Convierte MAC en texto a 6 bytes."""
+    return bytes.fromhex(mac.replace(':', '').replace('-', ''))
 
-        # Marcar todos como offline
-        for device in self._cache.values():
-            device.is_online = False
 
-        # Escaneos en paralelo (básicos + discovery)
-        tasks = [
-            self._scan_arp(),
-            self._scan_dhcp_leases(),
-            self._scan_pihole_network(),
-            self._scan_mdns(),      # Descubrimiento mDNS/Bonjour
-            self._scan_ssdp(),      # Descubrimiento UPnP/SSDP
-        ]
+def build_arp_request(src_mac: bytes, src_ip: str, dst_ip: str) -> bytes:
+    """Construye trama Ethernet con ARP who-has (broadcast)."""
+    eth = BROADCAST_MAC + src_mac + struct.pack('!H', ETH_P_ARP)
+    arp = struct.pack(
+        '!HHBBH6s4s6s4s',
+        1, 0x0800, 6, 4, 1,
+        src_mac, socket.inet_aton(src_ip),
+        b'\x00' * 6, socket.inet_aton(dst_ip)
+    )
+    return eth + arp
 
-        if deep:
-            tasks.append(self._scan_nmap())
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+def build_arp_reply(src_mac: bytes, src_ip: str, dst_mac: bytes, dst_ip: str) -> bytes:
+    """Construye trama Ethernet con ARP is-at (unicast)."""
+    eth = dst_mac + src_mac + struct.pack('!H', ETH_P_ARP)
+    arp = struct.pack(
+        '!HHBBH6s4s6s4s',
+        1, 0x0800, 6, 4, 2,
+        src_mac, socket.inet_aton(src_ip),
+        dst_mac, socket.inet_aton(dst_ip)
+    )
+    return eth + arp
 
-        # Combinar resultados
-        for result in results:
-            if isinstance(result, Exception):
-                logger.error(f"Error en scan: {result}")
-                continue
-            for device in result:
-                self._merge_device(device)
 
-        self._last_scan = datetime.now()
-        self._save_history()
+def parse_arp_frame(frame: bytes) -> Optional[Tuple[int, str, str, str]]:
+    """
+    Parsea trama Ethernet/ARP.
 
-        # Devolver solo los online, ordenados
-        online = [d for d in self._cache.values() if d.is_online]
-        return sorted(online, key=lambda d: self._ip_sort_key(d.ip))
+    Returns:
+        Tuple (opcode, sender_ip, sender_mac, target_ip) o None
+    """
+    if len(frame) < 42 or frame[12:14] != b'\x08\x06':
+        return None
+    _, ptype, hlen, plen, op = struct.unpack('!HHBBH', frame[14:22])
+    if ptype != 0x0800 or hlen != 6 or plen != 4:
+        return None
+    return (
+        op,
+        socket.inet_ntoa(frame[28:32]),
+        _mac_to_str(frame[22:28]),
+        socket.inet_ntoa(frame[38:42]),
+    )
 
-    def _merge_device(self, new: NetworkDevice):
-        """Merge información de dispositivo."""
-        mac = new.mac
-        if mac in self._cache:
-            existing = self._cache[mac]
-            existing.ip = new.ip or existing.ip
-            existing.hostname = new.hostname or existing.hostname
-            existing.vendor = new.vendor or existing.vendor
-            existing.os_guess = new.os_guess or existing.os_guess
-            # Nuevos campos de discovery
-            existing.mdns_name = new.mdns_name or existing.mdns_name
-            existing.ssdp_info = new.ssdp_info or existing.ssdp_info
-            if new.mdns_services:
-                existing.mdns_services = list(set(existing.mdns_services + new.mdns_services))
-            if new.open_ports:
-                existing.open_ports = list(set(existing.open_ports + new.open_ports))
-            existing.last_seen = datetime.now()
-            existing.times_seen += 1
-            existing.is_online = True
-        else:
-            new.is_online = True
-            new.first_seen = datetime.now()
-            self._cache[mac] = new
 
-    async def _scan_arp(self) -> List[NetworkDevice]:
-        """Escaneo ARP rápido."""
-        devices = []
-        stdout, stderr, code = await run_async(
-            "sudo arp-scan -l -q --retry=2 2>/dev/null",
-            timeout=30
-        )
+def default_interface() -> str:
+    """Interfaz de la ruta por defecto (según /proc/net/route)."""
+    try:
+        with open('/proc/net/route') as f:
+            next(f)
+            for line in f:
+                parts = line.split()
+                if len(parts) > 1 and parts[1] == '00000000':
+                    return parts[0]
+    except (OSError, StopIteration):
+        pass
+    return "eth0"
 
-        if code != 0:
-            logger.warning(f"arp-scan falló: {stderr}")
-            return devices
 
-        for line in stdout.split('\n'):
-            if not line or not re.match(r'^\d+\.', line):
-                continue
-            parts = line.split('\t')
-            if len(parts) >= 2:
-                devices.append(NetworkDevice(
-                    ip=parts[0].strip(),
-                    mac=parts[1].strip(),
-                    vendor=parts[2].strip() if len(parts) > 2 else "",
-                    source="arp"
-                ))
+class ArpTransport(abc.ABC):
+    """Transporte L2 del motor ARP (interfaz enchufable)."""
 
-        return devices
+    mac: bytes = b''
+    ip: str = ''
 
-    async def _scan_dhcp_leases(self) -> List[NetworkDevice]:
-        """Lee leases DHCP de Pi-hole."""
-        devices = []
-        stdout, _, code = await run_async(
-            "docker exec pihole cat /etc/pihole/dhcp.leases 2>/dev/null",
-            timeout=10
-        )
+    @abc.abstractmethod
+    def open(self, on_frame: Callable[[bytes], None]) -> None:
+        """Abre el transporte y entrega cada trama recibida a on_frame."""
 
-        if code != 0 or not stdout:
-            return devices
+    @abc.abstractmethod
+    def send(self, frame: bytes) -> None:
+        """Envía una trama Ethernet completa."""
 
-        for line in stdout.split('\n'):
-            parts = line.split()
-            if len(parts) >= 4:
-                hostname = parts[3] if parts[3] != '*' else ""
-                devices.append(NetworkDevice(
-                    mac=parts[1],
-                    ip=parts[2],
-                    hostname=hostname,
-                    source="dhcp"
-                ))
+    def close(self) -> None:
+        """Libera recursos."""
 
-        return devices
 
-    async def _scan_pihole_network(self) -> List[NetworkDevice]:
-        """Lee tabla de red de Pi-hole."""
-        devices = []
-        stdout, _, code = await run_async(
-            '''docker exec pihole sqlite3 /etc/pihole/pihole-FTL.db \
-            "SELECT hwaddr, ip, name FROM network WHERE hwaddr != '' ORDER BY lastQuery DESC LIMIT 100" 2>/dev/null''',
-            timeout=10
-        )
+class RawArpTransport(ArpTransport):
+    """Socket AF_PACKET real (requiere CAP_NET_RAW)."""
 
-        if code != 0 or not stdout:
-            return devices
+    def __init__(self, interface: str):
+        self.interface = interface
+        self._sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
-        for line in stdout.split('\n'):
-            parts = line.split('|')
-            if len(parts) >= 2 and parts[0]:
-                devices.append(NetworkDevice(
-                    mac=parts[0],
-                    ip=parts[1] if len(parts) > 1 else "",
-                    hostname=parts[2] if len(parts) > 2 else "",
-                    source="pihole"
-                ))
+    def open(self, on_frame: Callable[[bytes], None]) -> None:
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        try:
+            sock.setblocking(False)
+            sock.bind((self.interface, ETH_P_ARP))
+            self.mac = sock.getsockname()[4]
+            self.ip = self._interface_ip(self.interface)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._on_readable, on_frame)
+
+    def _on_readable(self, on_frame: Callable[[bytes], None]):
+        while True:
+            try:
+                frame = self._sock.recv(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"Error leyendo socket ARP: {e}")
+                return
+            on_frame(frame)
+
+    def send(self, frame: bytes) -> None:
+        try:
+            self._sock.send(frame)
+        except BlockingIOError:
+            # Buffer lleno: el host quedará pendiente para el reintento
+            pass
 
-        return devices
+    def close(self) -> None:
+        if self._sock is None:
+            return
+        if self._loop:
+            self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
 
-    async def _scan_mdns(self) -> List[NetworkDevice]:
-        """Descubrimiento de dispositivos via mDNS/Bonjour/Avahi."""
-        devices = []
+    @staticmethod
+    def _interface_ip(interface: str) -> str:
+        """IPv4 de la interfaz vía ioctl SIOCGIFADDR."""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            packed = fcntl.ioctl(
+                s.fileno(), 0x8915,  # SIOCGIFADDR
+                struct.pack('256s', interface[:15].encode())
+            )
+        return socket.inet_ntoa(packed[20:24])
+
+
+class FakeL2Transport(ArpTransport):
+    """Segmento L2 en memoria: responde ARP según un mapa IP -> MAC."""
+
+    def __init__(
+        self,
+        hosts: Dict[str, str],
+        latency: float = 0.001,
+        loss: float = 0.0,
+        mac: str = "02:00:00:00:00:01",
+        ip: str = "192.168.1.2"
+    ):
+        self.hosts = {h_ip: _mac_to_bytes(h_mac) for h_ip, h_mac in hosts.items()}
+        self.latency = latency
+        self.loss = loss
+        self.mac = _mac_to_bytes(mac)
+        self.ip = ip
+        self.frames_sent = 0
+        self._on_frame: Optional[Callable[[bytes], None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def open(self, on_frame: Callable[[bytes], None]) -> None:
+        self._on_frame = on_frame
+        self._loop = asyncio.get_running_loop()
+
+    def send(self, frame: bytes) -> None:
+        self.frames_sent += 1
+        parsed = parse_arp_frame(frame)
+        if not parsed or parsed[0] != 1:
+            return
+        _, sender_ip, _, target_ip = parsed
+        host_mac = self.hosts.get(target_ip)
+        if host_mac is None or random.random() < self.loss:
+            return
+        reply = build_arp_reply(host_mac, target_ip, self.mac, sender_ip)
+        self._loop.call_later(self.latency, self._on_frame, reply)
+
+    def close(self) -> None:
+        self._on_frame = None
+
+
+class ArpSweeper:
+    """
+    Barrido ARP en proceso.
+
+    Envía peticiones en pipeline a todo el rango a ritmo fijo, recoge
+    respuestas de forma asíncrona y reintenta solo los hosts que no
+    respondieron, con ventana de espera adaptada al RTT observado.
+    """
+
+    def __init__(
+        self,
+        transport: ArpTransport,
+        network: str,
+        rate: int = 300,
+        retries: int = 2,
+        timeout: float = 1.0
+    ):
+        self.transport = transport
+        self.network = ipaddress.ip_network(network, strict=False)
+        self.rate = max(1, rate)
+        self.retries = max(0, retries)
+        self.timeout = timeout
+        self.last_stats: Dict[str, float] = {}
+
+    def _reply_window(self, rtts: List[float], attempt: int) -> float:
+        """Tiempo de espera tras cada ronda según RTT observado."""
+        if not rtts:
+            return self.timeout
+        window = max(rtts) * 3 * (attempt + 1)
+        return min(self.timeout, max(0.05, window))
+
+    async def sweep(self) -> List[NetworkDevice]:
+        """Ejecuta el barrido y devuelve dispositivos que respondieron."""
+        loop = asyncio.get_running_loop()
+        replies: Dict[str, str] = {}
+        sent_at: Dict[str, float] = {}     # primer envío a cada IP
+        attempts: Dict[str, int] = {}
+        rtts: List[float] = []
+
+        def on_frame(frame: bytes):
+            parsed = parse_arp_frame(frame)
+            if not parsed or parsed[0] != 2:
+                return
+            _, ip, mac, _ = parsed
+            if ip in replies or ipaddress.ip_address(ip) not in self.network:
+                return
+            replies[ip] = mac
+            # ARP no identifica el intento: tras un reintento la respuesta es
+            # ambigua y no da muestra de RTT (algoritmo de Karn)
+            if attempts.get(ip) == 1:
+                rtts.append(loop.time() - sent_at[ip])
+
+        started = loop.time()
+        self.transport.open(on_frame)
+        own_ip = self.transport.ip
+        targets = [str(h) for h in self.network.hosts() if str(h) != own_ip]
+        interval = 1.0 / self.rate
+        sent = rounds = 0
+        try:
+            for attempt in range(self.retries + 1):
+                pending = [ip for ip in targets if ip not in replies]
+                if not pending:
+                    break
+                rounds += 1
+                round_start = loop.time()
+                for i, ip in enumerate(pending):
+                    sent_at.setdefault(ip, loop.time())
+                    attempts[ip] = attempts.get(ip, 0) + 1
+                    self.transport.send(build_arp_request(self.transport.mac, own_ip, ip))
+                    sent += 1
+                    # Pacing: ceder al loop cuando vamos adelantados
+                    delay = round_start + (i + 1) * interval - loop.time()
+                    if delay > 0.002:
+                        await asyncio.sleep(delay)
+                await asyncio.sleep(self._reply_window(rtts, attempt))
+        finally:
+            self.transport.close()
+
+        self.last_stats = {
+            'targets': len(targets),
+            'sent': sent,
+            'replies': len(replies),
+            'rounds': rounds,
+            'rtt': max(rtts, default=0.0),
+            'elapsed': loop.time() - started,
+        }
 
-        # Servicios mDNS comunes a buscar
-        services = [
-            '_airplay._tcp',      # Apple AirPlay
-            '_raop._tcp',         # Apple Remote Audio
-            '_googlecast._tcp',   # Chromecast
-            '_spotify-connect._tcp',  # Spotify
-            '_ipp._tcp',          # Impresoras IPP
-            '_printer._tcp',      # Impresoras
-            '_http._tcp',         # Servidores web
-            '_homekit._tcp',      # HomeKit
-            '_hap._tcp',          # HomeKit Accessory Protocol
-            '_smb._tcp',          # Samba/Windows shares
-            '_afpovertcp._tcp',   # Apple File Protocol
-            '_ssh._tcp',          # SSH servers
-            '_device-info._tcp',  # Device info
+        return [
+            NetworkDevice(ip=ip, mac=mac, source="arp")
+            for ip, mac in replies.items()
         ]
 
-        for service in services:
-            try:
-                stdout, _, code = await run_async(
-                    f"avahi-browse -rpt {service} 2>/dev/null | head -50",
-                    timeout=5
-                )
 
-                if code != 0 or not stdout:
-                    continue
+# ═══════════════════════════════════════════════════════════════
+# TABLA DE VECINOS DEL KERNEL (NETLINK)
+# ═══════════════════════════════════════════════════════════════
+
+NETLINK_ROUTE = 0
+RTMGRP_NEIGH = 0x4
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+NDA_DST = 1
+NDA_LLADDR = 2
+
+NUD_INCOMPLETE = 0x01
+NUD_REACHABLE = 0x02
+NUD_STALE = 0x04
+NUD_DELAY = 0x08
+NUD_PROBE = 0x10
+NUD_FAILED = 0x20
+NUD_PERMANENT = 0x80
+# Estados en los que el vecino se considera presente
+NUD_ALIVE = NUD_REACHABLE | NUD_PERMANENT
+# Sin confirmar: el kernel mantiene STALE minutos después de que el equipo
+# se vaya, así que sólo motivan una sonda activa (que acaba en REACHABLE o FAILED)
+NUD_UNCONFIRMED = NUD_STALE | NUD_DELAY | NUD_PROBE
+
+# Segundos mínimos entre sondas activas a la misma IP. Los equipos ya online
+# pasan a STALE en cuanto dejan de hablar con el Pi: basta sondearlos de tarde
+# en tarde para notar que se fueron antes del siguiente escaneo completo
+NEIGHBOUR_PROBE_INTERVAL = 30.0
+NEIGHBOUR_ONLINE_PROBE_INTERVAL = 300.0
+# IPs recordadas como sondeadas (las más antiguas se olvidan primero)
+NEIGHBOUR_PROBES_MAX = 1024
 
-                for line in stdout.split('\n'):
-                    if not line or line.startswith('+'):
-                        continue
 
-                    parts = line.split(';')
-                    if len(parts) < 8:
-                        continue
+@dataclass
+class NeighbourEvent:
+    """Cambio en la tabla de vecinos del kernel."""
+    ip: str
+    mac: str
+    online: bool
+    state: int
+    unconfirmed: bool = False   # STALE/DELAY/PROBE: ni online ni offline
+
+
+def _nl_align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def parse_neighbour_messages(data: bytes) -> List[NeighbourEvent]:
+    """Parsea un datagrama netlink con mensajes RTM_NEWNEIGH/RTM_DELNEIGH."""
+    events = []
+    offset = 0
+    while offset + 16 <= len(data):
+        length, msg_type, _, _, _ = struct.unpack_from('=IHHII', data, offset)
+        if length < 16:
+            break
+        if msg_type in (RTM_NEWNEIGH, RTM_DELNEIGH):
+            event = _parse_ndmsg(msg_type, data[offset + 16:offset + length])
+            if event:
+                events.append(event)
+        offset += _nl_align(length)
+    return events
+
+
+def _parse_ndmsg(msg_type: int, payload: bytes) -> Optional[NeighbourEvent]:
+    """Parsea cuerpo ndmsg + atributos NDA_*."""
+    if len(payload) < 12:
+        return None
+    family, _, state, _, _ = struct.unpack_from('=B3xiHBB', payload, 0)
+    if family != socket.AF_INET:
+        return None
 
-                    try:
-                        # =;interface;protocol;name;type;domain;hostname;ip;port;txt
-                        if parts[0] != '=':
-                            continue
-
-                        hostname = parts[6].replace('.local', '') if len(parts) > 6 else ''
-                        ip = parts[7] if len(parts) > 7 else ''
-
-                        if not ip or not ip.startswith('192.168.'):
-                            continue
-
-                        # Obtener MAC via ARP
-                        arp_out, _, _ = await run_async(f"arp -n {ip} 2>/dev/null", timeout=2)
-                        mac = ""
-                        if arp_out:
-                            mac_match = re.search(r'([0-9a-f:]{17})', arp_out, re.I)
-                            if mac_match:
-                                mac = mac_match.group(1)
-
-                        if not mac:
-                            continue
-
-                        # Buscar si ya existe
-                        existing = None
-                        for d in devices:
-                            if d.mac == mac:
-                                existing = d
-                                break
-
-                        if existing:
-                            if service not in existing.mdns_services:
-                                existing.mdns_services.append(service)
-                            if not existing.mdns_name:
-                                existing.mdns_name = hostname
-                        else:
-                            devices.append(NetworkDevice(
-                                mac=mac,
-                                ip=ip,
-                                mdns_name=hostname,
-                                mdns_services=[service],
-                                source="mdns"
-                            ))
-                    except Exception as e:
-                        logger.debug(f"Error parsing mDNS line: {e}")
-                        continue
+    ip = mac = ""
+    offset = 12
+    while offset + 4 <= len(payload):
+        rta_len, rta_type = struct.unpack_from('=HH', payload, offset)
+        if rta_len < 4:
+            break
+        value = payload[offset + 4:offset + rta_len]
+        if rta_type == NDA_DST and len(value) == 4:
+            ip = socket.inet_ntoa(value)
+        elif rta_type == NDA_LLADDR and len(value) == 6:
+            mac = _mac_to_str(value)
+        offset += _nl_align(rta_len)
+
+    if not ip:
+        return None
+    online = msg_type == RTM_NEWNEIGH and bool(state & NUD_ALIVE)
+    unconfirmed = msg_type == RTM_NEWNEIGH and not online and bool(state & NUD_UNCONFIRMED)
+    return NeighbourEvent(ip=ip, mac=mac, online=online, state=state, unconfirmed=unconfirmed)
+
+
+def build_neighbour_message(
+    ip: str,
+    mac: str = "",
+    state: int = NUD_REACHABLE,
+    msg_type: int = RTM_NEWNEIGH,
+    ifindex: int = 2
+) -> bytes:
+    """Construye un mensaje netlink de vecino (para flujos sintéticos)."""
+    attrs = b''
+    for rta_type, value in ((NDA_DST, socket.inet_aton(ip)),
+                            (NDA_LLADDR, _mac_to_bytes(mac) if mac else b'')):
+        if not value:
+            continue
+        rta = struct.pack('=HH', 4 + len(value), rta_type) + value
+        attrs += rta + b'\x00' * (_nl_align(len(rta)) - len(rta))
+    body = struct.pack('=B3xiHBB', socket.AF_INET, ifindex, state, 0, 1) + attrs
+    return struct.pack('=IHHII', 16 + len(body), msg_type, 0, 0, 0) + body
+
+
+class NetlinkNeighbourSource:
+    """Suscripción real al grupo RTMGRP_NEIGH del kernel."""
 
-            except Exception as e:
-                logger.debug(f"Error scanning mDNS service {service}: {e}")
-                continue
+    def __init__(self):
+        self._sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
-        return devices
+    def open(self, on_data: Callable[[bytes], None]) -> None:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            sock.setblocking(False)
+            sock.bind((0, RTMGRP_NEIGH))
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._on_readable, on_data)
+
+    def _on_readable(self, on_data: Callable[[bytes], None]):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # ENOBUFS: se perdieron eventos, el próximo scan_all resincroniza
+                logger.debug(f"Error leyendo netlink: {e}")
+                return
+            on_data(data)
+
+    def close(self) -> None:
+        if self._sock is None:
+            return
+        if self._loop:
+            self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
 
-    async def _scan_ssdp(self) -> List[NetworkDevice]:
-        """Descubrimiento de dispositivos via SSDP/UPnP."""
-        devices = []
 
-        # Enviar M-SEARCH para descubrir dispositivos UPnP
-        ssdp_request = (
-            'M-SEARCH * HTTP/1.1\r\n'
-            'HOST: 239.255.255.250:1900\r\n'
-            'MAN: "ssdp:discover"\r\n'
-            'MX: 2\r\n'
-            'ST: ssdp:all\r\n'
-            '\r\n'
-        )
+class ReplayNeighbourSource:
+    """Reproduce un flujo netlink grabado o sintético, sin sockets."""
 
-        try:
-            # Usar netcat para enviar SSDP multicast
-            stdout, _, code = await run_async(
-                f"timeout 3 bash -c 'echo -e \"{ssdp_request}\" | nc -u -w2 239.255.255.250 1900 2>/dev/null' | head -100",
-                timeout=5
-            )
+    def __init__(self, messages: List[bytes], interval: float = 0.0):
+        self.messages = messages
+        self.interval = interval
+        self.done = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
 
-            if code != 0 or not stdout:
-                return devices
-
-            # Parsear respuestas SSDP
-            current_ip = None
-            current_info = []
-
-            for line in stdout.split('\n'):
-                line = line.strip()
-
-                if line.startswith('HTTP/'):
-                    # Nueva respuesta
-                    if current_ip and current_info:
-                        # Obtener MAC via ARP
-                        arp_out, _, _ = await run_async(f"arp -n {current_ip} 2>/dev/null", timeout=2)
-                        mac = ""
-                        if arp_out:
-                            mac_match = re.search(r'([0-9a-f:]{17})', arp_out, re.I)
-                            if mac_match:
-                                mac = mac_match.group(1)
-
-                        if mac:
-                            devices.append(NetworkDevice(
-                                mac=mac,
-                                ip=current_ip,
-                                ssdp_info=' | '.join(current_info)[:200],
-                                source="ssdp"
-                            ))
-
-                    current_ip = None
-                    current_info = []
-
-                elif line.startswith('LOCATION:'):
-                    # Extraer IP de la URL
-                    match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
-                    if match:
-                        current_ip = match.group(1)
-
-                elif line.startswith('SERVER:') or line.startswith('ST:'):
-                    info = line.split(':', 1)[1].strip()
-                    if info and len(info) > 2:
-                        current_info.append(info)
-
-            # Última respuesta
-            if current_ip and current_info:
-                arp_out, _, _ = await run_async(f"arp -n {current_ip} 2>/dev/null", timeout=2)
-                mac = ""
-                if arp_out:
-                    mac_match = re.search(r'([0-9a-f:]{17})', arp_out, re.I)
-                    if mac_match:
-                        mac = mac_match.group(1)
-
-                if mac:
-                    devices.append(NetworkDevice(
-                        mac=mac,
-                        ip=current_ip,
-                        ssdp_info=' | '.join(current_info)[:200],
-                        source="ssdp"
-                    ))
+    def open(self, on_data: Callable[[bytes], None]) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._replay(on_data))
 
-        except Exception as e:
-            logger.debug(f"Error in SSDP scan: {e}")
+    async def _replay(self, on_data: Callable[[bytes], None]):
+        for data in self.messages:
+            await asyncio.sleep(self.interval)
+            on_data(data)
+        self.done.set()
 
-        return devices
+    def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
 
-    async def _scan_nmap(self) -> List[NetworkDevice]:
-        """Escaneo nmap con detección de OS (lento)."""
-        devices = []
 
-        # Escaneo rápido de puertos comunes + detección OS
-        stdout, stderr, code = await run_async(
-            f"sudo nmap -sn -O --osscan-limit {config.LOCAL_NETWORK} 2>/dev/null",
-            timeout=120
-        )
+class NeighbourListener:
+    """Lector asyncio de eventos de vecinos que notifica cada cambio."""
 
-        if code != 0:
-            # Fallback sin detección OS
+    def __init__(self, source, on_event: Callable[[NeighbourEvent], None]):
+        self.source = source
+        self.on_event = on_event
+
+    def start(self) -> None:
+        self.source.open(self._on_data)
+
+    def stop(self) -> None:
+        self.source.close()
+
+    def _on_data(self, data: bytes):
+        for event in parse_neighbour_messages(data):
+            try:
+                self.on_event(event)
+            except Exception as e:
+                logger.error(f"Error procesando evento de vecino: {e}")
+
+
+# ═══════════════════════════════════════════════════════════════
+# RESOLUCIÓN IP -> MAC
+# ═══════════════════════════════════════════════════════════════
+
+class NeighbourTable:
+    """
+    Resolución IP -> MAC compartida por todas las fuentes de discovery.
+
+    Lee /proc/net/arp una sola vez por ventana de TTL y mantiene el
+    snapshot en memoria; las fuentes que ya conocen pares IP/MAC
+    (barrido ARP, netlink) los aportan con learn().
+    """
+
+    def __init__(self, path: str = "/proc/net/arp", ttl: float = 30.0, learned_ttl: float = 600.0):
+        self.path = path
+        self.ttl = ttl
+        self.learned_ttl = learned_ttl
+        self._kernel: Dict[str, str] = {}
+        self._learned: Dict[str, Tuple[str, float]] = {}
+        self._loaded_at: Optional[float] = None
+
+    def refresh(self):
+        """Relee la tabla ARP del kernel."""
+        entries = {}
+        try:
+            with open(self.path) as f:
+                next(f, None)  # Cabecera
+                for line in f:
+                    # IP address  HW type  Flags  HW address  Mask  Device
+                    parts = line.split()
+                    if len(parts) < 4 or parts[2] == '0x0':
+                        continue
+                    if parts[3] == '00:00:00:00:00:00':
+                        continue
+                    entries[parts[0]] = parts[3].upper()
+        except OSError as e:
+            logger.debug(f"No se pudo leer {self.path}: {e}")
+        self._kernel = entries
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Fuerza relectura en la próxima consulta."""
+        self._loaded_at = None
+
+    def learn(self, ip: str, mac: str):
+        """Registra un par IP/MAC observado por otra fuente."""
+        if ip and mac:
+            self._learned[ip] = (mac.upper(), time.monotonic())
+
+    def forget(self, ip: str):
+        """Olvida un par aprendido (vecino expirado)."""
+        self._learned.pop(ip, None)
+
+    def lookup(self, ip: str) -> str:
+        """MAC para la IP o string vacío."""
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at > self.ttl:
+            self.refresh()
+        mac = self._kernel.get(ip)
+        if mac:
+            return mac
+        learned = self._learned.get(ip)
+        if learned and now - learned[1] <= self.learned_ttl:
+            return learned[0]
+        return ""
+
+
+# ═══════════════════════════════════════════════════════════════
+# mDNS / BONJOUR NATIVO
+# ═══════════════════════════════════════════════════════════════
+
+MDNS_ADDR = '224.0.0.251'
+MDNS_PORT = 5353
+
+DNS_TYPE_A = 1
+DNS_TYPE_PTR = 12
+DNS_TYPE_TXT = 16
+DNS_TYPE_SRV = 33
+
+# Servicios mDNS comunes a buscar
+MDNS_SERVICE_TYPES = [
+    '_airplay._tcp',      # Apple AirPlay
+    '_raop._tcp',         # Apple Remote Audio
+    '_googlecast._tcp',   # Chromecast
+    '_spotify-connect._tcp',  # Spotify
+    '_ipp._tcp',          # Impresoras IPP
+    '_printer._tcp',      # Impresoras
+    '_http._tcp',         # Servidores web
+    '_homekit._tcp',      # HomeKit
+    '_hap._tcp',          # HomeKit Accessory Protocol
+    '_smb._tcp',          # Samba/Windows shares
+    '_afpovertcp._tcp',   # Apple File Protocol
+    '_ssh._tcp',          # SSH servers
+    '_device-info._tcp',  # Device info
+]
+
+
+@dataclass
+class DnsRecord:
+    """Registro de recurso DNS decodificado."""
+    name: str
+    rtype: int
+    ttl: int
+    value: object
+
+
+def build_dns_query(questions: List[Tuple[str, int]], qid: int = 0, unicast_response: bool = False) -> bytes:
+    """Construye un mensaje DNS de consulta con una o varias preguntas."""
+    qclass = 0x8001 if unicast_response else 0x0001  # bit QU (RFC 6762 §5.4)
+    body = b''
+    for name, qtype in questions:
+        for label in name.rstrip('.').split('.'):
+            encoded = label.encode('utf-8')
+            body += bytes([len(encoded)]) + encoded
+        body += b'\x00' + struct.pack('!HH', qtype, qclass)
+    return struct.pack('!6H', qid, 0, len(questions), 0, 0, 0) + body
+
+
+def _read_dns_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Lee un nombre DNS con compresión. Devuelve (nombre, offset siguiente)."""
+    labels = []
+    end = None
+    hops = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError("Nombre DNS truncado")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data) or hops > 32:
+                raise ValueError("Puntero DNS inválido")
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            hops += 1
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('utf-8', errors='replace'))
+        offset += length
+    return '.'.join(labels), end if end is not None else offset
+
+
+def parse_dns_message(data: bytes) -> Tuple[int, List[DnsRecord]]:
+    """
+    Parsea respuesta DNS/mDNS (answer + authority + additional).
+
+    Returns:
+        Tuple (id, registros). Un mensaje truncado devuelve lo parseado.
+    """
+    records = []
+    if len(data) < 12:
+        return 0, records
+    qid, _, qdcount, ancount, nscount, arcount = struct.unpack_from('!6H', data, 0)
+    try:
+        offset = 12
+        for _ in range(qdcount):
+            _, offset = _read_dns_name(data, offset)
+            offset += 4
+
+        for _ in range(ancount + nscount + arcount):
+            name, offset = _read_dns_name(data, offset)
+            rtype, _, ttl, rdlength = struct.unpack_from('!HHIH', data, offset)
+            offset += 10
+            rdata = offset
+            offset += rdlength
+            if offset > len(data):
+                break
+
+            value = None
+            if rtype == DNS_TYPE_PTR:
+                value = _read_dns_name(data, rdata)[0]
+            elif rtype == DNS_TYPE_SRV:
+                _, _, port = struct.unpack_from('!HHH', data, rdata)
+                value = (port, _read_dns_name(data, rdata + 6)[0])
+            elif rtype == DNS_TYPE_TXT:
+                strings = []
+                pos = rdata
+                while pos < offset:
+                    length = data[pos]
+                    strings.append(data[pos + 1:pos + 1 + length].decode('utf-8', errors='replace'))
+                    pos += 1 + length
+                value = strings
+            elif rtype == DNS_TYPE_A and rdlength == 4:
+                value = socket.inet_ntoa(data[rdata:offset])
+            records.append(DnsRecord(name=name, rtype=rtype, ttl=ttl, value=value))
+    except (ValueError, struct.error, IndexError) as e:
+        logger.debug(f"Mensaje DNS malformado: {e}")
+    return qid, records
+
+
+@dataclass
+class MdnsHost:
+    """Host descubierto vía mDNS."""
+    ip: str
+    name: str = ""
+    services: List[str] = field(default_factory=list)
+
+
+class _MdnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, on_datagram: Callable[[bytes, tuple], None]):
+        self.on_datagram = on_datagram
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.on_datagram(data, addr)
+
+    def error_received(self, exc: Exception):
+        logger.debug(f"Error mDNS: {exc}")
+
+
+class MdnsBrowser:
+    """
+    Consulta mDNS de todos los tipos de servicio en una sola ráfaga.
+
+    Envía las preguntas PTR desde un único socket UDP (legacy unicast,
+    RFC 6762 §6.7), procesa PTR/SRV/TXT/A a medida que llegan y cierra
+    tras una ventana MX.
+    """
+
+    def __init__(self, service_types: List[str] = None, window: float = 2.0):
+        self.service_types = service_types or MDNS_SERVICE_TYPES
+        self.window = window
+        self.answer_counts: Dict[str, int] = {}
+        self._instances: Dict[str, str] = {}             # instancia -> tipo
+        self._srv: Dict[str, Tuple[int, str]] = {}       # instancia -> (puerto, host)
+        self._txt: Dict[str, List[str]] = {}             # instancia -> TXT
+        self._addresses: Dict[str, str] = {}             # host -> IPv4
+        self._responders: Dict[str, str] = {}            # instancia -> IP origen
+
+    def _on_datagram(self, data: bytes, addr: tuple):
+        _, records = parse_dns_message(data)
+        types = {f"{t}.local": t for t in self.service_types}
+        for record in records:
+            name = record.name.lower()
+            if record.rtype == DNS_TYPE_PTR and name in types and record.value:
+                instance = record.value.lower()
+                service = types[name]
+                self._instances[instance] = service
+                self._responders.setdefault(instance, addr[0])
+                self.answer_counts[service] = self.answer_counts.get(service, 0) + 1
+            elif record.rtype == DNS_TYPE_SRV and record.value:
+                self._srv[name] = record.value
+                self._responders.setdefault(name, addr[0])
+            elif record.rtype == DNS_TYPE_TXT and record.value is not None:
+                self._txt[name] = record.value
+            elif record.rtype == DNS_TYPE_A and record.value:
+                self._addresses[name] = record.value
+
+    def _collect(self) -> Dict[str, MdnsHost]:
+        """Agrupa instancias por IP del host que las anuncia."""
+        hosts: Dict[str, MdnsHost] = {}
+        for instance, service in self._instances.items():
+            port_target = self._srv.get(instance)
+            hostname = port_target[1] if port_target else ""
+            ip = self._addresses.get(hostname.lower()) or self._responders.get(instance, "")
+            if not ip:
+                continue
+            host = hosts.setdefault(ip, MdnsHost(ip=ip))
+            if hostname and not host.name:
+                host.name = re.sub(r'\.local\.?$', '', hostname, flags=re.I)
+            if service not in host.services:
+                host.services.append(service)
+        return hosts
+
+    async def browse(self) -> Dict[str, MdnsHost]:
+        """Lanza la ráfaga de consultas y devuelve hosts por IP."""
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+        sock.bind(('0.0.0.0', 0))
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _MdnsProtocol(self._on_datagram), sock=sock
+        )
+        try:
+            for i, service in enumerate(self.service_types, 1):
+                query = build_dns_query([(f"{service}.local", DNS_TYPE_PTR)], qid=i, unicast_response=True)
+                transport.sendto(query, (MDNS_ADDR, MDNS_PORT))
+            await asyncio.sleep(self.window)
+        finally:
+            transport.close()
+        return self._collect()
+
+
+# ═══════════════════════════════════════════════════════════════
+# SSDP / UPnP NATIVO
+# ═══════════════════════════════════════════════════════════════
+
+SSDP_ADDR = '239.255.255.250'
+SSDP_PORT = 1900
+
+
+def build_msearch(st: str = 'ssdp:all', mx: int = 2) -> bytes:
+    """Construye una petición M-SEARCH."""
+    return (
+        'M-SEARCH * HTTP/1.1\r\n'
+        f'HOST: {SSDP_ADDR}:{SSDP_PORT}\r\n'
+        'MAN: "ssdp:discover"\r\n'
+        f'MX: {mx}\r\n'
+        f'ST: {st}\r\n'
+        '\r\n'
+    ).encode()
+
+
+def parse_ssdp_response(data: bytes) -> Dict[str, str]:
+    """Parsea cabeceras de una respuesta SSDP (claves en mayúsculas)."""
+    lines = data.decode('utf-8', errors='replace').split('\r\n')
+    if not lines or not lines[0].upper().startswith('HTTP/'):
+        return {}
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().upper()] = value.strip()
+    return headers
+
+
+@dataclass
+class SsdpResponse:
+    """Respuesta SSDP deduplicada por USN."""
+    usn: str
+    ip: str
+    location: str = ""
+    server: str = ""
+    st: str = ""
+
+
+class _SsdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, on_datagram: Callable[[bytes, tuple], None]):
+        self.on_datagram = on_datagram
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.on_datagram(data, addr)
+
+    def error_received(self, exc: Exception):
+        logger.debug(f"Error SSDP: {exc}")
+
+
+class SsdpDiscovery:
+    """Cliente M-SEARCH asíncrono. Recoge respuestas durante MX + margen."""
+
+    def __init__(self, mx: int = 2, st: str = 'ssdp:all'):
+        self.mx = mx
+        self.st = st
+        self.responses: Dict[str, SsdpResponse] = {}
+
+    def _on_datagram(self, data: bytes, addr: tuple):
+        headers = parse_ssdp_response(data)
+        usn = headers.get('USN')
+        if not usn or usn in self.responses:
+            return
+        self.responses[usn] = SsdpResponse(
+            usn=usn,
+            ip=addr[0],
+            location=headers.get('LOCATION', ''),
+            server=headers.get('SERVER', ''),
+            st=headers.get('ST', ''),
+        )
+
+    async def search(self) -> List[SsdpResponse]:
+        """Envía M-SEARCH y devuelve las respuestas únicas."""
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        sock.bind(('0.0.0.0', 0))
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _SsdpProtocol(self._on_datagram), sock=sock
+        )
+        try:
+            request = build_msearch(self.st, self.mx)
+            # Dos envíos: UDP multicast no garantiza entrega
+            transport.sendto(request, (SSDP_ADDR, SSDP_PORT))
+            await asyncio.sleep(0.1)
+            transport.sendto(request, (SSDP_ADDR, SSDP_PORT))
+            await asyncio.sleep(self.mx + 0.5)
+        finally:
+            transport.close()
+        return list(self.responses.values())
+
+
+def parse_device_description(xml_text: str) -> Dict[str, str]:
+    """Extrae campos del <device> raíz de una descripción UPnP."""
+    try:
+        root = ET.fromstring(xml_text)
+    except ET.ParseError:
+        return {}
+
+    def local(tag: str) -> str:
+        return tag.rsplit('}', 1)[-1]
+
+    device = next((el for el in root if local(el.tag) == 'device'), None)
+    if device is None:
+        return {}
+
+    info = {}
+    for el in device:
+        name = local(el.tag)
+        if name in ('friendlyName', 'modelName', 'manufacturer', 'deviceType') and el.text:
+            info[name] = el.text.strip()
+    return info
+
+
+@dataclass
+class _CachedDescription:
+    info: Dict[str, str]
+    etag: str = ""
+    expires: float = 0.0
+
+
+class SsdpDescriptionCache:
+    """
+    Descarga descripciones XML UPnP con un pool HTTP keep-alive acotado.
+
+    Cachea por URL LOCATION (LRU acotado): dentro del TTL no hay petición
+    HTTP; al expirar se revalida con If-None-Match cuando hay ETag.
+
+    LOCATION llega de respuestas multicast sin autenticar: sólo se descarga
+    si apunta a la IP que respondió y el cuerpo se corta en max_bytes.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_connections: int = 4, timeout: float = 3.0,
+                 max_entries: int = 256, max_bytes: int = 64 * 1024):
+        self.ttl = ttl
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache: OrderedDict[str, _CachedDescription] = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def fetch(self, location: str, source_ip: str) -> Dict[str, str]:
+        """
+        Devuelve la descripción de un dispositivo (cacheada).
+
+        Args:
+            location: URL anunciada en la cabecera LOCATION
+            source_ip: IP que envió la respuesta SSDP
+        """
+        try:
+            url = urlparse(location)
+            if url.scheme != 'http' or url.hostname != source_ip:
+                logger.debug(f"LOCATION ignorada ({location} anunciada por {source_ip})")
+                return {}
+        except ValueError:
+            return {}
+
+        cached = self._cache.get(location)
+        if cached:
+            self._cache.move_to_end(location)
+            if time.monotonic() < cached.expires:
+                return cached.info
+
+        headers = {'If-None-Match': cached.etag} if cached and cached.etag else {}
+        try:
+            async with self._get_client().stream('GET', location, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    cached.expires = time.monotonic() + self.ttl
+                    return cached.info
+                if response.status_code != 200:
+                    return cached.info if cached else {}
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > self.max_bytes:
+                        logger.debug(f"Descripción UPnP demasiado grande: {location}")
+                        return cached.info if cached else {}
+                etag = response.headers.get('ETag', '')
+                encoding = response.encoding or 'utf-8'
+        except httpx.HTTPError as e:
+            logger.debug(f"Error descargando {location}: {e}")
+            return cached.info if cached else {}
+
+        info = parse_device_description(body.decode(encoding, errors='replace'))
+        self._cache[location] = _CachedDescription(
+            info=info,
+            etag=etag,
+            expires=time.monotonic() + self.ttl,
+        )
+        self._cache.move_to_end(location)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return info
+
+    async def aclose(self):
+        """Cierra el pool HTTP."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# ═══════════════════════════════════════════════════════════════
+# LEASES DHCP
+# ═══════════════════════════════════════════════════════════════
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_IGNORED = 0x8000
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+@dataclass
+class DhcpLease:
+    """Lease DHCP de dnsmasq."""
+    mac: str
+    ip: str
+    hostname: str = ""
+    client_id: str = ""
+    expires: int = 0
+
+
+def parse_dhcp_leases(text: str) -> List[DhcpLease]:
+    """Parsea un fichero dhcp.leases (expiry mac ip hostname client-id)."""
+    leases = []
+    for line in text.split('\n'):
+        parts = line.split()
+        if len(parts) < 4 or parts[0] == 'duid':
+            continue
+        try:
+            expires = int(parts[0])
+        except ValueError:
+            expires = 0
+        leases.append(DhcpLease(
+            mac=parts[1].upper(),
+            ip=parts[2],
+            hostname=parts[3] if parts[3] != '*' else "",
+            client_id=parts[4] if len(parts) > 4 and parts[4] != '*' else "",
+            expires=expires,
+        ))
+    return leases
+
+
+class InotifyWatch:
+    """Vigila cambios de un fichero vía inotify (ctypes) sobre su directorio."""
+
+    def __init__(self, path: str, on_change: Callable[[], None]):
+        self.path = Path(path)
+        self.on_change = on_change
+        self._fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def active(self) -> bool:
+        return self._fd is not None
+
+    def start(self) -> None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        # Se vigila el directorio: dnsmasq puede reemplazar el fichero
+        if libc.inotify_add_watch(fd, os.fsencode(self.path.parent), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch {self.path.parent}")
+        self._fd = fd
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(fd, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            logger.debug(f"Error leyendo inotify: {e}")
+            return
+
+        name = os.fsencode(self.path.name)
+        changed = False
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            event_name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & (IN_Q_OVERFLOW | IN_IGNORED) or event_name == name:
+                changed = True
+            if mask & IN_IGNORED:
+                # Directorio eliminado: el consumidor vuelve a stat()
+                self.close()
+                break
+        if changed:
+            self.on_change()
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        if self._loop:
+            self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = None
+
+
+class LeaseSource(abc.ABC):
+    """Interfaz de backends de leases DHCP."""
+
+    @abc.abstractmethod
+    async def leases(self) -> List[DhcpLease]:
+        """Leases activos según el backend."""
+
+    def close(self) -> None:
+        pass
+
+
+class FileLeaseSource(LeaseSource):
+    """
+    Lee el fichero de leases montado en el host.
+
+    Mantiene el último parseo en memoria indexado por (mtime, tamaño, inodo).
+    Con inotify activo, si no hubo eventos no se hace ninguna E/S; sin
+    inotify basta un stat() por consulta.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._watch = InotifyWatch(path, self._on_change)
+        self._watch_failed = False
+        self._dirty = True
+        self._key: Optional[Tuple[int, int, int]] = None
+        self._snapshot: List[DhcpLease] = []
+
+    def _on_change(self):
+        self._dirty = True
+
+    def _ensure_watch(self):
+        if self._watch.active or self._watch_failed:
+            return
+        try:
+            self._watch.start()
+        except (OSError, AttributeError) as e:
+            self._watch_failed = True
+            logger.debug(f"inotify no disponible para {self.path}: {e}")
+
+    async def leases(self) -> List[DhcpLease]:
+        self._ensure_watch()
+        if self._watch.active and not self._dirty and self._key is not None:
+            return self._snapshot
+
+        st = os.stat(self.path)
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if key != self._key:
+            with open(self.path) as f:
+                self._snapshot = parse_dhcp_leases(f.read())
+            self._key = key
+        # Limpio solo tras releer con éxito: si stat/lectura fallan, la próxima
+        # consulta reintenta aunque no llegue otro evento (la lectura no cede el loop)
+        self._dirty = False
+        return self._snapshot
+
+    def close(self) -> None:
+        self._watch.close()
+
+
+class DockerLeaseSource(LeaseSource):
+    """Fallback: lee los leases desde el contenedor de Pi-hole (API de archivos)."""
+
+    def __init__(self, docker: DockerEngine, container: str = "pihole", path: str = "/etc/pihole/dhcp.leases"):
+        self.docker = docker
+        self.container = container
+        self.path = path
+
+    async def leases(self) -> List[DhcpLease]:
+        try:
+            data = await self.docker.read_file(self.container, self.path)
+        except (httpx.HTTPError, tarfile.TarError, FileNotFoundError) as e:
+            logger.debug(f"No se pudieron leer los leases del contenedor: {e}")
+            return []
+        return parse_dhcp_leases(data.decode(errors='replace'))
+
+
+# ═══════════════════════════════════════════════════════════════
+# BASE DE DATOS FTL DE PI-HOLE
+# ═══════════════════════════════════════════════════════════════
+
+@dataclass
+class FtlNetworkEntry:
+    """Fila de la tabla network de pihole-FTL.db."""
+    mac: str
+    ip: str = ""
+    name: str = ""
+    last_query: int = 0
+
+
+class PiholeNetworkDb:
+    """
+    Acceso de solo lectura a pihole-FTL.db montado en el host.
+
+    Una única conexión sqlite3 (mode=ro, autocommit para no retener
+    snapshots WAL) vive en un executor de un hilo. Cada consulta sólo
+    devuelve clientes con lastQuery desde la marca anterior; la marca
+    inicial es el intervalo de escaneo, no todo el histórico de FTL.
+    """
+
+    QUERY = """
+        SELECT n.hwaddr, a.ip, a.name, n.lastQuery
+        FROM network n
+        LEFT JOIN network_addresses a ON a.network_id = n.id
+        WHERE n.hwaddr NOT LIKE 'ip-%'
+          AND n.hwaddr != '00:00:00:00:00:00'
+          AND n.lastQuery >= ?
+        ORDER BY n.id, a.lastSeen DESC
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = int(time.time()) - config.SCAN_INTERVAL
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ftl-db")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            uri = f"{Path(self.path).resolve().as_uri()}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, timeout=5, isolation_level=None)
+            self._conn.execute("PRAGMA query_only = 1")
+        return self._conn
+
+    def _fetch_changed(self) -> List[FtlNetworkEntry]:
+        try:
+            rows = self._connect().execute(self.QUERY, (self.watermark,)).fetchall()
+        except sqlite3.Error:
+            self._close_conn()
+            raise
+
+        entries: Dict[str, FtlNetworkEntry] = {}
+        for hwaddr, ip, name, last_query in rows:
+            mac = hwaddr.upper()
+            # Filas ordenadas por lastSeen: la primera dirección es la vigente
+            if mac in entries:
+                continue
+            entries[mac] = FtlNetworkEntry(
+                mac=mac,
+                ip=ip or "",
+                name=name or "",
+                last_query=last_query or 0,
+            )
+        if entries:
+            self.watermark = max(self.watermark, max(e.last_query for e in entries.values()))
+        return list(entries.values())
+
+    async def changed(self) -> List[FtlNetworkEntry]:
+        """Clientes con actividad desde la última consulta."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._fetch_changed)
+
+    def _close_conn(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self) -> None:
+        """Cierra la conexión en su hilo y libera el executor."""
+        self._executor.submit(self._close_conn)
+        self._executor.shutdown(wait=True)
+
+
+# ═══════════════════════════════════════════════════════════════
+# PING ICMP NATIVO
+# ═══════════════════════════════════════════════════════════════
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+_ICMP_HEADER = struct.Struct('!BBHHH')     # tipo, código, checksum, id, seq
+_PING_PAYLOAD = b'pi-command-center'.ljust(32, b'\0')
+
+
+def _icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(seq: int, payload: bytes = _PING_PAYLOAD) -> bytes:
+    """Echo request ICMP (el kernel reescribe el id en sockets DGRAM)."""
+    header = _ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+    checksum = _icmp_checksum(header + payload)
+    return _ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, 0, seq) + payload
+
+
+@dataclass
+class PingResult:
+    """Estadísticas de ping (RTT en ms)."""
+    host: str
+    ip: str = ""
+    sent: int = 0
+    received: int = 0
+    min: Optional[float] = None
+    avg: Optional[float] = None
+    max: Optional[float] = None
+    mdev: Optional[float] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.received > 0
+
+    @property
+    def loss(self) -> float:
+        """Porcentaje de paquetes perdidos."""
+        return 100.0 * (self.sent - self.received) / self.sent if self.sent else 100.0
+
+    @classmethod
+    def from_rtts(cls, host: str, ip: str, sent: int, rtts: List[float]) -> "PingResult":
+        result = cls(host=host, ip=ip, sent=sent, received=len(rtts))
+        if rtts:
+            avg = sum(rtts) / len(rtts)
+            result.min, result.avg, result.max = min(rtts), avg, max(rtts)
+            # Igual que iputils: sqrt(E[x²] - E[x]²)
+            result.mdev = max(0.0, sum(r * r for r in rtts) / len(rtts) - avg * avg) ** 0.5
+        return result
+
+
+def parse_ping_output(host: str, output: str) -> PingResult:
+    """Parsea la salida de `ping` de iputils/busybox."""
+    result = PingResult(host=host)
+    match = re.search(r'(\d+) packets transmitted, (\d+) (?:packets )?received', output)
+    if match:
+        result.sent, result.received = int(match.group(1)), int(match.group(2))
+    match = re.search(r'= ([\d.]+)/([\d.]+)/([\d.]+)(?:/([\d.]+))? ms', output)
+    if match:
+        result.min, result.avg, result.max = (float(v) for v in match.groups()[:3])
+        result.mdev = float(match.group(4)) if match.group(4) else None
+    match = re.search(r'PING \S+ \(([\d.a-fA-F:]+)\)', output)
+    if match:
+        result.ip = match.group(1)
+    return result
+
+
+async def resolve_ipv4(target: str) -> Optional[str]:
+    """
+    IPv4 del destino; None si es IPv6 o sólo tiene registros AAAA (lo
+    resuelven `ping`/`traceroute`).
+
+    Raises:
+        socket.gaierror: si el nombre no resuelve en ninguna familia
+    """
+    try:
+        addr = ipaddress.ip_address(target)
+        return str(addr) if addr.version == 4 else None
+    except ValueError:
+        pass
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(target, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    except socket.gaierror:
+        # Sin IPv4: si resuelve en otra familia, es un host sólo IPv6
+        await loop.getaddrinfo(target, None, type=socket.SOCK_DGRAM)
+        return None
+    return infos[0][4][0]
+
+
+class IcmpPinger:
+    """
+    Ping asíncrono sin privilegios (socket ICMP SOCK_DGRAM).
+
+    Un único socket para todos los destinos y sondas: las respuestas se
+    emparejan por (IP, secuencia). Si el kernel no permite sockets ICMP
+    (net.ipv4.ping_group_range) o el destino es IPv6, se usa `ping`.
+    """
+
+    def __init__(self):
+        self._sock: Optional[socket.socket] = None
+        self._available: Optional[bool] = None
+        self._seq = random.getrandbits(16)
+        self._pending: Dict[Tuple[str, int], Tuple[asyncio.Future, float]] = {}
+
+    def _open(self) -> bool:
+        if self._sock is not None:
+            return True
+        if self._available is False:
+            return False
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            sock.setblocking(False)
+        except OSError as e:
+            logger.debug(f"Socket ICMP no disponible, se usará ping: {e}")
+            self._available = False
+            return False
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+        self._sock = sock
+        self._available = True
+        return True
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(1500)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"Error leyendo socket ICMP: {e}")
+                return
+            received = time.perf_counter()
+            if len(data) < _ICMP_HEADER.size:
+                continue
+            icmp_type, _, _, _, seq = _ICMP_HEADER.unpack_from(data)
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            entry = self._pending.get((addr[0], seq))
+            if entry and not entry[0].done():
+                entry[0].set_result((received - entry[1]) * 1000)
+
+    def _next_seq(self, ip: str) -> int:
+        while True:
+            self._seq = (self._seq + 1) & 0xFFFF
+            if (ip, self._seq) not in self._pending:
+                return self._seq
+
+    async def _probe(self, ip: str, timeout: float) -> Optional[float]:
+        seq = self._next_seq(ip)
+        key = (ip, seq)
+        future = asyncio.get_running_loop().create_future()
+        packet = build_echo_request(seq)
+        try:
+            self._pending[key] = (future, time.perf_counter())
+            self._sock.sendto(packet, (ip, 0))
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self._pending.pop(key, None)
+
+    async def _ping_subprocess(self, target: str, count: int, interval: float, timeout: float) -> PingResult:
+        # iputils exige root para intervalos < 0.2 s
+        interval = max(interval, 0.2)
+        wait = max(1, int(timeout + 0.999))
+        stdout, _, _ = await run_async(
+            f"ping -n -c {count} -i {interval} -W {wait} {target} 2>/dev/null",
+            timeout=int(count * interval + wait + 5)
+        )
+        result = parse_ping_output(target, stdout)
+        result.sent = result.sent or count
+        return result
+
+    async def ping(self, target: str, count: int = 4, interval: float = 0.2, timeout: float = 2.0) -> PingResult:
+        """Envía `count` echo requests separados `interval` s."""
+        try:
+            ip = await resolve_ipv4(target)
+        except (socket.gaierror, OSError):
+            return PingResult(host=target, sent=count)
+        if ip is None or not self._open():
+            return await self._ping_subprocess(target, count, interval, timeout)
+
+        probes = []
+        for i in range(count):
+            if i:
+                await asyncio.sleep(interval)
+            probes.append(asyncio.create_task(self._probe(ip, timeout)))
+        rtts = await asyncio.gather(*probes)
+        return PingResult.from_rtts(target, ip, count, [r for r in rtts if r is not None])
+
+    async def ping_many(self, targets: List[str], count: int = 1, interval: float = 0.2,
+                        timeout: float = 2.0) -> Dict[str, PingResult]:
+        """Ping concurrente a varios destinos sobre el mismo socket."""
+        results = await asyncio.gather(*(self.ping(t, count, interval, timeout) for t in targets))
+        return dict(zip(targets, results))
+
+    def close(self):
+        """Cierra el socket ICMP."""
+        if self._sock is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            except RuntimeError:
+                pass
+            self._sock.close()
+            self._sock = None
+
+
+# ═══════════════════════════════════════════════════════════════
+# TRACEROUTE UDP NATIVO
+# ═══════════════════════════════════════════════════════════════
+
+IP_RECVERR = 11                            # linux/in.h
+SO_EE_ORIGIN_ICMP = 2
+ICMP_DEST_UNREACH = 3
+ICMP_TIME_EXCEEDED = 11
+ICMP_PORT_UNREACH = 3                      # código de ICMP_DEST_UNREACH
+# Otros códigos de destino inalcanzable, anotados como traceroute(8)
+UNREACH_FLAGS = {0: '!N', 1: '!H', 2: '!P', 9: '!X', 10: '!X', 13: '!X'}
+TRACEROUTE_BASE_PORT = 33434
+_SOCK_EXTENDED_ERR = struct.Struct('=IBBBBII')   # errno, origin, type, code, pad, info, data
+
+
+@dataclass
+class TracerouteHop:
+    """Salto de traceroute ('*' si no respondió)."""
+    hop: int
+    ip: str = '*'
+    rtt: Optional[float] = None
+    reached: bool = False
+    flag: str = ''          # !H, !N, !P, !X: inalcanzable según ese salto
+
+    def as_dict(self) -> Dict[str, any]:
+        return {'hop': self.hop, 'ip': self.ip, 'rtt': self.rtt, 'flag': self.flag}
+
+
+def parse_traceroute_output(output: str) -> List[TracerouteHop]:
+    """Parsea la salida de `traceroute -n`."""
+    hops = []
+    for line in output.split('\n')[1:]:  # Skip header
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        try:
+            hop_num = int(parts[0])
+        except ValueError:
+            continue
+
+        if '*' in parts[1]:
+            hops.append(TracerouteHop(hop_num))
+            continue
+        # Primer valor numérico tras la IP
+        rtt = None
+        for part in parts[2:]:
+            try:
+                rtt = float(part.replace('ms', ''))
+                break
+            except ValueError:
+                continue
+        flag = next((part for part in parts[2:] if part.startswith('!')), '')
+        hops.append(TracerouteHop(hop_num, parts[1], rtt, flag=flag))
+    return hops
+
+
+class UdpTracer:
+    """
+    Traceroute UDP sin privilegios: todas las sondas TTL salen a la vez.
+
+    Un único socket UDP con IP_RECVERR recibe los ICMP time-exceeded y
+    port-unreachable por la cola de errores; el puerto destino de cada
+    sonda codifica (intento, TTL). Los saltos se entregan según llegan,
+    así que la latencia total es aproximadamente el RTT máximo.
+
+    Las sondas con TTL mayor que la distancia real también llegan al
+    destino: la respuesta del destino se retiene hasta que están todos
+    los saltos anteriores (o termina la espera), para no entregar un
+    destino más lejano que el real.
+    """
+
+    def __init__(self, max_hops: int = 15, wait: float = 2.0):
+        self.max_hops = max_hops
+        self.wait = wait
+
+    def _port(self, ttl: int, attempt: int) -> int:
+        return TRACEROUTE_BASE_PORT + attempt * self.max_hops + ttl - 1
+
+    def _send(self, sock: socket.socket, ip: str, ttl: int, attempt: int, sent: Dict[int, float]):
+        port = self._port(ttl, attempt)
+        sock.setsockopt(socket.SOL_IP, socket.IP_TTL, ttl)
+        sent[port] = time.perf_counter()
+        try:
+            sock.sendto(b'pi-command-center', (ip, port))
+        except OSError as e:
+            logger.debug(f"Error enviando sonda TTL {ttl}: {e}")
+
+    @staticmethod
+    def _hop(ttl: int, target: str, offender: str, icmp_type: int, icmp_code: int,
+             rtt: float) -> TracerouteHop:
+        """
+        Salto a partir del ICMP recibido. Solo el port-unreachable enviado
+        por el propio destino lo alcanza; otros inalcanzables se anotan.
+        """
+        unreachable = icmp_type == ICMP_DEST_UNREACH
+        reached = unreachable and icmp_code == ICMP_PORT_UNREACH and offender == target
+        flag = UNREACH_FLAGS.get(icmp_code, '') if unreachable and not reached else ''
+        return TracerouteHop(ttl, offender, rtt, reached=reached, flag=flag)
+
+    @staticmethod
+    def _drain(sock: socket.socket, queue: asyncio.Queue):
+        while True:
+            try:
+                _, ancdata, _, addr = sock.recvmsg(512, 512, socket.MSG_ERRQUEUE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                logger.debug(f"Error leyendo cola de errores: {e}")
+                break
+            received = time.perf_counter()
+            for level, ctype, data in ancdata:
+                if level != socket.SOL_IP or ctype != IP_RECVERR or len(data) < _SOCK_EXTENDED_ERR.size + 8:
+                    continue
+                _, origin, icmp_type, icmp_code, _, _, _ = _SOCK_EXTENDED_ERR.unpack_from(data)
+                if origin != SO_EE_ORIGIN_ICMP:
+                    continue
+                # SO_EE_OFFENDER: sockaddr_in tras la cabecera
+                offset = _SOCK_EXTENDED_ERR.size
+                offender = socket.inet_ntoa(data[offset + 4:offset + 8])
+                queue.put_nowait((addr[1], offender, icmp_type, icmp_code, received))
+        # Datos normales (un destino que contesta por UDP) no deben quedar en el buffer
+        while True:
+            try:
+                sock.recv(512)
+            except OSError:
+                break
+
+    async def trace(self, target: str) -> AsyncIterator[TracerouteHop]:
+        """Genera saltos según llegan; al final, los que no respondieron."""
+        ip = await resolve_ipv4(target)
+        if ip is None:
+            raise OSError(f"{target} no es IPv4")
+
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.SOL_IP, IP_RECVERR, 1)
+        queue: asyncio.Queue = asyncio.Queue()
+        loop.add_reader(sock.fileno(), self._drain, sock, queue)
+
+        sent: Dict[int, float] = {}
+        answered: Dict[int, TracerouteHop] = {}
+        dest_hop: Optional[int] = None
+        destination: Optional[TracerouteHop] = None     # retenido hasta cerrar el camino
+        try:
+            for ttl in range(1, self.max_hops + 1):
+                self._send(sock, ip, ttl, 0, sent)
+            start = loop.time()
+            retry_at, deadline = start + self.wait / 2, start + self.wait
+            retried = False
+
+            while True:
+                last = dest_hop or self.max_hops
+                if all(h in answered for h in range(1, last + 1)):
+                    break
+                now = loop.time()
+                if now >= deadline:
+                    break
+                if not retried and now >= retry_at:
+                    # Segundo intento solo para los saltos que faltan
+                    for ttl in range(1, last + 1):
+                        if ttl not in answered:
+                            self._send(sock, ip, ttl, 1, sent)
+                    retried = True
+                    deadline = loop.time() + self.wait / 2
+                    continue
+                try:
+                    port, offender, icmp_type, icmp_code, received = await asyncio.wait_for(
+                        queue.get(), (deadline if retried else retry_at) - now
+                    )
+                except asyncio.TimeoutError:
+                    continue
+
+                ttl = (port - TRACEROUTE_BASE_PORT) % self.max_hops + 1
+                if port not in sent or ttl in answered or (dest_hop and ttl > dest_hop):
+                    continue
+                if icmp_type not in (ICMP_TIME_EXCEEDED, ICMP_DEST_UNREACH):
+                    continue
+                hop = self._hop(ttl, ip, offender, icmp_type, icmp_code, (received - sent[port]) * 1000)
+                answered[ttl] = hop
+                if hop.reached:
+                    dest_hop = ttl
+                    destination = hop
+                    # Los saltos ya recibidos más allá del destino se descartan
+                    for extra in [t for t in answered if t > ttl]:
+                        del answered[extra]
+                else:
+                    yield hop
+                if destination and all(h in answered for h in range(1, dest_hop)):
+                    yield destination
+                    destination = None
+        finally:
+            loop.remove_reader(sock.fileno())
+            sock.close()
+
+        for ttl in range(1, (dest_hop or self.max_hops) + 1):
+            if ttl not in answered:
+                yield TracerouteHop(ttl)
+        if destination:
+            yield destination
+
+
+# ═══════════════════════════════════════════════════════════════
+# ESCANEO TCP NATIVO
+# ═══════════════════════════════════════════════════════════════
+
+# Top 100 puertos TCP de nmap (-F) con su nombre de servicio
+COMMON_PORTS = {
+    7: 'echo', 9: 'discard', 13: 'daytime', 21: 'ftp', 22: 'ssh', 23: 'telnet',
+    25: 'smtp', 26: 'rsftp', 37: 'time', 53: 'domain', 79: 'finger', 80: 'http',
+    81: 'hosts2-ns', 88: 'kerberos-sec', 106: 'pop3pw', 110: 'pop3', 111: 'rpcbind',
+    113: 'ident', 119: 'nntp', 135: 'msrpc', 139: 'netbios-ssn', 143: 'imap',
+    144: 'news', 179: 'bgp', 199: 'smux', 389: 'ldap', 427: 'svrloc', 443: 'https',
+    444: 'snpp', 445: 'microsoft-ds', 465: 'smtps', 513: 'login', 514: 'shell',
+    515: 'printer', 543: 'klogin', 544: 'kshell', 548: 'afp', 554: 'rtsp',
+    587: 'submission', 631: 'ipp', 646: 'ldp', 873: 'rsync', 990: 'ftps',
+    993: 'imaps', 995: 'pop3s', 1025: 'NFS-or-IIS', 1026: 'LSA-or-nterm',
+    1027: 'IIS', 1028: 'unknown', 1029: 'ms-lsa', 1110: 'nfsd-status',
+    1433: 'ms-sql-s', 1720: 'h323q931', 1723: 'pptp', 1755: 'wms', 1900: 'upnp',
+    2000: 'cisco-sccp', 2001: 'dc', 2049: 'nfs', 2121: 'ccproxy-ftp',
+    2717: 'pn-requester', 3000: 'ppp', 3128: 'squid-http', 3306: 'mysql',
+    3389: 'ms-wbt-server', 3986: 'mapper-ws_ethd', 4899: 'radmin', 5000: 'upnp',
+    5009: 'airport-admin', 5051: 'ida-agent', 5060: 'sip', 5101: 'admdog',
+    5190: 'aol', 5357: 'wsdapi', 5432: 'postgresql', 5631: 'pcanywheredata',
+    5666: 'nrpe', 5800: 'vnc-http', 5900: 'vnc', 6000: 'X11', 6001: 'X11:1',
+    6646: 'unknown', 7070: 'realserver', 8000: 'http-alt', 8008: 'http',
+    8009: 'ajp13', 8080: 'http-proxy', 8081: 'blackice-icecap', 8443: 'https-alt',
+    8888: 'sun-answerbook', 9100: 'jetdirect', 9999: 'abyss',
+    10000: 'snet-sensor-mgmt', 32768: 'filenet-tms', 49152: 'unknown',
+    49153: 'unknown', 49154: 'unknown', 49155: 'unknown', 49156: 'unknown',
+    49157: 'unknown',
+}
+
+_LINGER_RST = struct.pack('ii', 1, 0)
+
+
+def port_service(port: int) -> str:
+    """Nombre de servicio conocido para un puerto TCP."""
+    if port in COMMON_PORTS:
+        return COMMON_PORTS[port]
+    if port in PORT_FINGERPRINTS:
+        return PORT_FINGERPRINTS[port][0][0]
+    return 'unknown'
+
+
+class TcpConnectScanner:
+    """
+    Escáner TCP connect asíncrono (sin nmap ni privilegios).
+
+    Un semáforo limita las conexiones simultáneas; el RTT se mide solo
+    alrededor del connect() y el cierre envía RST para no dejar sockets
+    en TIME_WAIT.
+    """
+
+    def __init__(self, concurrency: int = None, timeout: float = None):
+        self.timeout = timeout or config.PORT_SCAN_TIMEOUT
+        self._semaphore = asyncio.Semaphore(concurrency or config.PORT_SCAN_CONCURRENCY)
+
+    async def probe(self, ip: str, port: int, timeout: float = None) -> Optional[float]:
+        """RTT del connect en ms, o None si el puerto está cerrado/filtrado."""
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+        async with self._semaphore:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                start = time.perf_counter()
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout or self.timeout)
+                return (time.perf_counter() - start) * 1000
+            except (OSError, asyncio.TimeoutError):
+                return None
+            finally:
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+                except OSError:
+                    pass
+                sock.close()
+
+    async def scan(self, ips: List[str], ports: List[int]) -> Dict[str, Dict[int, float]]:
+        """Escanea todas las combinaciones IP x puerto en una pasada."""
+        pairs = [(ip, port) for ip in ips for port in ports]
+        rtts = await asyncio.gather(*(self.probe(ip, port) for ip, port in pairs))
+        result: Dict[str, Dict[int, float]] = {ip: {} for ip in ips}
+        for (ip, port), rtt in zip(pairs, rtts):
+            if rtt is not None:
+                result[ip][port] = rtt
+        return result
+
+
+# ═══════════════════════════════════════════════════════════════
+# IDENTIDAD DE DISPOSITIVOS CON MAC ALEATORIA
+# ═══════════════════════════════════════════════════════════════
+
+# Nombres por defecto compartidos por muchos equipos: no identifican a nadie
+GENERIC_HOSTNAMES = frozenset({
+    '', '*', '?', 'unknown', 'localhost', 'iphone', 'ipad', 'android',
+    'galaxy', 'macbook', 'macbook-pro', 'macbook-air', 'windows', 'desktop', 'laptop',
+})
+
+# Una MAC aleatoria nueva en la IP de otra identidad aleatoria vista hace
+# menos de esto se considera el mismo equipo (el lease DHCP sigue vigente)
+IDENTITY_IP_WINDOW = 3600
+
+
+class DeviceIdentityResolver:
+    """
+    Agrupa las MAC rotadas (bit localmente administrado) de un mismo equipo.
+
+    Señales de más a menos fiable: client-id DHCP, nombre mDNS, hostname
+    no genérico y continuidad de IP. Una señal compartida por dos
+    identidades distintas se marca ambigua y deja de usarse.
+    """
+
+    def __init__(self):
+        self.aliases: Dict[str, str] = {}                          # MAC rotada -> MAC canónica
+        self._signals: Dict[Tuple[str, str], Optional[str]] = {}   # señal -> MAC canónica (None = ambigua)
+        self._ips: Dict[str, Tuple[str, int]] = {}                 # IP -> (MAC canónica, última vez)
+        # Índices inversos (MAC canónica -> lo que le apunta) para olvidar sin recorrerlo todo
+        self._aliases_of: Dict[str, Set[str]] = {}
+        self._signals_of: Dict[str, Set[Tuple[str, str]]] = {}
+        self._ips_of: Dict[str, Set[str]] = {}
+
+    def load_aliases(self, aliases: Dict[str, str]):
+        """Carga los alias guardados (MAC rotada -> MAC canónica)."""
+        self.aliases = dict(aliases)
+        self._aliases_of = {}
+        for alias, canonical in self.aliases.items():
+            self._aliases_of.setdefault(canonical, set()).add(alias)
+
+    @staticmethod
+    def signals(device: "NetworkDevice") -> List[Tuple[str, str]]:
+        keys = []
+        if device.client_id:
+            keys.append(('client_id', device.client_id.lower()))
+        mdns = device.mdns_name.lower().removesuffix('.local')
+        if mdns and mdns not in GENERIC_HOSTNAMES:
+            keys.append(('mdns', mdns))
+        hostname = device.hostname.lower()
+        if hostname not in GENERIC_HOSTNAMES and hostname != device.ip:
+            keys.append(('hostname', hostname))
+        return keys
+
+    def canonical(self, mac: str) -> str:
+        return self.aliases.get(mac, mac)
+
+    def resolve(self, device: "NetworkDevice", by_ip: bool = True) -> Optional[str]:
+        """
+        MAC canónica de otra identidad a la que pertenece el dispositivo.
+
+        Args:
+            by_ip: Usar también la continuidad de IP (solo para MACs recién vistas)
+        """
+        if not is_locally_administered(device.mac):
+            return None
+        if device.mac in self.aliases:
+            return self.aliases[device.mac]
+        for key in self.signals(device):
+            canonical = self._signals.get(key)
+            if canonical and canonical != device.mac:
+                return canonical
+        seen = self._ips.get(device.ip) if by_ip else None
+        if seen and seen[0] != device.mac and time.time() - seen[1] < IDENTITY_IP_WINDOW:
+            return seen[0]
+        return None
+
+    def learn(self, device: "NetworkDevice"):
+        """Indexa las señales de una identidad canónica."""
+        if not is_locally_administered(device.mac):
+            return
+        mac = device.mac
+        for key in self.signals(device):
+            current = self._signals.get(key, mac)
+            if current == mac:
+                self._signals[key] = mac
+                self._signals_of.setdefault(mac, set()).add(key)
+            else:
+                self._signals[key] = None
+                if current is not None:
+                    self._signals_of.get(current, set()).discard(key)
+        if device.ip:
+            previous = self._ips.get(device.ip)
+            if previous and previous[0] != mac:
+                self._ips_of.get(previous[0], set()).discard(device.ip)
+            self._ips[device.ip] = (mac, device.last_seen_ts)
+            self._ips_of.setdefault(mac, set()).add(device.ip)
+
+    def alias(self, mac: str, canonical: str) -> List[str]:
+        """
+        Registra `mac` como alias de `canonical`.
+
+        Returns:
+            Alias cuyo destino cambió (incluido `mac`)
+        """
+        moved = sorted(self._aliases_of.pop(mac, ()))
+        for alias in moved:
+            self.aliases[alias] = canonical
+        self._unalias(mac)
+        self.aliases[mac] = canonical
+        self._aliases_of.setdefault(canonical, set()).update(moved, (mac,))
+        self.forget(mac, keep_aliases=True)
+        return moved + [mac]
+
+    def _unalias(self, mac: str):
+        target = self.aliases.pop(mac, None)
+        if target is not None:
+            aliases = self._aliases_of.get(target)
+            if aliases is not None:
+                aliases.discard(mac)
+                if not aliases:
+                    del self._aliases_of[target]
+
+    def forget(self, mac: str, keep_aliases: bool = False):
+        """Olvida una identidad (al desalojarla o absorberla en otra)."""
+        for key in self._signals_of.pop(mac, ()):
+            if self._signals.get(key) == mac:
+                del self._signals[key]
+        for ip in self._ips_of.pop(mac, ()):
+            if self._ips.get(ip, ("",))[0] == mac:
+                del self._ips[ip]
+        if not keep_aliases:
+            for alias in self._aliases_of.pop(mac, ()):
+                del self.aliases[alias]
+            self._unalias(mac)
+
+
+# ═══════════════════════════════════════════════════════════════
+# ÍNDICES DEL CACHE DE DISPOSITIVOS
+# ═══════════════════════════════════════════════════════════════
+
+class DeviceIndex:
+    """
+    Índices secundarios del cache: IP, online, tipo, fabricante y n-gramas
+    de MAC/hostname/nombre mDNS para búsquedas por subcadena.
+
+    Se mantiene de forma incremental con update()/remove(); cada MAC
+    recuerda las claves con las que se indexó para poder retirarlas.
+    """
+
+    GRAM = 3
+
+    def __init__(self):
+        self.by_ip: Dict[str, Set[str]] = {}
+        self.online: Set[str] = set()
+        self.by_type: Dict[str, Set[str]] = {}
+        self.by_vendor: Dict[str, Set[str]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+        self._keys: Dict[str, tuple] = {}       # MAC -> (ip, tipo, fabricante, nombres)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def _grams_of(cls, text: str) -> Set[str]:
+        return {text[i:i + cls.GRAM] for i in range(len(text) - cls.GRAM + 1)}
+
+    @staticmethod
+    def _names(device: "NetworkDevice") -> Tuple[str, ...]:
+        names = {device.mac.lower(), device.hostname.lower(), device.mdns_name.lower()}
+        names.discard('')
+        return tuple(sorted(names))
+
+    @staticmethod
+    def _add(buckets: Dict[str, Set[str]], key: str, mac: str):
+        buckets.setdefault(key, set()).add(mac)
+
+    @staticmethod
+    def _discard(buckets: Dict[str, Set[str]], key: str, mac: str):
+        bucket = buckets.get(key)
+        if bucket is not None:
+            bucket.discard(mac)
+            if not bucket:
+                del buckets[key]
+
+    def update(self, device: "NetworkDevice"):
+        """(Re)indexa un dispositivo tras cambiar sus datos."""
+        mac = device.mac
+        keys = (device.ip, device.device_type, device.vendor.lower(), self._names(device))
+        old = self._keys.get(mac)
+        if old != keys:
+            if old:
+                self._unindex(mac, old)
+            ip, device_type, vendor, names = self._keys[mac] = keys
+            if ip:
+                self._add(self.by_ip, ip, mac)
+            self._add(self.by_type, device_type, mac)
+            self._add(self.by_vendor, vendor, mac)
+            for gram in set().union(*map(self._grams_of, names)):
+                self._add(self._grams, gram, mac)
+        if device.is_online:
+            self.online.add(mac)
+        else:
+            self.online.discard(mac)
+
+    def remove(self, mac: str):
+        """Retira un dispositivo de todos los índices."""
+        old = self._keys.pop(mac, None)
+        if old:
+            self._unindex(mac, old)
+        self.online.discard(mac)
+
+    def _unindex(self, mac: str, keys: tuple):
+        ip, device_type, vendor, names = keys
+        if ip:
+            self._discard(self.by_ip, ip, mac)
+        self._discard(self.by_type, device_type, mac)
+        self._discard(self.by_vendor, vendor, mac)
+        for gram in set().union(*map(self._grams_of, names)):
+            self._discard(self._grams, gram, mac)
+
+    def search(self, text: str) -> List[str]:
+        """MACs cuya MAC, hostname o nombre mDNS contienen el texto."""
+        text = text.strip().lower()
+        if not text:
+            return []
+        if len(text) < self.GRAM:
+            candidates = self._keys.keys()
+        else:
+            postings = sorted((self._grams.get(g, set()) for g in self._grams_of(text)), key=len)
+            candidates = set.intersection(*postings)
+        return [mac for mac in candidates if any(text in name for name in self._keys[mac][3])]
+
+
+# ═══════════════════════════════════════════════════════════════
+# CAMBIOS ENTRE ESCANEOS
+# ═══════════════════════════════════════════════════════════════
+
+# Tema del bus de eventos donde se publican los ScanDelta
+NETWORK_DELTA = "network.delta"
+
+
+@dataclass
+class ScanDelta:
+    """Cambios respecto al estado anterior (un escaneo completo o un evento netlink)."""
+    source: str = "scan"
+    joined: List["NetworkDevice"] = field(default_factory=list)
+    left: List["NetworkDevice"] = field(default_factory=list)
+    ip_changed: List[Tuple["NetworkDevice", str]] = field(default_factory=list)           # (dispositivo, IP anterior)
+    hostname_changed: List[Tuple["NetworkDevice", str]] = field(default_factory=list)     # (dispositivo, hostname anterior)
+    ports_changed: List[Tuple["NetworkDevice", Tuple[int, ...]]] = field(default_factory=list)  # (dispositivo, puertos anteriores)
+    timestamp: datetime = field(default_factory=datetime.now)
+
+    def __bool__(self) -> bool:
+        return bool(self.joined or self.left or self.ip_changed or self.hostname_changed or self.ports_changed)
+
+    @classmethod
+    def build(cls, cache: Dict[str, "NetworkDevice"], joined: Iterable[str], left: Iterable[str],
+              changes: Dict[str, tuple], source: str = "scan") -> "ScanDelta":
+        """
+        Construye el delta a partir de las MACs que entraron/salieron y del
+        estado previo (ip, hostname, puertos) de los dispositivos modificados.
+        """
+        delta = cls(
+            source=source,
+            joined=[cache[mac] for mac in joined if mac in cache],
+            left=[cache[mac] for mac in left if mac in cache],
+        )
+        for mac, (ip, hostname, ports) in changes.items():
+            device = cache.get(mac)
+            if device is None:
+                continue
+            if device.ip != ip and ip:
+                delta.ip_changed.append((device, ip))
+            if device.hostname != hostname:
+                delta.hostname_changed.append((device, hostname))
+            if device.open_ports != ports:
+                delta.ports_changed.append((device, tuple(ports)))
+        return delta
+
+
+# ═══════════════════════════════════════════════════════════════
+# HISTORIAL PERSISTENTE
+# ═══════════════════════════════════════════════════════════════
+
+class DeviceHistoryStore:
+    """
+    Historial de dispositivos en SQLite.
+
+    Sólo se escriben las filas que cambiaron; las consultas por fecha
+    usan índices sobre first_seen y last_seen (epoch).
+    """
+
+    COLUMNS = ('mac', 'ip', 'hostname', 'vendor', 'os_guess', 'open_ports',
+               'first_seen', 'last_seen', 'times_seen')
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS devices (
+            mac TEXT PRIMARY KEY,
+            ip TEXT NOT NULL DEFAULT '',
+            hostname TEXT NOT NULL DEFAULT '',
+            vendor TEXT NOT NULL DEFAULT '',
+            os_guess TEXT NOT NULL DEFAULT '',
+            open_ports TEXT NOT NULL DEFAULT '[]',
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            times_seen INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen);
+        CREATE INDEX IF NOT EXISTS idx_devices_first_seen ON devices(first_seen);
+        CREATE INDEX IF NOT EXISTS idx_devices_ip ON devices(ip);
+        CREATE TABLE IF NOT EXISTS mac_aliases (
+            mac TEXT PRIMARY KEY,
+            canonical TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_mac_aliases_canonical ON mac_aliases(canonical);
+    """
+
+    # Segundo dígito hex con el bit localmente administrado activo
+    RANDOM_MAC_SQL = "substr(mac, 2, 1) IN ('2', '3', '6', '7', 'A', 'B', 'E', 'F')"
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path))
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def _select(self, where: str = "", params: tuple = ()) -> List[tuple]:
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM devices {where}"
+        return self.conn.execute(sql, params).fetchall()
+
+    def get(self, mac: str) -> Optional[tuple]:
+        rows = self._select("WHERE mac = ?", (mac,))
+        return rows[0] if rows else None
+
+    def get_by_ip(self, ip: str) -> Optional[tuple]:
+        rows = self._select("WHERE ip = ? ORDER BY last_seen DESC LIMIT 1", (ip,))
+        return rows[0] if rows else None
+
+    def all(self) -> List[tuple]:
+        return self._select("ORDER BY last_seen DESC")
+
+    def recent(self, limit: int) -> List[tuple]:
+        return self._select("ORDER BY last_seen DESC LIMIT ?", (limit,))
+
+    def first_seen_since(self, cutoff: float) -> List[tuple]:
+        return self._select("WHERE first_seen > ? ORDER BY first_seen DESC", (cutoff,))
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def upsert_many(self, rows: List[tuple]):
+        """Inserta o actualiza filas en una sola transacción."""
+        if not rows:
+            return
+        columns = ', '.join(self.COLUMNS)
+        placeholders = ', '.join('?' * len(self.COLUMNS))
+        updates = ', '.join(f"{c} = excluded.{c}" for c in self.COLUMNS[1:])
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO devices ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(mac) DO UPDATE SET {updates}",
+                rows
+            )
+
+    def delete_many(self, macs: List[str]):
+        """Borra dispositivos y los alias que apuntan a ellos."""
+        if not macs:
+            return
+        params = [(mac,) for mac in macs]
+        with self.conn:
+            self.conn.executemany("DELETE FROM devices WHERE mac = ?", params)
+            self.conn.executemany("DELETE FROM mac_aliases WHERE canonical = ?", params)
+
+    def expired(self, cutoff: float, random_cutoff: float, max_devices: int) -> List[str]:
+        """
+        MACs a desalojar: no vistas desde `cutoff` (`random_cutoff` para
+        MACs aleatorias) y, por encima de `max_devices`, las menos recientes.
+        """
+        rows = self.conn.execute(
+            f"SELECT mac FROM devices WHERE last_seen < ? OR ({self.RANDOM_MAC_SQL} AND last_seen < ?)",
+            (cutoff, random_cutoff)
+        ).fetchall()
+        rows += self.conn.execute(
+            "SELECT mac FROM devices ORDER BY last_seen DESC LIMIT -1 OFFSET ?", (max_devices,)
+        ).fetchall()
+        return list(dict.fromkeys(row[0] for row in rows))
+
+    def aliases(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT mac, canonical FROM mac_aliases").fetchall())
+
+    def set_aliases(self, aliases: Dict[str, str]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO mac_aliases (mac, canonical) VALUES (?, ?) "
+                "ON CONFLICT(mac) DO UPDATE SET canonical = excluded.canonical",
+                list(aliases.items())
+            )
+
+    def migrate_json(self, json_path: Path):
+        """Importa una vez el antiguo network_history.json."""
+        if not json_path.exists() or self.count():
+            return
+        with open(json_path) as f:
+            data = json.load(f)
+        now = time.time()
+        rows = []
+        for mac, info in data.items():
+            first = datetime.fromisoformat(info['first_seen']).timestamp() if 'first_seen' in info else now
+            last = datetime.fromisoformat(info['last_seen']).timestamp() if 'last_seen' in info else now
+            rows.append((
+                mac, info.get('ip', ''), info.get('hostname', ''), info.get('vendor', ''),
+                info.get('os_guess', ''), json.dumps(info.get('open_ports', [])),
+                first, last, info.get('times_seen', 1),
+            ))
+        self.upsert_many(rows)
+        json_path.rename(json_path.with_suffix('.json.migrated'))
+        logger.info(f"Historial migrado a SQLite: {len(rows)} dispositivos")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class NetworkService:
+    """Servicio avanzado de red."""
+
+    def __init__(self, docker: Optional[DockerEngine] = None, events: Optional[EventBus] = None):
+        self._docker = docker or DockerEngine()
+        self.events = events or EventBus()
+        self._cache: Dict[str, NetworkDevice] = {}
+        self._last_scan: Optional[datetime] = None
+        self._history_file = Path(config.DATA_DIR) / "network_history.json"
+        self._store = DeviceHistoryStore(Path(config.DATA_DIR) / "network_history.db")
+        self._dirty: Set[str] = set()      # MACs del cache con cambios sin guardar
+        self._identities = DeviceIdentityResolver()
+        self._index = DeviceIndex()
+        self._changes: Optional[Dict[str, tuple]] = None     # estado previo de lo modificado en el escaneo en curso
+        self._last_prune = 0.0
+        self._network = ipaddress.ip_network(config.LOCAL_NETWORK, strict=False)
+        self._neighbour_listener: Optional[NeighbourListener] = None
+        self._neighbour_probes: OrderedDict[str, float] = OrderedDict()    # IP -> última sonda (monotonic)
+        self._probe_tasks: Set[asyncio.Task] = set()
+        self._neighbours = NeighbourTable()
+        self.mdns_answer_counts: Dict[str, int] = {}
+        self._ssdp_descriptions = SsdpDescriptionCache()
+        self._lease_file = FileLeaseSource(config.DHCP_LEASES_FILE)
+        self._lease_docker = DockerLeaseSource(self._docker)
+        self._ftl_db = PiholeNetworkDb(config.PIHOLE_FTL_DB)
+        self._resolver = DnsResolver()
+        self._pinger = IcmpPinger()
+        self._port_scanner = TcpConnectScanner()
+        self._load_history()
+
+    def _load_history(self):
+        """Prepara el historial (los dispositivos se cargan bajo demanda)."""
+        try:
+            self._store.migrate_json(self._history_file)
+            self._identities.load_aliases(self._store.aliases())
+        except Exception as e:
+            logger.error(f"Error cargando historial: {e}")
+
+    @staticmethod
+    def _history_row(device: NetworkDevice) -> tuple:
+        return (
+            device.mac, device.ip, device.hostname, device.vendor, device.os_guess,
+            json.dumps(device.open_ports.tolist()),
+            device.first_seen_ts, device.last_seen_ts, device.times_seen,
+        )
+
+    @staticmethod
+    def _device_from_row(row: tuple) -> NetworkDevice:
+        """Dispositivo (offline) construido desde una fila del historial."""
+        mac, ip, hostname, vendor, os_guess, open_ports, first_seen, last_seen, times_seen = row
+        return NetworkDevice(
+            mac=mac,
+            ip=ip,
+            hostname=hostname,
+            vendor=vendor,
+            os_guess=os_guess,
+            open_ports=json.loads(open_ports),
+            first_seen=first_seen,
+            last_seen=last_seen,
+            times_seen=times_seen,
+            is_online=False
+        )
+
+    def _hydrate(self, row: tuple) -> NetworkDevice:
+        """Materializa en el cache una fila del historial (dispositivo visto de nuevo)."""
+        mac = row[0]
+        if mac in self._cache:
+            return self._cache[mac]
+        device = self._device_from_row(row)
+        self._cache[mac] = device
+        self._index.update(device)
+        self._evict_cache(keep=mac)
+        return device
+
+    def _lookup(self, mac: str) -> Optional[NetworkDevice]:
+        """Como _known pero de solo lectura: lo que no está en cache no se carga en él."""
+        mac = self._identities.canonical(mac)
+        device = self._cache.get(mac)
+        if device is None:
+            try:
+                row = self._store.get(mac)
+            except sqlite3.Error as e:
+                logger.error(f"Error leyendo historial: {e}")
+                return None
+            if row:
+                device = self._device_from_row(row)
+        return device
+
+    def _known(self, mac: str) -> Optional[NetworkDevice]:
+        """Dispositivo del cache o, si no, del historial (resolviendo alias de MAC)."""
+        mac = self._identities.canonical(mac)
+        device = self._cache.get(mac)
+        if device is None:
+            try:
+                row = self._store.get(mac)
+            except sqlite3.Error as e:
+                logger.error(f"Error leyendo historial: {e}")
+                return None
+            if row:
+                device = self._hydrate(row)
+        return device
+
+    def _save_history(self):
+        """Guarda en el historial sólo los dispositivos que cambiaron."""
+        try:
+            dirty = [mac for mac in self._dirty if mac in self._cache]
+            self._store.upsert_many([self._history_row(self._cache[mac]) for mac in dirty])
+            self._dirty.clear()
+        except Exception as e:
+            logger.error(f"Error guardando historial: {e}")
+
+    async def scan_all(self, deep: bool = False, use_cache: bool = False) -> List[NetworkDevice]:
+        """
+        Escaneo completo de red.
+
+        Args:
+            deep: Si True, hace escaneo nmap y de puertos de huella (más lento pero más info)
+            use_cache: Si True, devuelve cache si fue escaneado hace menos de 30s
+        """
+        # Si use_cache y el cache es reciente, devolver cache
+        if use_cache and self._last_scan:
+            age = (datetime.now() - self._last_scan).total_seconds()
+            if age < 30:
+                return sorted(self.get_online_devices(), key=lambda d: self._ip_sort_key(d.ip))
+
+        # Una sola lectura de la tabla ARP por escaneo
+        self._neighbours.invalidate()
+        previous = set(self._index.online)
+
+        # Escaneos en paralelo (básicos + discovery)
+        tasks = [
+            self._scan_pihole_network(),    # Solo completa datos (ver abajo)
+            self._scan_arp(),
+            self._scan_dhcp_leases(),
+            self._scan_mdns(),      # Descubrimiento mDNS/Bonjour
+            self._scan_ssdp(),      # Descubrimiento UPnP/SSDP
+        ]
+
+        if deep:
+            tasks.append(self._scan_nmap())
+
+        ftl, *results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Combinar resultados
+        seen = set()
+        changes = self._changes = {}
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error en scan: {result}")
+                continue
+            for device in result:
+                seen.add(self._merge_device(device).mac)
+
+        # Una fila de pihole-FTL no prueba presencia (lastQuery puede ser
+        # antiguo): sólo completa dispositivos vistos por otra fuente
+        if isinstance(ftl, Exception):
+            logger.error(f"Error en scan: {ftl}")
+        else:
+            for device in ftl:
+                if self._identities.canonical(device.mac) in seen:
+                    self._merge_device(device)
+        self._changes = None
+
+        # Los que no respondieron pasan a offline (una MAC absorbida por otra identidad ya no está en cache)
+        seen &= self._cache.keys()
+        left = previous - seen
+        for mac in left:
+            device = self._cache.get(mac)
+            if device:
+                device.is_online = False
+                self._index.update(device)
+
+        if deep:
+            ports_before = {d.mac: d.open_ports for d in self.get_online_devices()}
+            try:
+                await self.scan_fingerprint_ports()
+            except Exception as e:
+                logger.error(f"Error escaneando puertos de huella: {e}")
+            for mac, ports in ports_before.items():
+                device = self._cache.get(mac)
+                if device and device.open_ports != ports:
+                    changes.setdefault(mac, (device.ip, device.hostname, ports))
+
+        self._last_scan = datetime.now()
+        self._save_history()
+        self._publish(ScanDelta.build(self._cache, seen - previous, left, changes))
+        self._evict_cache()
+
+        # Devolver solo los online, ordenados
+        return sorted(self.get_online_devices(), key=lambda d: self._ip_sort_key(d.ip))
+
+    def _merge_device(self, new: NetworkDevice) -> NetworkDevice:
+        """
+        Merge información de dispositivo.
+
+        Las MAC aleatorias se resuelven a la identidad canónica del equipo.
+
+        Returns:
+            Dispositivo canónico resultante
+        """
+        existing = self._known(new.mac)
+        if existing is None:
+            target = self._identities.resolve(new)
+            existing = self._known(target) if target else None
+            if existing:
+                self._add_alias(new.mac, existing.mac)
+        if existing:
+            before = (existing.ip, existing.hostname, existing.open_ports)
+            existing.ip = new.ip or existing.ip
+            existing.hostname = new.hostname or existing.hostname
+            existing.vendor = new.vendor or existing.vendor
+            existing.os_guess = new.os_guess or existing.os_guess
+            # Nuevos campos de discovery
+            existing.mdns_name = new.mdns_name or existing.mdns_name
+            existing.ssdp_info = new.ssdp_info or existing.ssdp_info
+            existing.client_id = new.client_id or existing.client_id
+            if new.mdns_services:
+                existing.mdns_services = set(existing.mdns_services + new.mdns_services)
+            if new.open_ports:
+                existing.open_ports = existing.open_ports + new.open_ports
+            existing.last_seen = datetime.now()
+            existing.times_seen += 1
+            existing.is_online = True
+            existing.invalidate_classification()
+            if self._changes is not None and before != (existing.ip, existing.hostname, existing.open_ports):
+                self._changes.setdefault(existing.mac, before)
+            device = self._absorb_duplicate(existing)
+        else:
+            new.is_online = True
+            new.first_seen = datetime.now()
+            self._cache[new.mac] = device = new
+        self._identities.learn(device)
+        self._index.update(device)
+        self._dirty.add(device.mac)
+        return device
+
+    # ─── Identidad y caducidad del historial ───
+
+    def _add_alias(self, mac: str, canonical: str):
+        """Registra una MAC rotada como alias de la identidad canónica."""
+        moved = self._identities.alias(mac, canonical)
+        try:
+            self._store.set_aliases({alias: canonical for alias in moved})
+        except sqlite3.Error as e:
+            logger.error(f"Error guardando alias de MAC: {e}")
+        logger.debug(f"MAC {mac} agrupada con {canonical}")
+
+    def _absorb_duplicate(self, device: NetworkDevice) -> NetworkDevice:
+        """
+        Une dos identidades del mismo equipo cuando una señal tardía las
+        relaciona (p.ej. la MAC llegó por netlink y el hostname por DHCP).
+        Se conserva la más antigua.
+        """
+        target = self._identities.resolve(device, by_ip=False)
+        other = self._known(target) if target else None
+        if other is None or other is device:
+            return device
+        keep, drop = (other, device) if other.first_seen_ts <= device.first_seen_ts else (device, other)
+        current = device    # la que acaba de verse trae los datos vigentes
+        keep.ip = current.ip or keep.ip
+        keep.hostname = current.hostname or keep.hostname
+        keep.vendor = keep.vendor or drop.vendor
+        keep.os_guess = keep.os_guess or drop.os_guess
+        keep.mdns_name = current.mdns_name or keep.mdns_name
+        keep.ssdp_info = keep.ssdp_info or drop.ssdp_info
+        keep.client_id = current.client_id or keep.client_id
+        keep.mdns_services = set(keep.mdns_services + drop.mdns_services)
+        keep.open_ports = keep.open_ports + drop.open_ports
+        keep.last_seen = max(keep.last_seen_ts, drop.last_seen_ts)
+        keep.times_seen += drop.times_seen
+        keep.is_online = keep.is_online or drop.is_online
+        keep.invalidate_classification()
+
+        self._cache.pop(drop.mac, None)
+        self._dirty.discard(drop.mac)
+        self._index.remove(drop.mac)
+        try:
+            self._store.delete_many([drop.mac])
+        except sqlite3.Error as e:
+            logger.error(f"Error borrando del historial: {e}")
+        self._add_alias(drop.mac, keep.mac)
+        return keep
+
+    def _evict_cache(self, keep: str = ""):
+        """
+        Limita el cache a NETWORK_CACHE_MAX: desaloja los offline vistos hace
+        más tiempo sin cambios pendientes de guardar (siguen en el historial).
+
+        Args:
+            keep: MAC que no se desaloja (la que se acaba de cargar)
+        """
+        excess = len(self._cache) - config.NETWORK_CACHE_MAX
+        if excess <= 0:
+            return
+        offline = heapq.nsmallest(
+            excess,
+            (d for d in self._cache.values()
+             if not d.is_online and d.mac != keep and d.mac not in self._dirty),
+            key=lambda d: d.last_seen_ts
+        )
+        for device in offline:
+            del self._cache[device.mac]
+            self._index.remove(device.mac)
+
+    def prune_history(self, protected: Iterable[str] = (), min_interval: float = 3600.0) -> int:
+        """
+        Aplica la política de caducidad del historial: edad máxima (menor
+        para MACs aleatorias) y tope de dispositivos, desalojando primero
+        los vistos hace más tiempo.
+
+        Args:
+            protected: MACs que nunca se borran (dispositivos conocidos)
+            min_interval: Segundos mínimos entre podas
+
+        Returns:
+            Número de dispositivos borrados
+        """
+        now = time.time()
+        if now - self._last_prune < min_interval:
+            return 0
+        self._last_prune = now
+        self._save_history()
+
+        keep = set(protected)
+        try:
+            expired = self._store.expired(
+                now - config.HISTORY_MAX_AGE_DAYS * 86400,
+                now - config.HISTORY_RANDOM_MAC_MAX_AGE_DAYS * 86400,
+                config.HISTORY_MAX_DEVICES
+            )
+            expired = [
+                mac for mac in expired
+                if mac not in keep and mac not in self._index.online
+            ]
+            self._store.delete_many(expired)
+        except sqlite3.Error as e:
+            logger.error(f"Error podando historial: {e}")
+            return 0
+
+        for mac in expired:
+            self._cache.pop(mac, None)
+            self._dirty.discard(mac)
+            self._index.remove(mac)
+            self._identities.forget(mac)
+        self._evict_cache()
+        if expired:
+            logger.info(f"Historial podado: {len(expired)} dispositivos")
+        return len(expired)
+
+    # ─── Presencia incremental (netlink) ───
+
+    def start_neighbour_listener(self, source=None) -> bool:
+        """
+        Inicia la escucha de la tabla de vecinos del kernel.
+
+        Args:
+            source: Fuente de datos netlink (por defecto el socket real)
+        """
+        if self._neighbour_listener:
+            return True
+        listener = NeighbourListener(source or NetlinkNeighbourSource(), self._on_neighbour_event)
+        try:
+            listener.start()
+        except OSError as e:
+            logger.warning(f"Escucha netlink no disponible: {e}")
+            return False
+        self._neighbour_listener = listener
+        logger.info("Escucha de vecinos netlink iniciada")
+        return True
+
+    def stop_neighbour_listener(self):
+        """Detiene la escucha netlink."""
+        if self._neighbour_listener:
+            self._neighbour_listener.stop()
+            self._neighbour_listener = None
+
+    async def close(self):
+        """Libera recursos (escucha netlink, inotify, bases de datos, sockets DNS/ICMP y pool HTTP de SSDP)."""
+        self.stop_neighbour_listener()
+        self._resolver.close()
+        self._pinger.close()
+        self._lease_file.close()
+        self._ftl_db.close()
+        self._save_history()
+        self._store.close()
+        await self._ssdp_descriptions.aclose()
+
+    def _on_neighbour_event(self, event: NeighbourEvent):
+        """Aplica un evento de vecino sobre el cache."""
+        try:
+            if ipaddress.ip_address(event.ip) not in self._network:
+                return
+        except ValueError:
+            return
+
+        if event.unconfirmed:
+            # STALE no prueba presencia: sondear y esperar a REACHABLE/FAILED
+            device = None
+            if event.mac:
+                self._neighbours.learn(event.ip, event.mac)
+                device = self._cache.get(self._identities.canonical(event.mac))
+            online = device is not None and device.is_online and device.ip == event.ip
+            self._probe_neighbour(
+                event.ip, NEIGHBOUR_ONLINE_PROBE_INTERVAL if online else NEIGHBOUR_PROBE_INTERVAL
+            )
+            return
+
+        if not event.online:
+            self._neighbours.forget(event.ip)
+            device = self._cache.get(self._identities.canonical(event.mac)) if event.mac \
+                else self.get_device_by_ip(event.ip)
+            if device and device.ip == event.ip and device.is_online:
+                device.is_online = False
+                self._index.update(device)
+                self._publish(ScanDelta(source="netlink", left=[device]))
+            return
+
+        if not event.mac:
+            return
+
+        self._neighbours.learn(event.ip, event.mac)
+        device = self._known(event.mac)
+        if device and device.is_online:
+            # Transición REACHABLE/STALE/DELAY: solo refrescar
+            previous_ip = device.ip
+            device.ip = event.ip
+            device.last_seen = datetime.now()
+            self._index.update(device)
+            self._dirty.add(device.mac)
+            if previous_ip and previous_ip != event.ip:
+                self._publish(ScanDelta(source="netlink", ip_changed=[(device, previous_ip)]))
+            return
+
+        if device:
+            device.ip = event.ip
+            device.last_seen = datetime.now()
+            device.times_seen += 1
+            device.is_online = True
+            self._index.update(device)
+            self._dirty.add(device.mac)
+        else:
+            device = self._merge_device(NetworkDevice(mac=event.mac, ip=event.ip, source="netlink"))
+
+        self._publish(ScanDelta(source="netlink", joined=[device]))
+
+    def _probe_neighbour(self, ip: str, interval: float = NEIGHBOUR_PROBE_INTERVAL):
+        """Ping breve para que el kernel confirme (REACHABLE) o descarte (FAILED) el vecino."""
+        probes = self._neighbour_probes
+        now = time.monotonic()
+        last = probes.get(ip)
+        if last is not None and now - last < interval:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        probes[ip] = now
+        probes.move_to_end(ip)
+        # Ordenado por última sonda: se olvida lo que ya no limita ninguna sonda y lo que sobra
+        while len(probes) > NEIGHBOUR_PROBES_MAX or \
+                next(iter(probes.values())) < now - NEIGHBOUR_ONLINE_PROBE_INTERVAL:
+            probes.popitem(last=False)
+        task = loop.create_task(self._pinger.ping(ip, count=1, timeout=1.0))
+        self._probe_tasks.add(task)
+        task.add_done_callback(self._probe_tasks.discard)
+
+    def _publish(self, delta: ScanDelta):
+        """Publica un delta no vacío en el bus de eventos."""
+        if delta:
+            self.events.publish(NETWORK_DELTA, delta)
+
+    async def _scan_arp(self) -> List[NetworkDevice]:
+        """Barrido ARP nativo (AF_PACKET), con arp-scan como respaldo."""
+        interface = config.NETWORK_INTERFACE or default_interface()
+        sweeper = ArpSweeper(
+            RawArpTransport(interface),
+            config.LOCAL_NETWORK,
+            rate=config.ARP_RATE,
+            retries=config.ARP_RETRIES
+        )
+        try:
+            devices = await sweeper.sweep()
+        except OSError as e:
+            logger.warning(f"Barrido ARP nativo no disponible en {interface} ({e}), usando arp-scan")
+            return await self._scan_arp_cli()
+
+        logger.debug(f"Barrido ARP: {sweeper.last_stats}")
+        for device in devices:
+            self._neighbours.learn(device.ip, device.mac)
+        return devices
+
+    async def _scan_arp_cli(self) -> List[NetworkDevice]:
+        """Escaneo ARP con arp-scan (requiere sudo)."""
+        devices = []
+        stdout, stderr, code = await run_async(
+            "sudo arp-scan -l -q --retry=2 2>/dev/null",
+            timeout=30
+        )
+
+        if code != 0:
+            logger.warning(f"arp-scan falló: {stderr}")
+            return devices
+
+        for line in stdout.split('\n'):
+            if not line or not re.match(r'^\d+\.', line):
+                continue
+            parts = line.split('\t')
+            if len(parts) >= 2:
+                devices.append(NetworkDevice(
+                    ip=parts[0].strip(),
+                    mac=parts[1].strip(),
+                    vendor=parts[2].strip() if len(parts) > 2 else "",
+                    source="arp"
+                ))
+
+        return devices
+
+    async def _scan_dhcp_leases(self) -> List[NetworkDevice]:
+        """Lee leases DHCP de Pi-hole."""
+        try:
+            leases = await self._lease_file.leases()
+        except OSError as e:
+            logger.debug(f"Fichero de leases no accesible, usando docker: {e}")
+            leases = await self._lease_docker.leases()
+
+        return [
+            NetworkDevice(
+                mac=lease.mac,
+                ip=lease.ip,
+                hostname=lease.hostname,
+                client_id=lease.client_id,
+                source="dhcp"
+            )
+            for lease in leases
+        ]
+
+    async def _scan_pihole_network(self) -> List[NetworkDevice]:
+        """Lee tabla de red de Pi-hole (solo clientes con actividad nueva)."""
+        try:
+            entries = await self._ftl_db.changed()
+        except sqlite3.Error as e:
+            logger.debug(f"pihole-FTL.db no accesible, usando docker: {e}")
+            return await self._scan_pihole_network_cli()
+
+        return [
+            NetworkDevice(
+                mac=entry.mac,
+                ip=entry.ip,
+                hostname=entry.name,
+                source="pihole"
+            )
+            for entry in entries
+        ]
+
+    async def _scan_pihole_network_cli(self) -> List[NetworkDevice]:
+        """Fallback: consulta la tabla de red vía docker exec sqlite3."""
+        devices = []
+        try:
+            stdout, _, code = await self._docker.exec("pihole", [
+                "sqlite3", "/etc/pihole/pihole-FTL.db",
+                "SELECT hwaddr, ip, name FROM network WHERE hwaddr != '' ORDER BY lastQuery DESC LIMIT 100"
+            ])
+        except httpx.HTTPError as e:
+            logger.debug(f"Error consultando pihole-FTL.db en el contenedor: {e}")
+            return devices
+
+        if code != 0 or not stdout:
+            return devices
+
+        for line in stdout.split('\n'):
+            parts = line.split('|')
+            if len(parts) >= 2 and parts[0]:
+                devices.append(NetworkDevice(
+                    mac=parts[0],
+                    ip=parts[1] if len(parts) > 1 else "",
+                    hostname=parts[2] if len(parts) > 2 else "",
+                    source="pihole"
+                ))
+
+        return devices
+
+    async def _scan_mdns(self) -> List[NetworkDevice]:
+        """Descubrimiento de dispositivos via mDNS/Bonjour."""
+        devices = []
+        browser = MdnsBrowser()
+
+        try:
+            hosts = await browser.browse()
+        except OSError as e:
+            logger.debug(f"Error en mDNS: {e}")
+            return devices
+
+        self.mdns_answer_counts = browser.answer_counts
+
+        for ip, host in hosts.items():
+            try:
+                if ipaddress.ip_address(ip) not in self._network:
+                    continue
+            except ValueError:
+                continue
+
+            mac = self._neighbours.lookup(ip)
+            if not mac:
+                continue
+
+            devices.append(NetworkDevice(
+                mac=mac,
+                ip=ip,
+                mdns_name=host.name,
+                mdns_services=host.services,
+                source="mdns"
+            ))
+
+        return devices
+
+    async def _scan_ssdp(self) -> List[NetworkDevice]:
+        """Descubrimiento de dispositivos via SSDP/UPnP."""
+        devices = []
+
+        try:
+            responses = await SsdpDiscovery().search()
+        except OSError as e:
+            logger.debug(f"Error in SSDP scan: {e}")
+            return devices
+
+        # Una entrada por IP; varias USN suelen compartir LOCATION
+        by_ip: Dict[str, List[SsdpResponse]] = {}
+        for response in responses:
+            try:
+                if ipaddress.ip_address(response.ip) not in self._network:
+                    continue
+            except ValueError:
+                continue
+            by_ip.setdefault(response.ip, []).append(response)
+
+        # LOCATION sólo se descarga de la IP que la anunció
+        locations = sorted({(r.location, ip) for ip, group in by_ip.items() for r in group if r.location})
+        descriptions = await asyncio.gather(*(self._ssdp_descriptions.fetch(loc, ip) for loc, ip in locations))
+        description_by_location = {
+            loc: description for (loc, _), description in zip(locations, descriptions) if description
+        }
+
+        for ip, group in by_ip.items():
+            mac = self._neighbours.lookup(ip)
+            if not mac:
+                continue
+
+            description = next(
+                (description_by_location[r.location] for r in group if description_by_location.get(r.location)),
+                {}
+            )
+            server = next((r.server for r in group if r.server), "")
+            model = f"{description.get('manufacturer', '')} {description.get('modelName', '')}".strip()
+            parts = [description.get('friendlyName', ''), model, server]
+            if not description:
+                parts.append(next((r.st for r in group if r.st), ""))
+
+            devices.append(NetworkDevice(
+                mac=mac,
+                ip=ip,
+                ssdp_info=' | '.join(p for p in parts if p)[:200],
+                source="ssdp"
+            ))
+
+        return devices
+
+    async def _scan_nmap(self) -> List[NetworkDevice]:
+        """Escaneo nmap con detección de OS (lento)."""
+        devices = []
+
+        # Escaneo rápido de puertos comunes + detección OS
+        stdout, stderr, code = await run_async(
+            f"sudo nmap -sn -O --osscan-limit {config.LOCAL_NETWORK} 2>/dev/null",
+            timeout=120
+        )
+
+        if code != 0:
+            # Fallback sin detección OS
             stdout, _, code = await run_async(
                 f"sudo nmap -sn {config.LOCAL_NETWORK} 2>/dev/null",
                 timeout=60
@@ -1620,26 +4295,51 @@ class NetworkService:
 
     async def scan_device_ports(self, ip: str) -> List[Tuple[int, str]]:
         """
-        Escanea puertos abiertos de un dispositivo.
+        Escanea puertos abiertos de un dispositivo (top 100 + huellas).
 
         Returns:
             Lista de (puerto, servicio)
         """
-        ports = []
-        stdout, _, code = await run_async(
-            f"sudo nmap -sT -F --open {ip} 2>/dev/null",
-            timeout=60
-        )
+        ports = sorted(set(COMMON_PORTS) | set(PORT_FINGERPRINTS))
+        found = (await self._port_scanner.scan([ip], ports))[ip]
 
-        if code != 0 or not stdout:
-            return ports
+        device = self.get_device_by_ip(ip) if ip in self._index.by_ip else None
+        if device:
+            device.open_ports = set(device.open_ports) | set(found)
+            self._index.update(device)
+            self._dirty.add(device.mac)
 
-        for line in stdout.split('\n'):
-            match = re.match(r'^(\d+)/tcp\s+open\s+(\S+)', line)
-            if match:
-                ports.append((int(match.group(1)), match.group(2)))
+        return [(port, port_service(port)) for port in sorted(found)]
+
+    async def scan_fingerprint_ports(self, devices: Optional[List[NetworkDevice]] = None) -> int:
+        """
+        Escanea los puertos de PORT_FINGERPRINTS en todos los dispositivos online.
 
-        return ports
+        Actualiza open_ports (que alimenta device_type) y devuelve cuántos
+        puertos abiertos se encontraron.
+        """
+        devices = [d for d in (devices or self.get_online_devices()) if d.ip]
+        if not devices:
+            return 0
+        found = await self._port_scanner.scan([d.ip for d in devices], sorted(PORT_FINGERPRINTS))
+        total = 0
+        for device in devices:
+            open_now = found.get(device.ip, {})
+            # Los puertos de huella que ya no responden se retiran
+            others = [p for p in device.open_ports if p not in PORT_FINGERPRINTS]
+            device.open_ports = set(others) | set(open_now)
+            self._index.update(device)
+            self._dirty.add(device.mac)
+            total += len(open_now)
+        return total
+
+    async def ping(self, target: str, count: int = 4, timeout: float = 2.0) -> PingResult:
+        """Ping con estadísticas min/avg/max/mdev y pérdida."""
+        return await self._pinger.ping(target, count=count, timeout=timeout)
+
+    async def ping_many(self, targets: List[str], count: int = 1, timeout: float = 2.0) -> Dict[str, PingResult]:
+        """Ping concurrente a varios destinos."""
+        return await self._pinger.ping_many(targets, count=count, timeout=timeout)
 
     async def check_connectivity(self) -> Dict[str, dict]:
         """Verifica conectividad."""
@@ -1651,140 +4351,118 @@ class NetworkService:
             ("Google", "google.com"),
         ]
 
-        async def ping_target(name: str, target: str) -> tuple:
-            stdout, _, code = await run_async(
-                f"ping -c 1 -W 2 {target} 2>/dev/null | grep -oP 'time=\\K[0-9.]+'",
-                timeout=5
-            )
-            if code == 0 and stdout:
-                return name, {"ok": True, "latency": f"{float(stdout):.1f}ms"}
-            return name, {"ok": False, "latency": None}
-
-        results = await asyncio.gather(
-            *[ping_target(name, target) for name, target in targets]
-        )
+        pings = await self.ping_many([target for _, target in targets], count=1, timeout=2.0)
 
-        return dict(results)
+        results = {}
+        for name, target in targets:
+            result = pings[target]
+            results[name] = {
+                "ok": result.ok,
+                "latency": f"{result.avg:.1f}ms" if result.ok else None,
+                "ping": result,
+            }
+        return results
 
-    async def traceroute(self, target: str) -> List[Dict[str, any]]:
+    async def traceroute_stream(self, target: str, max_hops: int = 15) -> AsyncIterator[TracerouteHop]:
         """
-        Ejecuta traceroute.
+        Traceroute incremental: genera cada salto en cuanto responde.
 
-        Returns:
-            Lista de dicts {'hop': int, 'ip': str, 'rtt': float|None}
+        Sin IP_RECVERR o con destino IPv6 usa `traceroute` y entrega los
+        saltos al terminar.
         """
+        try:
+            ip = await resolve_ipv4(target)
+        except (socket.gaierror, OSError):
+            return
+
+        if ip is not None:
+            yielded = False
+            try:
+                async for hop in UdpTracer(max_hops=max_hops).trace(ip):
+                    yielded = True
+                    yield hop
+                return
+            except OSError as e:
+                if yielded:
+                    raise
+                logger.debug(f"Traceroute nativo no disponible: {e}")
+
         stdout, _, code = await run_async(
-            f"traceroute -n -m 15 -w 2 {target} 2>/dev/null",
+            f"traceroute -n -m {max_hops} -w 2 {target} 2>/dev/null",
             timeout=60
         )
+        if code == 0 and stdout:
+            for hop in parse_traceroute_output(stdout):
+                yield hop
 
-        hops = []
-        if code != 0 or not stdout:
-            return hops
-
-        for line in stdout.split('\n')[1:]:  # Skip header
-            line = line.strip()
-            if not line:
-                continue
-
-            parts = line.split()
-            if not parts:
-                continue
-
-            try:
-                hop_num = int(parts[0])
-            except ValueError:
-                continue
-
-            # Check for timeout (* * *)
-            if '*' in parts[1]:
-                hops.append({'hop': hop_num, 'ip': '*', 'rtt': None})
-            else:
-                ip = parts[1]
-                # Find RTT (first numeric value after IP)
-                rtt = None
-                for part in parts[2:]:
-                    try:
-                        rtt = float(part.replace('ms', ''))
-                        break
-                    except ValueError:
-                        continue
-                hops.append({'hop': hop_num, 'ip': ip, 'rtt': rtt})
+    async def traceroute(self, target: str) -> List[Dict[str, any]]:
+        """
+        Ejecuta traceroute.
 
-        return hops
+        Returns:
+            Lista de dicts {'hop': int, 'ip': str, 'rtt': float|None, 'flag': str}
+        """
+        hops = [hop async for hop in self.traceroute_stream(target)]
+        return [hop.as_dict() for hop in sorted(hops, key=lambda h: h.hop)]
 
-    async def dns_lookup(self, domain: str) -> Dict[str, List[str]]:
+    async def dns_lookup(self, domain: str) -> DnsLookupResult:
         """
-        Lookup DNS completo.
+        Lookup DNS completo (A, AAAA, MX, NS, CNAME y TXT en paralelo).
 
         Returns:
-            Dict con keys 'A', 'AAAA', 'MX', 'NS', 'CNAME', 'TXT'
+            DnsLookupResult con valores, TTL por tipo y servidor que respondió
         """
-        result = {}
-
-        # A record
-        stdout, _, _ = await run_async(f"dig +short A {domain} 2>/dev/null", timeout=10)
-        if stdout and not stdout.startswith(';'):
-            result["A"] = [ip for ip in stdout.split('\n') if ip and '.' in ip]
-
-        # AAAA record
-        stdout, _, _ = await run_async(f"dig +short AAAA {domain} 2>/dev/null", timeout=10)
-        if stdout and not stdout.startswith(';'):
-            result["AAAA"] = [ip for ip in stdout.split('\n') if ip and ':' in ip]
-
-        # MX record
-        stdout, _, _ = await run_async(f"dig +short MX {domain} 2>/dev/null", timeout=10)
-        if stdout and not stdout.startswith(';'):
-            result["MX"] = [mx.split()[-1].rstrip('.') for mx in stdout.split('\n') if mx]
-
-        # NS record
-        stdout, _, _ = await run_async(f"dig +short NS {domain} 2>/dev/null", timeout=10)
-        if stdout and not stdout.startswith(';'):
-            result["NS"] = [ns.rstrip('.') for ns in stdout.split('\n') if ns]
-
-        # CNAME record
-        stdout, _, _ = await run_async(f"dig +short CNAME {domain} 2>/dev/null", timeout=10)
-        if stdout and not stdout.startswith(';'):
-            result["CNAME"] = [cn.rstrip('.') for cn in stdout.split('\n') if cn]
-
-        # TXT record
-        stdout, _, _ = await run_async(f"dig +short TXT {domain} 2>/dev/null", timeout=10)
-        if stdout and not stdout.startswith(';'):
-            result["TXT"] = [txt.strip('"') for txt in stdout.split('\n') if txt]
-
-        return result
+        return await self._resolver.lookup(domain)
 
     async def check_port(self, host: str, port: int) -> Tuple[bool, float]:
         """
         Verifica si un puerto está abierto.
 
         Returns:
-            Tuple (is_open, latency_ms)
+            Tuple (is_open, latency_ms) con la latencia del connect TCP
         """
-        import time
-        start = time.time()
-        stdout, _, code = await run_async(
-            f"nc -zv -w 2 {host} {port} 2>&1",
-            timeout=5
-        )
-        latency = (time.time() - start) * 1000
-        return code == 0, latency
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except (socket.gaierror, OSError):
+            return False, 0.0
+        rtt = await self._port_scanner.probe(infos[0][4][0], port, timeout=2.0)
+        return rtt is not None, rtt or 0.0
 
     def get_device_by_ip(self, ip: str) -> Optional[NetworkDevice]:
         """Busca dispositivo por IP."""
-        for device in self._cache.values():
-            if device.ip == ip:
-                return device
-        return None
+        macs = self._index.by_ip.get(ip)
+        if macs:
+            # Varias con la misma IP (registros antiguos): la online o la más reciente
+            return max((self._cache[mac] for mac in macs), key=lambda d: (d.is_online, d.last_seen_ts))
+        try:
+            row = self._store.get_by_ip(ip)
+        except sqlite3.Error as e:
+            logger.error(f"Error leyendo historial: {e}")
+            return None
+        return self._device_from_row(row) if row else None
 
     def get_device_by_mac(self, mac: str) -> Optional[NetworkDevice]:
         """Busca dispositivo por MAC."""
         mac = NetworkDevice._format_mac(mac)
-        return self._cache.get(mac)
+        return self._lookup(mac)
+
+    def _query_history(self, query: Callable[[], List[tuple]]) -> List[NetworkDevice]:
+        """
+        Ejecuta una consulta del historial tras volcar cambios pendientes.
+
+        Los dispositivos fuera del cache se devuelven como objetos sueltos:
+        una consulta no debe llenar el cache con todo el historial.
+        """
+        self._save_history()
+        try:
+            return [self._cache.get(row[0]) or self._device_from_row(row) for row in query()]
+        except sqlite3.Error as e:
+            logger.error(f"Error leyendo historial: {e}")
+            return []
 
     def get_all_devices(self) -> List[NetworkDevice]:
         """Todos los dispositivos (online + offline)."""
-        return list(self._cache.values())
+        return self._query_history(self._store.all)
 
     def get_cached_devices(self) -> List[NetworkDevice]:
         """Dispositivos en cache (online)."""
@@ -1792,38 +4470,81 @@ class NetworkService:
 
     def get_online_devices(self) -> List[NetworkDevice]:
         """Solo dispositivos online."""
-        return [d for d in self._cache.values() if d.is_online]
+        return [self._cache[mac] for mac in self._index.online]
+
+    def get_offline_devices(self, limit: int = 10) -> List[NetworkDevice]:
+        """
+        Dispositivos vistos antes pero ahora offline, los más recientes primero.
+
+        Lee del historial solo las `limit` filas más recientes más tantas
+        como dispositivos online (que se descartan), no el historial entero.
+        """
+        online = self._index.online
+        devices = self._query_history(lambda: self._store.recent(limit + len(online)))
+        return [d for d in devices if d.mac not in online][:limit]
+
+    def count_offline_devices(self) -> int:
+        """Número de dispositivos del historial que no están online."""
+        self._save_history()
+        try:
+            return max(0, self._store.count() - len(self._index.online))
+        except sqlite3.Error as e:
+            logger.error(f"Error leyendo historial: {e}")
+            return 0
+
+    def search_devices(self, query: str, limit: int = 10, online_only: bool = False) -> List[NetworkDevice]:
+        """
+        Busca en el cache por subcadena de MAC, hostname o nombre mDNS.
 
-    def get_offline_devices(self) -> List[NetworkDevice]:
-        """Dispositivos vistos antes pero ahora offline."""
-        return [d for d in self._cache.values() if not d.is_online]
+        Returns:
+            Coincidencias (online primero, luego por última vez visto)
+        """
+        query = query.strip()
+        if re.fullmatch(r'[0-9A-Fa-f]{2}([:-]?[0-9A-Fa-f]{2}){5}', query):
+            device = self.get_device_by_mac(query)
+            if device and (device.is_online or not online_only):
+                return [device]
+        macs = self._index.search(query)
+        if online_only:
+            macs = [mac for mac in macs if mac in self._index.online]
+        devices = [self._cache[mac] for mac in macs]
+        devices.sort(key=lambda d: (not d.is_online, -d.last_seen_ts))
+        return devices[:limit]
 
     def get_new_devices(self, since_hours: int = 24) -> List[NetworkDevice]:
         """Dispositivos vistos por primera vez en las últimas N horas."""
-        cutoff = datetime.now() - timedelta(hours=since_hours)
-        return [d for d in self._cache.values() if d.first_seen > cutoff]
+        cutoff = (datetime.now() - timedelta(hours=since_hours)).timestamp()
+        return self._query_history(lambda: self._store.first_seen_since(cutoff))
 
     def get_statistics(self) -> Dict[str, any]:
         """Estadísticas de red."""
-        devices = list(self._cache.values())
-        online = [d for d in devices if d.is_online]
+        self._save_history()
+        try:
+            total_known = self._store.count()
+        except sqlite3.Error as e:
+            logger.error(f"Error leyendo historial: {e}")
+            total_known = len(self._cache)
+        online = self._index.online
 
-        # Contar por tipo
+        # Contar por tipo y fabricante desde los índices del cache
         by_type = {}
-        for d in online:
-            t = d.device_type
-            by_type[t] = by_type.get(t, 0) + 1
+        for t, macs in self._index.by_type.items():
+            count = len(macs & online)
+            if count:
+                by_type[t] = count
 
-        # Contar por fabricante
         by_vendor = {}
-        for d in online:
-            v = d.vendor or "Unknown"
-            by_vendor[v] = by_vendor.get(v, 0) + 1
+        for v, macs in self._index.by_vendor.items():
+            macs = macs & online
+            if macs:
+                # El índice guarda el fabricante en minúsculas: mostrar el original
+                name = self._cache[next(iter(macs))].vendor or "Unknown"
+                by_vendor[name] = by_vendor.get(name, 0) + len(macs)
 
         return {
-            "total_known": len(devices),
+            "total_known": total_known,
             "online": len(online),
-            "offline": len(devices) - len(online),
+            "offline": max(0, total_known - len(online)),
             "by_type": by_type,
             "by_vendor": by_vendor,
             "last_scan": self._last_scan.isoformat() if self._last_scan else None
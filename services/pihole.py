@@ -1,7 +1,13 @@
 """Servicio de interacción con Pi-hole API v6."""
+import asyncio
+import json
 import logging
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import httpx
 import requests
 from requests.exceptions import RequestException
 
@@ -35,12 +41,142 @@ class TopClient:
     count: int
 
 
+@dataclass
+class PiholeSession:
+    """Sesión de la API de Pi-hole (sid y caducidad)."""
+    sid: str = ""
+    expires: float = 0.0    # epoch
+    validity: int = 0       # segundos
+
+    @classmethod
+    def from_response(cls, data: dict) -> "PiholeSession":
+        session = data.get("session", {})
+        validity = int(session.get("validity") or 0)
+        return cls(sid=session.get("sid") or "", expires=time.time() + validity, validity=validity)
+
+    def is_valid(self, margin: float = 0.0) -> bool:
+        return bool(self.sid) and time.time() + margin < self.expires
+
+    @property
+    def refresh_margin(self) -> float:
+        """Antelación con la que se renueva antes de caducar."""
+        return max(5.0, min(60.0, self.validity * 0.1))
+
+
+@dataclass
+class PiholeDashboard:
+    """Datos del panel de Pi-hole obtenidos en paralelo."""
+    stats: Optional[PiholeStats] = None
+    top_blocked: List[TopDomain] = field(default_factory=list)
+    top_permitted: List[TopDomain] = field(default_factory=list)
+    top_clients: List[TopClient] = field(default_factory=list)
+
+
 class PiholeService:
-    """Servicio para interactuar con Pi-hole API v6."""
+    """
+    Servicio para interactuar con Pi-hole API v6.
+
+    Los métodos *_async usan un httpx.AsyncClient con pool keep-alive y
+    no bloquean el event loop; los síncronos se mantienen para scripts.
+    """
 
     def __init__(self):
-        self._session: Optional[str] = None
         self._api_base = config.PIHOLE_API
+        self._client: Optional[httpx.AsyncClient] = None
+        self._auth_lock = asyncio.Lock()
+        self._session_file = Path(config.DATA_DIR) / "pihole_session.json"
+        self._session = self._load_session()
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Cache de respuestas GET por endpoint
+        self._cache_ttl = config.PIHOLE_CACHE_TTL
+        self._cache: Dict[str, Tuple[float, dict]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._generation = 0    # sube en cada invalidación: descarta respuestas en vuelo
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    # ─── Parseo común ───
+
+    @staticmethod
+    def _parse_stats(data: dict) -> PiholeStats:
+        queries = data.get("queries", {})
+        gravity = data.get("gravity", {})
+
+        total = queries.get("total", 0)
+        blocked = queries.get("blocked", 0)
+
+        return PiholeStats(
+            total_queries=total,
+            blocked_queries=blocked,
+            percent_blocked=(blocked / total * 100) if total > 0 else 0,
+            domains_on_blocklist=gravity.get("domains_being_blocked", 0),
+            status="enabled" if data.get("status") != "disabled" else "disabled"
+        )
+
+    @staticmethod
+    def _parse_top_domains(data: dict) -> List[TopDomain]:
+        domains = data.get("domains", [])
+        return [
+            TopDomain(domain=d.get("domain", ""), count=d.get("count", 0))
+            for d in domains
+        ]
+
+    @staticmethod
+    def _parse_top_clients(data: dict) -> List[TopClient]:
+        clients = data.get("clients", [])
+        return [
+            TopClient(
+                ip=c.get("ip", ""),
+                name=c.get("name", "") or c.get("ip", ""),
+                count=c.get("count", 0)
+            )
+            for c in clients
+        ]
+
+    @staticmethod
+    def _status_from_stats(stats: Optional[PiholeStats]) -> Dict[str, any]:
+        if not stats:
+            return {"online": False, "error": "No se pudo conectar"}
+
+        return {
+            "online": True,
+            "blocking": stats.status == "enabled",
+            "queries_today": stats.total_queries,
+            "blocked_today": stats.blocked_queries,
+            "percent_blocked": stats.percent_blocked,
+            "domains_blocked": stats.domains_on_blocklist
+        }
+
+    # ─── Sesión ───
+
+    def _load_session(self) -> PiholeSession:
+        """Recupera la sesión guardada si sigue vigente."""
+        try:
+            with open(self._session_file) as f:
+                session = PiholeSession(**json.load(f))
+            if session.is_valid(margin=session.refresh_margin):
+                return session
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error cargando sesión de Pi-hole: {e}")
+        return PiholeSession()
+
+    def _set_session(self, session: PiholeSession):
+        """Guarda la sesión en memoria y en disco (modo 600)."""
+        self._session = session
+        if not session.sid:
+            self._session_file.unlink(missing_ok=True)
+            return
+        try:
+            config.ensure_data_dir()
+            tmp_path = self._session_file.with_suffix(".tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(asdict(session), f)
+            os.replace(tmp_path, self._session_file)
+        except OSError as e:
+            logger.error(f"Error guardando sesión de Pi-hole: {e}")
 
     def _authenticate(self) -> bool:
         """Autenticarse con la API."""
@@ -51,18 +187,17 @@ class PiholeService:
                 timeout=5
             )
             if response.status_code == 200:
-                data = response.json()
-                self._session = data.get("session", {}).get("sid", "")
-                return bool(self._session)
+                self._set_session(PiholeSession.from_response(response.json()))
+                return bool(self._session.sid)
         except RequestException as e:
             logger.error(f"Error autenticando con Pi-hole: {e}")
         return False
 
     def _get_headers(self) -> Dict[str, str]:
         """Devuelve headers con sesión."""
-        if not self._session:
+        if not self._session.is_valid():
             self._authenticate()
-        return {"sid": self._session} if self._session else {}
+        return {"sid": self._session.sid} if self._session.sid else {}
 
     def _api_get(self, endpoint: str) -> Optional[dict]:
         """GET request a la API."""
@@ -93,60 +228,28 @@ class PiholeService:
         data = self._api_get("stats/summary")
         if not data:
             return None
-
-        queries = data.get("queries", {})
-        gravity = data.get("gravity", {})
-
-        total = queries.get("total", 0)
-        blocked = queries.get("blocked", 0)
-
-        return PiholeStats(
-            total_queries=total,
-            blocked_queries=blocked,
-            percent_blocked=(blocked / total * 100) if total > 0 else 0,
-            domains_on_blocklist=gravity.get("domains_being_blocked", 0),
-            status="enabled" if data.get("status") != "disabled" else "disabled"
-        )
+        return self._parse_stats(data)
 
     def get_top_blocked(self, count: int = 5) -> List[TopDomain]:
         """Obtener top dominios bloqueados."""
         data = self._api_get(f"stats/top_domains?blocked=true&count={count}")
         if not data:
             return []
-
-        domains = data.get("domains", [])
-        return [
-            TopDomain(domain=d.get("domain", ""), count=d.get("count", 0))
-            for d in domains
-        ]
+        return self._parse_top_domains(data)
 
     def get_top_permitted(self, count: int = 5) -> List[TopDomain]:
         """Obtener top dominios permitidos."""
         data = self._api_get(f"stats/top_domains?blocked=false&count={count}")
         if not data:
             return []
-
-        domains = data.get("domains", [])
-        return [
-            TopDomain(domain=d.get("domain", ""), count=d.get("count", 0))
-            for d in domains
-        ]
+        return self._parse_top_domains(data)
 
     def get_top_clients(self, count: int = 5) -> List[TopClient]:
         """Obtener top clientes."""
         data = self._api_get(f"stats/top_clients?count={count}")
         if not data:
             return []
-
-        clients = data.get("clients", [])
-        return [
-            TopClient(
-                ip=c.get("ip", ""),
-                name=c.get("name", "") or c.get("ip", ""),
-                count=c.get("count", 0)
-            )
-            for c in clients
-        ]
+        return self._parse_top_clients(data)
 
     def disable(self, seconds: int = 300) -> bool:
         """Deshabilitar Pi-hole por N segundos."""
@@ -206,15 +309,241 @@ class PiholeService:
 
     def get_status(self) -> Dict[str, any]:
         """Obtener estado general de Pi-hole."""
-        stats = self.get_stats()
-        if not stats:
-            return {"online": False, "error": "No se pudo conectar"}
+        return self._status_from_stats(self.get_stats())
+
+    # ─── Cliente asíncrono ───
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self._api_base.rstrip('/') + '/',
+                timeout=httpx.Timeout(5.0, connect=3.0),
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+            )
+        return self._client
+
+    async def _login_async(self) -> bool:
+        """POST /auth con la contraseña. Llamar con _auth_lock tomado."""
+        try:
+            response = await self._get_client().post(
+                "auth", json={"password": config.PIHOLE_PASSWORD}
+            )
+        except httpx.HTTPError as e:
+            logger.error(f"Error autenticando con Pi-hole: {e}")
+            return False
+        if response.status_code != 200:
+            self._set_session(PiholeSession())
+            return False
+        self._set_session(PiholeSession.from_response(response.json()))
+        return bool(self._session.sid)
+
+    async def _authenticate_async(self, stale_sid: Optional[str] = None) -> bool:
+        """
+        Autenticarse con la API (una sola petición en vuelo).
+
+        Args:
+            stale_sid: Sesión rechazada; si otra tarea ya la renovó no se repite el login
+        """
+        async with self._auth_lock:
+            if self._session.is_valid() and self._session.sid != stale_sid:
+                return True
+            return await self._login_async()
+
+    async def _refresh_session_async(self) -> bool:
+        """Extiende la sesión actual (GET /auth) o, si ya no vale, hace login."""
+        async with self._auth_lock:
+            sid = self._session.sid
+            if sid:
+                try:
+                    response = await self._get_client().get("auth", headers={"sid": sid})
+                    if response.status_code == 200:
+                        info = response.json().get("session", {})
+                        if info.get("valid"):
+                            validity = int(info.get("validity") or self._session.validity)
+                            self._set_session(PiholeSession(
+                                sid=sid, expires=time.time() + validity, validity=validity
+                            ))
+                            return True
+                except httpx.HTTPError as e:
+                    logger.debug(f"Error renovando sesión de Pi-hole: {e}")
+            return await self._login_async()
+
+    async def _session_refresh_loop(self):
+        """Renueva la sesión poco antes de que caduque."""
+        while self._session.sid:
+            delay = self._session.expires - time.time() - self._session.refresh_margin
+            await asyncio.sleep(max(delay, 1.0))
+            if not await self._refresh_session_async():
+                logger.warning("No se pudo renovar la sesión de Pi-hole")
+                break
+
+    def _ensure_refresh_task(self):
+        if self._session.sid and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.get_running_loop().create_task(self._session_refresh_loop())
+
+    async def _request_async(self, method: str, endpoint: str, **kwargs) -> Optional[httpx.Response]:
+        """Petición autenticada; ante 401 re-autentica y reintenta una vez."""
+        if not self._session.is_valid():
+            await self._authenticate_async(stale_sid=self._session.sid or None)
+        self._ensure_refresh_task()
+
+        client = self._get_client()
+        for _ in range(2):
+            sid = self._session.sid
+            headers = {"sid": sid} if sid else {}
+            try:
+                response = await client.request(method, endpoint, headers=headers, **kwargs)
+            except httpx.HTTPError as e:
+                logger.error(f"Error en API Pi-hole ({endpoint}): {e}")
+                return None
+            if response.status_code != 401:
+                return response
+            if not await self._authenticate_async(stale_sid=sid):
+                return response
+        return response
+
+    async def _fetch_async(self, endpoint: str) -> Optional[dict]:
+        response = await self._request_async("GET", endpoint)
+        if response is not None and response.status_code == 200:
+            return response.json()
+        return None
+
+    async def _api_get_async(self, endpoint: str) -> Optional[dict]:
+        """
+        GET request a la API (asíncrono) con cache TTL.
 
+        Peticiones simultáneas al mismo endpoint comparten una sola
+        llamada HTTP. Los errores no se cachean.
+        """
+        cached = self._cache.get(endpoint)
+        if cached and time.monotonic() < cached[0]:
+            self.cache_hits += 1
+            return cached[1]
+
+        inflight = self._inflight.get(endpoint)
+        if inflight:
+            self.cache_hits += 1
+            return await asyncio.shield(inflight)
+
+        # La petición va en su propia tarea: cancelar a quien la lanzó
+        # no la cancela para los demás que la esperan
+        self.cache_misses += 1
+        task = asyncio.ensure_future(self._fetch_and_cache(endpoint, self._generation))
+        self._inflight[endpoint] = task
+        task.add_done_callback(lambda t: self._fetch_done(endpoint, t))
+        return await asyncio.shield(task)
+
+    def _fetch_done(self, endpoint: str, task: asyncio.Task):
+        if self._inflight.get(endpoint) is task:
+            del self._inflight[endpoint]
+        # Evitar "exception was never retrieved" si nadie quedó esperando
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch_and_cache(self, endpoint: str, generation: int) -> Optional[dict]:
+        data = await self._fetch_async(endpoint)
+        # Si se invalidó mientras tanto, la respuesta puede ser anterior al cambio
+        if data is not None and generation == self._generation:
+            self._cache[endpoint] = (time.monotonic() + self._cache_ttl, data)
+        return data
+
+    def invalidate_cache(self):
+        """
+        Descarta respuestas cacheadas y en vuelo (tras cambios de estado).
+
+        Quien ya esperaba una petición en vuelo recibe su resultado, pero no
+        se cachea ni la comparten las consultas posteriores.
+        """
+        self._generation += 1
+        self._cache.clear()
+        self._inflight.clear()
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Contadores del cache de respuestas."""
         return {
-            "online": True,
-            "blocking": stats.status == "enabled",
-            "queries_today": stats.total_queries,
-            "blocked_today": stats.blocked_queries,
-            "percent_blocked": stats.percent_blocked,
-            "domains_blocked": stats.domains_on_blocklist
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "entries": len(self._cache),
         }
+
+    async def get_dashboard_async(self, count: int = 5) -> PiholeDashboard:
+        """Resumen y tops en paralelo (compartiendo cache con los métodos sueltos)."""
+        stats, top_blocked, top_permitted, top_clients = await asyncio.gather(
+            self.get_stats_async(),
+            self.get_top_blocked_async(count),
+            self.get_top_permitted_async(count),
+            self.get_top_clients_async(count),
+        )
+        return PiholeDashboard(
+            stats=stats,
+            top_blocked=top_blocked,
+            top_permitted=top_permitted,
+            top_clients=top_clients,
+        )
+
+    async def get_stats_async(self) -> Optional[PiholeStats]:
+        """Obtener estadísticas generales."""
+        data = await self._api_get_async("stats/summary")
+        return self._parse_stats(data) if data else None
+
+    async def get_top_blocked_async(self, count: int = 5) -> List[TopDomain]:
+        """Obtener top dominios bloqueados."""
+        data = await self._api_get_async(f"stats/top_domains?blocked=true&count={count}")
+        return self._parse_top_domains(data) if data else []
+
+    async def get_top_permitted_async(self, count: int = 5) -> List[TopDomain]:
+        """Obtener top dominios permitidos."""
+        data = await self._api_get_async(f"stats/top_domains?blocked=false&count={count}")
+        return self._parse_top_domains(data) if data else []
+
+    async def get_top_clients_async(self, count: int = 5) -> List[TopClient]:
+        """Obtener top clientes."""
+        data = await self._api_get_async(f"stats/top_clients?count={count}")
+        return self._parse_top_clients(data) if data else []
+
+    async def disable_async(self, seconds: int = 300) -> bool:
+        """Deshabilitar Pi-hole por N segundos."""
+        response = await self._request_async(
+            "POST", "dns/blocking", json={"blocking": False, "timer": seconds}
+        )
+        self.invalidate_cache()
+        return response is not None and response.status_code == 200
+
+    async def enable_async(self) -> bool:
+        """Habilitar Pi-hole."""
+        response = await self._request_async("POST", "dns/blocking", json={"blocking": True})
+        self.invalidate_cache()
+        return response is not None and response.status_code == 200
+
+    async def block_domain_async(self, domain: str) -> bool:
+        """Añadir dominio a lista negra."""
+        response = await self._request_async("POST", "domains/deny/exact", json={"domain": domain})
+        self.invalidate_cache()
+        return response is not None and response.status_code in (200, 201)
+
+    async def allow_domain_async(self, domain: str) -> bool:
+        """Añadir dominio a lista blanca."""
+        response = await self._request_async("POST", "domains/allow/exact", json={"domain": domain})
+        self.invalidate_cache()
+        return response is not None and response.status_code in (200, 201)
+
+    async def get_status_async(self) -> Dict[str, any]:
+        """Obtener estado general de Pi-hole."""
+        return self._status_from_stats(await self.get_stats_async())
+
+    async def aclose(self):
+        """Cierra la sesión en Pi-hole (libera el slot) y el pool HTTP."""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+        if self._session.sid:
+            try:
+                await self._get_client().delete("auth", headers={"sid": self._session.sid})
+            except httpx.HTTPError as e:
+                logger.debug(f"Error cerrando sesión de Pi-hole: {e}")
+            self._set_session(PiholeSession())
+
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -1,15 +1,33 @@
 """Servicio de monitoreo del sistema."""
+import asyncio
 import logging
+import os
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, List, Optional
-import psutil
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+import httpx
 import requests
 
-from utils.shell import run_sync, run_async
-from utils.formatting import format_bytes, format_uptime
+from config import config
+from services.docker_engine import ContainerInfo, DockerEngine
+from services.metrics import MetricsStore
+from utils.shell import run_async
+from utils.formatting import format_bytes, format_uptime, sparkline
 
 logger = logging.getLogger(__name__)
 
+# Ventanas de la vista de historial
+HISTORY_WINDOWS = {
+    "1h": 3600,
+    "24h": 24 * 3600,
+    "30d": 30 * 24 * 3600,
+}
+
+# Valor registrado por estado de salud del contenedor
+CONTAINER_HEALTH_VALUE = {"healthy": 1.0, "running": 1.0, "unhealthy": 0.5}
+
 
 @dataclass
 class SystemStats:
@@ -24,14 +42,7 @@ class SystemStats:
     temperature: float
     uptime_seconds: int
     load_avg: tuple
-
-
-@dataclass
-class ContainerInfo:
-    """Información de contenedor Docker."""
-    name: str
-    status: str
-    health: str
+    timestamp: float = 0.0
 
 
 @dataclass
@@ -44,100 +55,180 @@ class PublicIPInfo:
     isp: str
 
 
-class SystemService:
-    """Servicio para monitoreo del sistema."""
+class SystemSampler:
+    """
+    Lee procfs/sysfs sin procesos auxiliares.
+
+    Los descriptores se abren una vez y se releen con os.pread desde el
+    offset 0; el % de CPU sale de la diferencia entre dos lecturas de
+    /proc/stat.
+    """
+
+    PATHS = {
+        'stat': '/proc/stat',
+        'meminfo': '/proc/meminfo',
+        'loadavg': '/proc/loadavg',
+        'uptime': '/proc/uptime',
+        'temp': '/sys/class/thermal/thermal_zone0/temp',
+    }
+
+    def __init__(self, disk_path: str = '/'):
+        self.disk_path = disk_path
+        self._fds: Dict[str, int] = {}
+        self._prev_cpu: Optional[Tuple[int, int]] = None
+
+    def _read(self, name: str) -> str:
+        fd = self._fds.get(name)
+        if fd is None:
+            fd = os.open(self.PATHS[name], os.O_RDONLY | os.O_CLOEXEC)
+            self._fds[name] = fd
+        return os.pread(fd, 8192, 0).decode()
+
+    def _cpu_percent(self) -> float:
+        # cpu user nice system idle iowait irq softirq steal ...
+        fields = [int(x) for x in self._read('stat').split('\n', 1)[0].split()[1:9]]
+        idle = fields[3] + fields[4]
+        total = sum(fields)
+        prev = self._prev_cpu
+        self._prev_cpu = (idle, total)
+        if prev is None or total == prev[1]:
+            return 0.0
+        return (1 - (idle - prev[0]) / (total - prev[1])) * 100
+
+    def _memory(self) -> Tuple[int, int, float]:
+        values = {}
+        for line in self._read('meminfo').split('\n'):
+            key, _, rest = line.partition(':')
+            if key in ('MemTotal', 'MemAvailable'):
+                values[key] = int(rest.split()[0]) * 1024
+                if len(values) == 2:
+                    break
+        total = values.get('MemTotal', 0)
+        used = total - values.get('MemAvailable', 0)
+        return used, total, (used / total * 100) if total else 0.0
+
+    def _disk(self) -> Tuple[int, int, float]:
+        st = os.statvfs(self.disk_path)
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        avail = st.f_bavail * st.f_frsize
+        total = st.f_blocks * st.f_frsize
+        return used, total, (used / (used + avail) * 100) if used + avail else 0.0
+
+    def _temperature(self) -> float:
+        try:
+            return int(self._read('temp')) / 1000.0
+        except (OSError, ValueError):
+            return 0.0
+
+    def sample(self) -> SystemStats:
+        """Toma una muestra completa."""
+        mem_used, mem_total, mem_percent = self._memory()
+        disk_used, disk_total, disk_percent = self._disk()
+        load = self._read('loadavg').split()
+        return SystemStats(
+            cpu_percent=self._cpu_percent(),
+            memory_used=mem_used,
+            memory_total=mem_total,
+            memory_percent=mem_percent,
+            disk_used=disk_used,
+            disk_total=disk_total,
+            disk_percent=disk_percent,
+            temperature=self._temperature(),
+            uptime_seconds=int(float(self._read('uptime').split()[0])),
+            load_avg=(float(load[0]), float(load[1]), float(load[2])),
+            timestamp=time.time()
+        )
 
-    def get_stats(self) -> Optional[SystemStats]:
-        """Obtener estadísticas del sistema."""
+    def close(self):
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+class SystemService:
+    """
+    Servicio para monitoreo del sistema.
+
+    Un muestreador en background guarda las últimas muestras en un buffer
+    circular; get_stats() devuelve la más reciente sin bloquear.
+    """
+
+    def __init__(self, docker: Optional[DockerEngine] = None):
+        self.docker = docker or DockerEngine()
+        self.docker.add_listener(self._on_containers)
+        self._sampler = SystemSampler()
+        self._interval = config.SYSTEM_SAMPLE_INTERVAL
+        self._samples: Deque[SystemStats] = deque(maxlen=config.SYSTEM_SAMPLE_HISTORY)
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = MetricsStore(Path(config.DATA_DIR) / "metrics.bin", raw_step=self._interval)
+
+    def _take_sample(self) -> Optional[SystemStats]:
         try:
-            # CPU
-            cpu_percent = psutil.cpu_percent(interval=0.5)
-
-            # Memoria
-            mem = psutil.virtual_memory()
-
-            # Disco
-            disk = psutil.disk_usage('/')
-
-            # Temperatura
-            temperature = self._get_temperature()
-
-            # Uptime
-            uptime = self._get_uptime()
-
-            # Load average
-            load_avg = psutil.getloadavg()
-
-            return SystemStats(
-                cpu_percent=cpu_percent,
-                memory_used=mem.used,
-                memory_total=mem.total,
-                memory_percent=mem.percent,
-                disk_used=disk.used,
-                disk_total=disk.total,
-                disk_percent=disk.percent,
-                temperature=temperature,
-                uptime_seconds=uptime,
-                load_avg=load_avg
-            )
+            stats = self._sampler.sample()
         except Exception as e:
             logger.error(f"Error obteniendo stats del sistema: {e}")
             return None
+        self._samples.append(stats)
+        return stats
+
+    def _on_containers(self, containers: List[ContainerInfo]):
+        """Eventos de Docker: el estado de contenedores pasa a las métricas."""
+        self.metrics.set_container_states({
+            c.name: CONTAINER_HEALTH_VALUE.get(c.health, 0.0) for c in containers
+        })
+
+    async def _sample_loop(self):
+        while True:
+            # start() ya tomó la línea base de CPU
+            await asyncio.sleep(self._interval)
+            stats = self._take_sample()
+            if stats:
+                self.metrics.record({
+                    'cpu': stats.cpu_percent,
+                    'mem': stats.memory_percent,
+                    'temp': stats.temperature,
+                    'load': stats.load_avg[0],
+                }, ts=stats.timestamp)
+
+    async def start(self):
+        """Inicia el muestreo periódico."""
+        if self._task is None:
+            self._take_sample()  # Línea base de CPU
+            self._task = asyncio.create_task(self._sample_loop())
+
+    async def stop(self):
+        """Detiene el muestreo."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._sampler.close()
+        self.metrics.close()
 
-    def _get_temperature(self) -> float:
-        """Obtener temperatura del CPU."""
-        try:
-            stdout, _, code = run_sync("cat /sys/class/thermal/thermal_zone0/temp")
-            if code == 0 and stdout:
-                return int(stdout) / 1000.0
-        except:
-            pass
-        return 0.0
-
-    def _get_uptime(self) -> int:
-        """Obtener uptime en segundos."""
-        try:
-            stdout, _, code = run_sync("cat /proc/uptime")
-            if code == 0 and stdout:
-                return int(float(stdout.split()[0]))
-        except:
-            pass
-        return 0
+    def get_stats(self) -> Optional[SystemStats]:
+        """Obtener estadísticas del sistema (última muestra)."""
+        if self._samples:
+            return self._samples[-1]
+        return self._take_sample()
+
+    def get_history(self) -> List[SystemStats]:
+        """Muestras recientes del buffer circular, de más antigua a más nueva."""
+        return list(self._samples)
 
     def get_containers(self) -> List[ContainerInfo]:
+        """Contenedores Docker según el cache mantenido por eventos (sin E/S)."""
+        return self.docker.cached()
+
+    async def get_containers_async(self) -> List[ContainerInfo]:
         """Obtener lista de contenedores Docker."""
-        containers = []
         try:
-            stdout, _, code = run_sync(
-                "docker ps -a --format '{{.Names}}|{{.Status}}' 2>/dev/null"
-            )
-            if code == 0 and stdout:
-                for line in stdout.split('\n'):
-                    if '|' in line:
-                        parts = line.split('|')
-                        name = parts[0]
-                        status = parts[1] if len(parts) > 1 else "unknown"
-
-                        # Determinar salud
-                        health = "unknown"
-                        if "(healthy)" in status:
-                            health = "healthy"
-                        elif "(unhealthy)" in status:
-                            health = "unhealthy"
-                        elif "Up" in status:
-                            health = "running"
-                        elif "Exited" in status:
-                            health = "stopped"
-
-                        containers.append(ContainerInfo(
-                            name=name,
-                            status=status,
-                            health=health
-                        ))
-        except Exception as e:
+            return await self.docker.containers()
+        except httpx.HTTPError as e:
             logger.error(f"Error obteniendo contenedores: {e}")
-
-        return containers
+            return []
 
     def get_public_ip(self) -> Optional[PublicIPInfo]:
         """Obtener información de IP pública."""
@@ -200,3 +291,37 @@ class SystemService:
 💿 *Disco:* {disk_gb}GB / {disk_total_gb}GB ({stats.disk_percent:.1f}%)
 ⏱️ *Uptime:* {format_uptime(stats.uptime_seconds)}
 📊 *Load:* {stats.load_avg[0]:.2f}, {stats.load_avg[1]:.2f}, {stats.load_avg[2]:.2f}"""
+
+    def format_history_message(self, window: str) -> str:
+        """Formatea el historial de métricas de una ventana (1h, 24h, 30d)."""
+        seconds = HISTORY_WINDOWS[window]
+        rows = [
+            ("💻", "CPU", "cpu", "%", 0.0, 100.0),
+            ("🌡️", "Temp", "temp", "°C", None, None),
+            ("💾", "RAM", "mem", "%", 0.0, 100.0),
+            ("📊", "Load", "load", "", 0.0, None),
+        ]
+
+        lines = [f"📈 *Historial · {window}*", ""]
+        for icon, label, metric, unit, low, high in rows:
+            summary = self.metrics.summary(metric, seconds)
+            if not summary:
+                lines.append(f"{icon} *{label}:* _sin datos_")
+                continue
+            chart = sparkline(self.metrics.series(metric, seconds), low, high)
+            lines.append(
+                f"{icon} *{label}:* avg {summary.avg:.1f}{unit} · "
+                f"p95 {summary.p95:.1f}{unit} · max {summary.max:.1f}{unit}"
+            )
+            lines.append(f"`{chart}`")
+
+        containers = []
+        for name in self.metrics.container_names:
+            summary = self.metrics.summary(name, seconds)
+            if summary:
+                containers.append(f"🐳 {name}: {summary.avg * 100:.0f}% disponible")
+        if containers:
+            lines.append("")
+            lines.extend(containers)
+
+        return "\n".join(lines)
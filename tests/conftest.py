@@ -0,0 +1,11 @@
+"""Entorno mínimo para importar config y los servicios en los tests."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test-token")
+os.environ.setdefault("AUTHORIZED_USERS", "1")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="pibot-tests-"))
@@ -0,0 +1,103 @@
+"""ArpSweeper contra un segmento L2 en memoria (FakeL2Transport)."""
+import asyncio
+
+from services.network import ArpSweeper, FakeL2Transport, build_arp_reply, parse_arp_frame
+
+NETWORK = "192.168.1.0/24"
+
+
+def hosts(count: int, start: int = 10) -> dict:
+    return {f"192.168.1.{start + i}": f"AA:BB:CC:00:00:{i:02X}" for i in range(count)}
+
+
+class DropFirstTransport(FakeL2Transport):
+    """Ignora la primera petición a ciertas IPs (pérdida determinista)."""
+
+    def __init__(self, hosts: dict, drop: set, **kwargs):
+        super().__init__(hosts, **kwargs)
+        self.drop = set(drop)
+        self.requests: dict = {}
+
+    def send(self, frame: bytes) -> None:
+        target = parse_arp_frame(frame)[3]
+        self.requests[target] = self.requests.get(target, 0) + 1
+        if target in self.drop and self.requests[target] == 1:
+            self.frames_sent += 1
+            return
+        super().send(frame)
+
+
+class LateFirstReplyTransport(FakeL2Transport):
+    """Responde al primer intento con mucho retraso y a los siguientes al momento."""
+
+    def __init__(self, hosts: dict, slow: set, slow_latency: float, **kwargs):
+        super().__init__(hosts, **kwargs)
+        self.slow = set(slow)
+        self.slow_latency = slow_latency
+
+    def send(self, frame: bytes) -> None:
+        _, sender_ip, _, target_ip = parse_arp_frame(frame)
+        if target_ip in self.slow:
+            self.frames_sent += 1
+            self.slow.discard(target_ip)
+            reply = build_arp_reply(self.hosts[target_ip], target_ip, self.mac, sender_ip)
+            self._loop.call_later(self.slow_latency, self._on_frame, reply)
+            return
+        super().send(frame)
+
+
+def test_sweeps_a_24():
+    found = hosts(40)
+    transport = FakeL2Transport(found, latency=0.002)
+    sweeper = ArpSweeper(transport, NETWORK, rate=5000, retries=2, timeout=0.5)
+
+    devices = asyncio.run(sweeper.sweep())
+
+    assert {(d.ip, d.mac) for d in devices} == set(found.items())
+    assert all(d.source == "arp" for d in devices)
+    stats = sweeper.last_stats
+    # 254 hosts menos la IP propia; las 213 IPs vacías se reintentan en cada ronda
+    assert stats['targets'] == 253
+    assert stats['rounds'] == 3
+    assert stats['sent'] == transport.frames_sent == 253 + 2 * 213
+    assert stats['replies'] == 40
+    assert 0.002 <= stats['rtt'] < 0.1
+
+
+def test_retries_only_hosts_that_did_not_answer():
+    found = hosts(30)
+    dropped = set(list(found)[:5])
+    transport = DropFirstTransport(found, drop=dropped, latency=0.002)
+    sweeper = ArpSweeper(transport, NETWORK, rate=5000, retries=1, timeout=0.5)
+
+    devices = asyncio.run(sweeper.sweep())
+
+    assert {d.ip for d in devices} == set(found)
+    assert all(transport.requests[ip] == 1 for ip in found if ip not in dropped)
+    assert all(transport.requests[ip] == 2 for ip in dropped)
+    stats = sweeper.last_stats
+    assert stats['rounds'] == 2
+    assert stats['sent'] == 253 + (253 - 25)
+
+
+def test_reply_window_follows_observed_rtt():
+    transport = FakeL2Transport(hosts(20), latency=0.005)
+    sweeper = ArpSweeper(transport, NETWORK, rate=5000, retries=2, timeout=2.0)
+
+    asyncio.run(sweeper.sweep())
+
+    # Sin adaptar esperaría 3 x timeout = 6 s; con RTT ~5 ms la ventana baja a 50 ms
+    assert sweeper.last_stats['elapsed'] < 1.5
+
+
+def test_late_reply_after_retry_gives_no_rtt_sample():
+    found = hosts(10)
+    slow = {"192.168.1.10"}
+    transport = LateFirstReplyTransport(found, slow=slow, slow_latency=0.5, latency=0.03)
+    sweeper = ArpSweeper(transport, NETWORK, rate=5000, retries=3, timeout=0.5)
+
+    devices = asyncio.run(sweeper.sweep())
+
+    assert "192.168.1.10" in {d.ip for d in devices}
+    # Medida desde el primer envío daría ~ventana + RTT (> 0.1 s): no debe contar
+    assert 0.03 <= sweeper.last_stats['rtt'] < 0.06
@@ -0,0 +1,309 @@
+"""
+DeviceClassifier frente a la implementación anterior (patrones uno a uno).
+
+Ejecutado como script mide ambas sobre 10k dispositivos sintéticos:
+
+    python tests/test_device_classifier.py
+"""
+import random
+import re
+import time
+
+if __name__ == "__main__":
+    import conftest  # noqa: F401  (entorno y sys.path como en pytest)
+
+from services.network import (
+    DEVICE_CLASSIFIER, HOSTNAME_PATTERNS, OUI_DATABASE, PORT_FINGERPRINTS,
+    VENDOR_DEVICE_HINTS, NetworkDevice,
+)
+
+SYNTHETIC_DEVICES = 10_000
+
+
+# ─── Referencia: clasificador previo, tal cual ───
+
+def legacy_hostname(device):
+    hostname = device.hostname or device.mdns_name or ""
+    for pattern, (name, dev_type) in HOSTNAME_PATTERNS.items():
+        if re.match(pattern, hostname):
+            return name, dev_type
+    return None, None
+
+
+def legacy_ports(device):
+    if not device.open_ports:
+        return None
+    priority_ports = [62078, 9100, 515, 631, 32400, 8008, 8009, 548, 3283, 554]
+    for port in priority_ports:
+        if port in device.open_ports:
+            for name, dev_type in PORT_FINGERPRINTS.get(port, []):
+                if dev_type:
+                    return dev_type
+    return None
+
+
+def legacy_mdns(device):
+    services = ' '.join(device.mdns_services).lower()
+    if '_airplay' in services or '_raop' in services:
+        return 'Apple'
+    if '_googlecast' in services:
+        return 'SmartTV'
+    if '_ipp' in services or '_printer' in services:
+        return 'Printer'
+    if '_homekit' in services:
+        return 'IoT'
+    if '_spotify' in services:
+        return 'SmartSpeaker'
+    if '_hap' in services:
+        return 'IoT'
+    if '_smb' in services or '_afpovertcp' in services:
+        return 'NAS'
+    return None
+
+
+def legacy_vendor(device):
+    if not device.vendor:
+        return None
+    vendor_lower = device.vendor.lower()
+    for vendor_key, hint in VENDOR_DEVICE_HINTS.items():
+        if vendor_key.lower() in vendor_lower:
+            return hint
+    return None
+
+
+def legacy_type(device):
+    if device.detected_type:
+        return device.detected_type
+    name, dtype = legacy_hostname(device)
+    if dtype:
+        return dtype
+    mdns_type = legacy_mdns(device)
+    if mdns_type:
+        return mdns_type
+    port_type = legacy_ports(device)
+    if port_type:
+        return port_type
+    if device.ssdp_info:
+        ssdp = device.ssdp_info.lower()
+        if 'tv' in ssdp or 'mediarenderer' in ssdp:
+            return 'SmartTV'
+        if 'printer' in ssdp:
+            return 'Printer'
+        if 'nas' in ssdp or 'storage' in ssdp:
+            return 'NAS'
+    vendor_type = legacy_vendor(device)
+    if vendor_type:
+        return vendor_type
+
+    text = f"{device.vendor} {device.hostname} {device.os_guess} {device.mdns_name}".lower()
+    if any(x in text for x in ['iphone', 'ipad']):
+        return "iOS"
+    if 'apple' in text and 'tv' not in text:
+        return "Apple"
+    if any(x in text for x in ['android', 'samsung', 'xiaomi', 'huawei', 'galaxy', 'pixel']):
+        return "Android"
+    if any(x in text for x in ['windows', 'microsoft', 'desktop-', 'laptop-']):
+        return "Windows"
+    if any(x in text for x in ['linux', 'ubuntu', 'debian', 'raspberry', 'pi']):
+        return "Linux"
+    if any(x in text for x in ['tv', 'roku', 'chromecast', 'fire', 'shield', 'webos', 'tizen']):
+        return "SmartTV"
+    if any(x in text for x in ['alexa', 'echo', 'homepod', 'google home', 'nest mini', 'sonos']):
+        return "SmartSpeaker"
+    if any(x in text for x in ['esp', 'tasmota', 'tuya', 'shelly', 'sonoff', 'smart']):
+        return "IoT"
+    if any(x in text for x in ['router', 'gateway', 'vodafone', 'modem']):
+        return "Router"
+    if any(x in text for x in ['printer', 'print', 'hp ', 'epson', 'canon', 'brother']):
+        return "Printer"
+    if any(x in text for x in ['camera', 'cam', 'ring', 'nest cam', 'hikvision', 'reolink']):
+        return "Camera"
+    if any(x in text for x in ['playstation', 'ps4', 'ps5', 'xbox', 'nintendo', 'switch']):
+        return "Gaming"
+    if any(x in text for x in ['synology', 'qnap', 'nas', 'diskstation']):
+        return "NAS"
+    return "Unknown"
+
+
+def legacy_classify(device):
+    """(device_name, device_type) como los calculaba la versión anterior."""
+    dtype = legacy_type(device)
+    name, _ = legacy_hostname(device)
+    return name or dtype, dtype
+
+
+# ─── Dispositivos sintéticos ───
+
+CHAR_CLASS = re.compile(r'\[([^\]]+)\](\+?)')
+WORDS = ['salon', 'cocina', 'judariva', 'office', 'tv', 'printer', 'cam', 'nas', 'host',
+         'mini', 'pro', 'apple', 'fire', 'smart', 'node', 'pi', 'box', 'x']
+MDNS_SERVICES = ['_airplay._tcp', '_raop._tcp', '_googlecast._tcp', '_ipp._tcp', '_printer._tcp',
+                 '_homekit._tcp', '_spotify-connect._tcp', '_hap._tcp', '_smb._tcp',
+                 '_afpovertcp._tcp', '_http._tcp', '_ssh._tcp', '_device-info._tcp']
+SSDP_INFO = ['', '', '', 'urn:schemas-upnp-org:device:MediaRenderer:1', 'Samsung TV',
+             'HP LaserJet printer', 'Synology storage', 'InternetGatewayDevice', 'Sonos ZP']
+OS_GUESSES = ['', '', 'Linux 5.x', 'Windows 10', 'Apple iOS', 'Android 13', 'embedded']
+VENDOR_DECOR = ['{}', '{}', '{}, Inc.', '{} Technologies Co.,Ltd', 'Shenzhen {} Corp', '{} GmbH']
+DETECTED_TYPES = ['Router', 'NAS', 'Server']
+
+
+def _expand_class(spec: str) -> str:
+    chars = []
+    i = 0
+    while i < len(spec):
+        if i + 2 < len(spec) and spec[i + 1] == '-':
+            chars.extend(chr(c) for c in range(ord(spec[i]), ord(spec[i + 2]) + 1))
+            i += 3
+        else:
+            chars.append(spec[i])
+            i += 1
+    return ''.join(chars)
+
+
+def hostname_samples(rng: random.Random):
+    """Un hostname por alternativa de cada patrón (cubre todos los casos)."""
+    samples = []
+    for pattern in HOSTNAME_PATTERNS:
+        for alt in pattern.removeprefix('(?i)').split('|'):
+            text = alt.replace(r'\[', '\x00').replace(r'\]', '\x01')
+            text = CHAR_CLASS.sub(
+                lambda m: ''.join(rng.choice(_expand_class(m.group(1)))
+                                  for _ in range(rng.randint(1, 6) if m.group(2) else 1)),
+                text,
+            )
+            text = re.sub(r'(.)\?', lambda m: m.group(1) if rng.random() < 0.5 else '', text)
+            text = text.replace('\x00', '[').replace('\x01', ']')
+            if text.startswith('^'):
+                text = text[1:]
+            if text.endswith('$'):
+                # re.match ancla al inicio: '-core$' solo encaja con el hostname completo
+                text = text[:-1]
+            samples.append(text)
+    return samples
+
+
+def synthetic_devices(count: int = SYNTHETIC_DEVICES, seed: int = 20):
+    rng = random.Random(seed)
+    stems = hostname_samples(rng)
+    ouis = list(OUI_DATABASE)
+    vendors = list(VENDOR_DEVICE_HINTS) + list(OUI_DATABASE.values()) + ['Unknown Corp', 'Foxconn']
+    ports = list(PORT_FINGERPRINTS) + [21, 53, 8123]
+    devices = []
+
+    for i in range(count):
+        stem = rng.choice(stems + WORDS)
+        hostname = rng.choice([
+            stem, stem.upper(), stem.capitalize(), f"{stem}-{rng.choice(WORDS)}",
+            f"{rng.choice(WORDS)}-{stem}", f"{stem}{rng.randint(1, 99)}", '', '*',
+        ])
+        mdns_name = rng.choice(['', '', f"{rng.choice(stems)}.local", f"{rng.choice(WORDS)}.local"])
+        vendor = rng.choice(VENDOR_DECOR).format(rng.choice(vendors)) if rng.random() < 0.8 else ''
+        mac = rng.choice(ouis) + ''.join(f":{rng.randrange(256):02X}" for _ in range(3))
+
+        devices.append(NetworkDevice(
+            mac=mac,
+            ip=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+            hostname=hostname,
+            vendor=vendor or 'Unknown',
+            os_guess=rng.choice(OS_GUESSES),
+            open_ports=rng.sample(ports, rng.choice([0, 0, 1, 2, 4])),
+            mdns_name=mdns_name,
+            mdns_services=rng.sample(MDNS_SERVICES, rng.choice([0, 0, 0, 1, 2])),
+            ssdp_info=rng.choice(SSDP_INFO),
+            detected_type=rng.choice(DETECTED_TYPES) if rng.random() < 0.03 else '',
+        ))
+    return devices
+
+
+# ─── Tests ───
+
+def test_every_hostname_pattern_has_a_sample():
+    rng = random.Random(1)
+    for sample in hostname_samples(rng):
+        assert DEVICE_CLASSIFIER.match_hostname(sample)[1], sample
+        assert DEVICE_CLASSIFIER.match_hostname(sample) == legacy_hostname(
+            NetworkDevice(mac="02:00:00:00:00:01", ip="10.0.0.1", hostname=sample, vendor="x"))
+
+
+def test_matches_previous_hostname_pattern_order():
+    # Gana el primer patrón de la tabla aunque otro posterior también encaje
+    for hostname in ('pihole', 'PI-HOLE', 'judariva-core', 'iphone-core', 'hp-deskjet',
+                     'nest-mini', 'nestcam', 'ring-doorbell', 'switch-salon', 'ps5', 'esp32-ab'):
+        device = NetworkDevice(mac="02:00:00:00:00:01", ip="10.0.0.1", hostname=hostname, vendor="x")
+        assert DEVICE_CLASSIFIER.match_hostname(hostname) == legacy_hostname(device), hostname
+
+
+def test_vendor_trie_keeps_table_order():
+    # 'HP Inc' contiene 'HP' (antes en la tabla): el anterior devolvía Printer
+    for vendor in ('HP Inc', 'Hewlett Packard', 'Google Nest', 'Amazon Ring', 'Samsung Electronics',
+                   'Raspberry Pi Trading', 'Shenzhen Tuya', 'nothing here'):
+        device = NetworkDevice(mac="02:00:00:00:00:01", ip="10.0.0.1", vendor=vendor)
+        assert DEVICE_CLASSIFIER.match_vendor(vendor) == legacy_vendor(device), vendor
+
+
+def test_same_result_as_previous_classifier_on_synthetic_devices():
+    devices = synthetic_devices()
+    mismatches = [
+        (d, legacy_classify(d), (d.device_name, d.device_type))
+        for d in devices
+        if legacy_classify(d) != (d.device_name, d.device_type)
+    ]
+    assert not mismatches, mismatches[:5]
+    # La muestra no es trivial: aparecen casi todos los tipos
+    assert len({d.device_type for d in devices}) >= 20
+
+
+def test_memo_follows_input_changes():
+    device = NetworkDevice(mac="02:00:00:00:00:01", ip="10.0.0.1", hostname="host", vendor="x")
+    assert device.device_type == "Unknown"
+
+    device.hostname = "iphone-de-ana"
+    assert (device.device_name, device.device_type) == ("iPhone", "iOS")
+
+    device.hostname = "host"
+    device.open_ports = [9100]
+    assert device.device_type == "Printer"
+
+    device.detected_type = "NAS"
+    assert device.device_type == "NAS"
+
+
+# ─── Benchmark ───
+
+def benchmark(count: int = SYNTHETIC_DEVICES, passes: int = 5):
+    devices = synthetic_devices(count)
+
+    start = time.perf_counter()
+    for d in devices:
+        legacy_classify(d)
+    legacy_cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for d in devices:
+        DEVICE_CLASSIFIER.classify(d)
+    new_cold = time.perf_counter() - start
+
+    # Lecturas repetidas de tipo/icono/nombre como en los listados del bot
+    start = time.perf_counter()
+    for _ in range(passes):
+        for d in devices:
+            legacy_type(d), legacy_type(d), legacy_classify(d)
+    legacy_reads = time.perf_counter() - start
+
+    for d in devices:
+        d.invalidate_classification()
+    start = time.perf_counter()
+    for _ in range(passes):
+        for d in devices:
+            d.device_type, d.icon, d.device_name
+    new_reads = time.perf_counter() - start
+
+    print(f"{count} dispositivos sintéticos")
+    print(f"  clasificación en frío: anterior {legacy_cold:.3f}s, nuevo {new_cold:.3f}s "
+          f"({legacy_cold / new_cold:.1f}x)")
+    print(f"  {passes} pasadas tipo/icono/nombre: anterior {legacy_reads:.3f}s, nuevo {new_reads:.3f}s "
+          f"({legacy_reads / new_reads:.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,101 @@
+"""Identidad de MACs aleatorias y desalojo del cache de dispositivos."""
+import dataclasses
+
+import pytest
+
+import services.network as network
+from services.network import DeviceHistoryStore, DeviceIdentityResolver, NetworkDevice, NetworkService
+
+OLD = "02:11:22:33:44:01"    # MACs localmente administradas (rotadas)
+NEW = "06:11:22:33:44:02"
+NEWER = "0A:11:22:33:44:03"
+OTHER = "0E:11:22:33:44:04"
+
+
+def rotated(mac: str, ip: str = "192.168.1.50", **kwargs) -> NetworkDevice:
+    return NetworkDevice(mac=mac, ip=ip, vendor="x", **kwargs)
+
+
+def test_alias_moves_previous_aliases_to_new_canonical():
+    resolver = DeviceIdentityResolver()
+    resolver.learn(rotated(OLD, hostname="pixel-de-ana"))
+
+    assert resolver.resolve(rotated(NEW, hostname="pixel-de-ana")) == OLD
+    assert resolver.alias(NEW, OLD) == [NEW]
+    # OLD se absorbe después en otra identidad: su alias la acompaña
+    assert resolver.alias(OLD, OTHER) == [NEW, OLD]
+    assert resolver.aliases == {NEW: OTHER, OLD: OTHER}
+    assert resolver.canonical(NEW) == OTHER
+
+
+def test_forget_drops_signals_ips_and_aliases():
+    resolver = DeviceIdentityResolver()
+    resolver.learn(rotated(OLD, hostname="pixel-de-ana", client_id="01:aa"))
+    resolver.learn(rotated(OTHER, ip="192.168.1.60", hostname="tablet-salon"))
+    resolver.alias(NEW, OLD)
+    resolver.alias(NEWER, OTHER)
+
+    resolver.forget(OLD)
+
+    assert resolver.aliases == {NEWER: OTHER}
+    assert resolver.resolve(rotated("12:00:00:00:00:01", hostname="pixel-de-ana")) is None
+    assert resolver.resolve(rotated("16:00:00:00:00:01", ip="192.168.1.50")) is None
+    # La otra identidad sigue intacta
+    assert resolver.resolve(rotated("1A:00:00:00:00:01", hostname="tablet-salon")) == OTHER
+
+
+def test_ip_reused_by_another_identity_is_not_forgotten_with_the_first():
+    resolver = DeviceIdentityResolver()
+    resolver.learn(rotated(OLD, ip="192.168.1.50"))
+    resolver.learn(rotated(OTHER, ip="192.168.1.50"))
+
+    resolver.forget(OLD)
+
+    assert resolver.resolve(rotated(NEW, ip="192.168.1.50")) == OTHER
+
+
+def test_ambiguous_signal_is_not_used():
+    resolver = DeviceIdentityResolver()
+    resolver.learn(rotated(OLD, hostname="laptop-juan"))
+    resolver.learn(rotated(OTHER, ip="192.168.1.60", hostname="laptop-juan"))
+    resolver.forget(OTHER)
+
+    assert resolver.resolve(rotated(NEW, ip="192.168.1.70", hostname="laptop-juan")) is None
+
+
+def test_load_aliases_builds_reverse_map():
+    resolver = DeviceIdentityResolver()
+    resolver.load_aliases({NEW: OLD, NEWER: OLD})
+
+    resolver.forget(OLD)
+
+    assert resolver.aliases == {}
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(network, "config", dataclasses.replace(network.config, NETWORK_CACHE_MAX=3))
+    service = NetworkService()
+    service._store = DeviceHistoryStore(tmp_path / "history.db")
+    yield service
+    service._store.close()
+
+
+def test_eviction_skips_devices_with_unsaved_changes(service):
+    for n in range(1, 6):
+        device = service._merge_device(NetworkDevice(
+            mac=f"AA:BB:CC:00:00:{n:02X}", ip=f"192.168.1.{n}", vendor="x", last_seen=n))
+        device.is_online = n > 4
+        service._index.update(device)
+
+    # Nada guardado aún: no se desaloja aunque sobren
+    service._evict_cache()
+    assert len(service._cache) == 5
+
+    service._save_history()
+    service._evict_cache()
+    assert sorted(service._cache) == ["AA:BB:CC:00:00:03", "AA:BB:CC:00:00:04", "AA:BB:CC:00:00:05"]
+    assert service._store.count() == 5
+
+    # Lo desalojado se puede recargar del historial sin perder datos
+    assert service.get_device_by_mac("AA:BB:CC:00:00:01").ip == "192.168.1.1"
@@ -0,0 +1,139 @@
+"""
+Memoria del historial cargado: NetworkDevice con __slots__ frente al
+dataclass anterior, construidos desde las mismas filas de SQLite.
+
+Ejecutado como script mide 50k dispositivos con tracemalloc:
+
+    python tests/test_device_memory.py
+"""
+import gc
+import json
+import random
+import sqlite3
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+if __name__ == "__main__":
+    import conftest  # noqa: F401  (entorno y sys.path como en pytest)
+
+from services.network import (
+    OUI_DATABASE, PORT_FINGERPRINTS, DeviceHistoryStore, NetworkDevice, NetworkService,
+)
+
+BENCH_DEVICES = 50_000
+
+
+@dataclass
+class LegacyDevice:
+    """NetworkDevice anterior: dataclass con listas y datetime por instancia."""
+    mac: str
+    ip: str
+    hostname: str = ""
+    vendor: str = ""
+    os_guess: str = ""
+    open_ports: List[int] = field(default_factory=list)
+    last_seen: datetime = field(default_factory=datetime.now)
+    first_seen: datetime = field(default_factory=datetime.now)
+    times_seen: int = 1
+    source: str = ""
+    is_online: bool = True
+    mdns_name: str = ""
+    mdns_services: List[str] = field(default_factory=list)
+    ssdp_info: str = ""
+    detected_type: str = ""
+    _classification: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.mac = NetworkDevice._format_mac(self.mac)
+
+
+def legacy_from_row(row: tuple) -> LegacyDevice:
+    mac, ip, hostname, vendor, os_guess, open_ports, first_seen, last_seen, times_seen = row
+    return LegacyDevice(
+        mac=mac,
+        ip=ip,
+        hostname=hostname,
+        vendor=vendor,
+        os_guess=os_guess,
+        open_ports=json.loads(open_ports),
+        first_seen=datetime.fromtimestamp(first_seen),
+        last_seen=datetime.fromtimestamp(last_seen),
+        times_seen=times_seen,
+        is_online=False,
+    )
+
+
+def history_db(count: int, seed: int = 22) -> sqlite3.Connection:
+    """Historial en memoria con el esquema real y `count` dispositivos."""
+    rng = random.Random(seed)
+    vendors = sorted(set(OUI_DATABASE.values()))
+    ports = list(PORT_FINGERPRINTS)
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(DeviceHistoryStore.SCHEMA)
+    conn.executemany(
+        "INSERT INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                ':'.join(f"{b:02X}" for b in i.to_bytes(6, 'big')),
+                f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+                f"host-{i}" if rng.random() < 0.7 else "",
+                rng.choice(vendors),
+                rng.choice(["", "Linux", "Windows", "iOS", "Android"]),
+                json.dumps(sorted(rng.sample(ports, rng.choice([0, 0, 1, 2, 3])))),
+                1_700_000_000 + rng.randrange(10_000_000),
+                1_710_000_000 + rng.randrange(10_000_000),
+                rng.randint(1, 500),
+            )
+            for i in range(count)
+        ),
+    )
+    return conn
+
+
+def retained_bytes(conn: sqlite3.Connection, build) -> int:
+    """Memoria que siguen ocupando los dispositivos tras cargar el historial."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        rows = conn.execute("SELECT * FROM devices").fetchall()
+        devices = [build(row) for row in rows]
+        del rows
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(devices) == conn.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+    return current
+
+
+def test_slotted_device_loads_same_fields_as_dataclass():
+    conn = history_db(50)
+    for row in conn.execute("SELECT * FROM devices"):
+        old, new = legacy_from_row(row), NetworkService._device_from_row(row)
+        assert (new.mac, new.ip, new.hostname, new.vendor, new.os_guess, list(new.open_ports),
+                new.first_seen, new.last_seen, new.times_seen, new.is_online) == \
+               (old.mac, old.ip, old.hostname, old.vendor, old.os_guess, old.open_ports,
+                old.first_seen, old.last_seen, old.times_seen, old.is_online)
+
+
+def test_slotted_device_uses_less_memory():
+    conn = history_db(5_000)
+    legacy = retained_bytes(conn, legacy_from_row)
+    slotted = retained_bytes(conn, NetworkService._device_from_row)
+    assert slotted < legacy * 0.75, (legacy, slotted)
+
+
+def benchmark(count: int = BENCH_DEVICES):
+    conn = history_db(count)
+    legacy = retained_bytes(conn, legacy_from_row)
+    slotted = retained_bytes(conn, NetworkService._device_from_row)
+    print(f"{count} dispositivos cargados del historial (tracemalloc)")
+    print(f"  dataclass: {legacy / 2**20:.1f} MiB ({legacy / count:.0f} B/dispositivo)")
+    print(f"  __slots__: {slotted / 2**20:.1f} MiB ({slotted / count:.0f} B/dispositivo)")
+    print(f"  ahorro: {1 - slotted / legacy:.0%}")
+
+
+if __name__ == "__main__":
+    benchmark()
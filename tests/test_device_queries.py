@@ -0,0 +1,55 @@
+"""Consultas de NetworkService servidas desde los índices del cache y el historial."""
+import pytest
+
+from services.network import DeviceHistoryStore, NetworkDevice, NetworkService
+
+NOW = 1_760_000_000
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = NetworkService()
+    service._store = DeviceHistoryStore(tmp_path / "history.db")
+    yield service
+    service._store.close()
+
+
+def device(n: int, online: bool, **kwargs) -> NetworkDevice:
+    return NetworkDevice(
+        mac=f"AA:BB:CC:00:00:{n:02X}", ip=f"192.168.1.{n}", is_online=online,
+        last_seen=NOW - n * 60, first_seen=NOW - 86400, **kwargs,
+    )
+
+
+def populate(service: NetworkService):
+    # En cache: 3 online (n=1..3) y 2 offline (n=4, 5)
+    for n in range(1, 6):
+        vendor = "Apple, Inc." if n < 3 else "Espressif Inc."
+        merged = service._merge_device(device(n, online=n <= 3, vendor=vendor))
+        merged.is_online = n <= 3
+        service._index.update(merged)
+    # Solo en el historial: 30 más antiguos
+    service._store.upsert_many([service._history_row(device(n, online=False, vendor="Espressif Inc."))
+                                for n in range(6, 36)])
+
+
+def test_offline_devices_are_limited_and_most_recent_first(service):
+    populate(service)
+
+    offline = service.get_offline_devices(limit=4)
+
+    assert [d.ip for d in offline] == ["192.168.1.4", "192.168.1.5", "192.168.1.6", "192.168.1.7"]
+    assert not any(d.is_online for d in offline)
+    assert service.count_offline_devices() == 32
+    # Lo leído del historial no entra en el cache
+    assert len(service._cache) == 5
+
+
+def test_statistics_count_online_by_type_and_vendor(service):
+    populate(service)
+
+    stats = service.get_statistics()
+
+    assert (stats["total_known"], stats["online"], stats["offline"]) == (35, 3, 32)
+    assert sum(stats["by_type"].values()) == 3
+    assert stats["by_vendor"] == {"Apple, Inc.": 2, "Espressif Inc.": 1}
@@ -0,0 +1,213 @@
+"""DnsResolver contra un servidor DNS stub local (UDP + TCP)."""
+import asyncio
+import struct
+
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+import services.dns_resolver as dns_resolver
+from services.dns_resolver import LOOKUP_TYPES, DnsResolver
+
+ZONE = {
+    "example.test": {
+        "A": (300, ["192.0.2.1", "192.0.2.2"]),
+        "AAAA": (300, ["2001:db8::1"]),
+        "MX": (3600, ["20 mx-b.example.test.", "10 mx-a.example.test."]),
+        "NS": (86400, ["ns1.example.test."]),
+        "CNAME": (120, ["alias.example.test."]),
+        "TXT": (60, ['"v=spf1 -all"']),
+    },
+    "big.test": {
+        "A": (30, [f"198.51.100.{i}" for i in range(1, 40)]),
+    },
+}
+
+# TTL del SOA y mínimo negativo: el resolver debe usar el menor (RFC 2308)
+SOA = "ns1.test. admin.test. 1 3600 600 86400 60"
+
+
+def build_response(query: dns.message.Message, udp: bool) -> dns.message.Message:
+    response = dns.message.make_response(query)
+    question = query.question[0]
+    name = question.name.to_text().rstrip('.')
+    rtype = dns.rdatatype.to_text(question.rdtype)
+
+    if name == "big.test" and udp:
+        response.flags |= dns.flags.TC
+        return response
+
+    records = ZONE.get(name)
+    if records is None:
+        response.set_rcode(dns.rcode.NXDOMAIN)
+        response.authority.append(dns.rrset.from_text("test.", 600, "IN", "SOA", SOA))
+        return response
+    if rtype in records:
+        ttl, values = records[rtype]
+        response.answer.append(dns.rrset.from_text(question.name, ttl, "IN", rtype, *values))
+    return response
+
+
+class StubDns(asyncio.DatagramProtocol):
+    """Responde desde ZONE y anota (origen, id, nombre, tipo) de cada consulta."""
+
+    def __init__(self):
+        self.queries = []
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        query = dns.message.from_wire(data)
+        question = query.question[0]
+        self.queries.append((addr, query.id, question.name.to_text(), dns.rdatatype.to_text(question.rdtype)))
+        self.transport.sendto(build_response(query, udp=True).to_wire(), addr)
+
+
+class StubServer:
+    """Stub UDP y TCP en el mismo puerto de 127.0.0.1."""
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self.tcp_queries = 0
+        self.tcp = await asyncio.start_server(self._handle_tcp, "127.0.0.1", 0)
+        self.port = self.tcp.sockets[0].getsockname()[1]
+        self.udp_transport, self.udp = await loop.create_datagram_endpoint(
+            StubDns, local_addr=("127.0.0.1", self.port)
+        )
+        return self
+
+    async def _handle_tcp(self, reader, writer):
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+        query = dns.message.from_wire(await reader.readexactly(length))
+        self.tcp_queries += 1
+        wire = build_response(query, udp=False).to_wire()
+        writer.write(struct.pack('!H', len(wire)) + wire)
+        await writer.drain()
+        writer.close()
+
+    async def __aexit__(self, *exc):
+        self.udp_transport.close()
+        self.tcp.close()
+        await self.tcp.wait_closed()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_lookup_concurrent_over_one_socket():
+    async def scenario():
+        async with StubServer() as stub:
+            resolver = DnsResolver(server="127.0.0.1", port=stub.port, timeout=1.0)
+            try:
+                result = await resolver.lookup("example.test")
+            finally:
+                resolver.close()
+            return stub, result
+
+    stub, result = run(scenario())
+    queries = stub.udp.queries
+    assert sorted(q[3] for q in queries) == sorted(LOOKUP_TYPES)
+    # Un único socket de origen, consultas emparejadas por ID distintos
+    assert len({q[0] for q in queries}) == 1
+    assert len({q[1] for q in queries}) == len(LOOKUP_TYPES)
+
+    assert result.server == "127.0.0.1"
+    assert result.cached == 0
+    assert sorted(result["A"]) == ["192.0.2.1", "192.0.2.2"]
+    assert result["AAAA"] == ["2001:db8::1"]
+    assert result["NS"] == ["ns1.example.test"]
+    assert result["CNAME"] == ["alias.example.test"]
+    assert result["TXT"] == ["v=spf1 -all"]
+    assert {rtype: answer.ttl for rtype, answer in result.records.items()} == {
+        "A": 300, "AAAA": 300, "MX": 3600, "NS": 86400, "CNAME": 120, "TXT": 60,
+    }
+
+
+def test_mx_sorted_by_preference():
+    async def scenario():
+        async with StubServer() as stub:
+            resolver = DnsResolver(server="127.0.0.1", port=stub.port, timeout=1.0)
+            try:
+                return await resolver.query("example.test", "MX")
+            finally:
+                resolver.close()
+
+    assert run(scenario()).values == ["mx-a.example.test", "mx-b.example.test"]
+
+
+def test_second_lookup_is_served_from_cache():
+    async def scenario():
+        async with StubServer() as stub:
+            resolver = DnsResolver(server="127.0.0.1", port=stub.port, timeout=1.0)
+            try:
+                await resolver.lookup("example.test")
+                sent = len(stub.udp.queries)
+                second = await resolver.lookup("example.test")
+            finally:
+                resolver.close()
+            return sent, len(stub.udp.queries), second
+
+    sent, sent_after, second = run(scenario())
+    assert sent_after == sent
+    assert second.cached == len(LOOKUP_TYPES) == 6
+    assert sorted(second["A"]) == ["192.0.2.1", "192.0.2.2"]
+    assert 0 < second.records["A"].ttl <= 300
+
+
+def test_negative_ttl_from_soa():
+    async def scenario():
+        async with StubServer() as stub:
+            resolver = DnsResolver(server="127.0.0.1", port=stub.port, timeout=1.0)
+            try:
+                answer = await resolver.query("missing.test", "A")
+                cached = resolver._is_cached("missing.test", "A")
+            finally:
+                resolver.close()
+            return answer, cached
+
+    answer, cached = run(scenario())
+    assert answer.rcode == "NXDOMAIN"
+    assert answer.values == []
+    assert answer.ttl == 60      # min(TTL del SOA, campo minimum)
+    assert cached
+
+
+def test_truncated_response_retried_over_tcp():
+    async def scenario():
+        async with StubServer() as stub:
+            resolver = DnsResolver(server="127.0.0.1", port=stub.port, timeout=1.0)
+            try:
+                answer = await resolver.query("big.test", "A")
+            finally:
+                resolver.close()
+            return stub.tcp_queries, answer
+
+    tcp_queries, answer = run(scenario())
+    assert tcp_queries == 1
+    assert len(answer.values) == 39
+    assert answer.ttl == 30
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(dns_resolver, "CACHE_MAX_ENTRIES", 4)
+
+    async def scenario():
+        async with StubServer() as stub:
+            resolver = DnsResolver(server="127.0.0.1", port=stub.port, timeout=1.0)
+            try:
+                for i in range(10):
+                    await resolver.query(f"host{i}.test", "A")
+            finally:
+                resolver.close()
+            return resolver
+
+    resolver = run(scenario())
+    assert len(resolver._cache) == 4
+    # Se conservan los más recientes
+    assert ("host9.test", "A") in resolver._cache
+    assert ("host0.test", "A") not in resolver._cache
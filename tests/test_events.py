@@ -0,0 +1,76 @@
+"""EventBus: entrega síncrona/asíncrona, errores aislados y drain() al apagar."""
+import asyncio
+
+from utils.events import EventBus
+
+
+def test_sync_and_async_subscribers():
+    bus = EventBus()
+    received = []
+
+    async def slow(event):
+        await asyncio.sleep(0.01)
+        received.append(("async", event))
+
+    async def run():
+        bus.subscribe("topic", lambda e: received.append(("sync", e)))
+        bus.subscribe("topic", slow)
+        assert bus.publish("topic", 1) == 2
+        # El síncrono ya se ejecutó; el asíncrono sigue pendiente
+        assert received == [("sync", 1)]
+        await bus.drain()
+
+    asyncio.run(run())
+    assert received == [("sync", 1), ("async", 1)]
+
+
+def test_failing_subscriber_does_not_stop_the_rest():
+    bus = EventBus()
+    received = []
+
+    def broken(event):
+        raise RuntimeError("boom")
+
+    async def broken_async(event):
+        raise RuntimeError("boom")
+
+    async def run():
+        bus.subscribe("topic", broken)
+        bus.subscribe("topic", broken_async)
+        bus.subscribe("topic", received.append)
+        bus.publish("topic", "x")
+        await bus.drain()
+
+    asyncio.run(run())
+    assert received == ["x"]
+
+
+def test_drain_waits_for_tasks_started_while_draining():
+    bus = EventBus()
+    received = []
+
+    async def relay(event):
+        await asyncio.sleep(0)
+        bus.publish("second", event)
+
+    async def second(event):
+        await asyncio.sleep(0.01)
+        received.append(event)
+
+    async def run():
+        bus.subscribe("first", relay)
+        bus.subscribe("second", second)
+        bus.publish("first", "e")
+        await bus.drain()
+
+    asyncio.run(run())
+    assert received == ["e"]
+
+
+def test_unsubscribe():
+    bus = EventBus()
+    received = []
+    unsubscribe = bus.subscribe("topic", received.append)
+    unsubscribe()
+    assert bus.publish("topic", 1) == 0
+    assert received == []
@@ -0,0 +1,57 @@
+"""FileLeaseSource: caché del parseo de dhcp.leases con inotify."""
+import asyncio
+
+import pytest
+
+from services.network import FileLeaseSource
+
+LEASE_A = "1700000000 aa:bb:cc:00:00:01 192.168.1.20 phone 01:aa:bb:cc:00:00:01\n"
+LEASE_B = "1700000000 aa:bb:cc:00:00:02 192.168.1.21 laptop *\n"
+
+
+async def settle():
+    """Deja que el loop procese los eventos inotify pendientes."""
+    await asyncio.sleep(0.05)
+
+
+def test_reparses_only_after_changes(tmp_path):
+    path = tmp_path / "dhcp.leases"
+    path.write_text(LEASE_A)
+
+    async def run():
+        source = FileLeaseSource(str(path))
+        try:
+            first = await source.leases()
+            assert [l.hostname for l in first] == ["phone"]
+            await settle()
+            assert await source.leases() is first
+
+            path.write_text(LEASE_A + LEASE_B)
+            await settle()
+            assert [l.hostname for l in await source.leases()] == ["phone", "laptop"]
+        finally:
+            source.close()
+
+    asyncio.run(run())
+
+
+def test_failed_reparse_is_retried_without_new_event(tmp_path):
+    path = tmp_path / "dhcp.leases"
+    path.write_text(LEASE_A)
+
+    async def run():
+        source = FileLeaseSource(str(path))
+        try:
+            await source.leases()
+            path.unlink()
+            await settle()
+            with pytest.raises(FileNotFoundError):
+                await source.leases()
+
+            # Vuelve sin dar tiempo al loop a entregar el evento de inotify
+            path.write_text(LEASE_B)
+            assert [l.hostname for l in await source.leases()] == ["laptop"]
+        finally:
+            source.close()
+
+    asyncio.run(run())
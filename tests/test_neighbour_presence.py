@@ -0,0 +1,182 @@
+"""Presencia por netlink: flujos RTM_NEWNEIGH/RTM_DELNEIGH reproducidos -> ScanDelta."""
+import asyncio
+
+import pytest
+
+import services.network as network
+from services.network import (
+    NETWORK_DELTA, NUD_DELAY, NUD_FAILED, NUD_PERMANENT, NUD_REACHABLE, NUD_STALE,
+    RTM_DELNEIGH, DeviceHistoryStore, NetworkService, ReplayNeighbourSource,
+    build_neighbour_message, parse_neighbour_messages,
+)
+
+PHONE = "AA:BB:CC:00:00:01"
+LAPTOP = "AA:BB:CC:00:00:02"
+
+
+class RecordingPinger:
+    """Sustituye al ICMP real: anota a quién se sondea."""
+
+    def __init__(self):
+        self.probed = []
+
+    async def ping(self, host, count=1, timeout=1.0):
+        self.probed.append(host)
+        return None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = NetworkService()
+    service._store = DeviceHistoryStore(tmp_path / "history.db")
+    service._pinger = RecordingPinger()
+    yield service
+    service._store.close()
+
+
+def replay(service: NetworkService, messages):
+    """Reproduce los mensajes y devuelve los ScanDelta publicados."""
+    deltas = []
+    service.events.subscribe(NETWORK_DELTA, deltas.append)
+
+    async def run():
+        source = ReplayNeighbourSource(messages)
+        assert service.start_neighbour_listener(source)
+        await source.done.wait()
+        await asyncio.gather(*service._probe_tasks)
+        service.stop_neighbour_listener()
+
+    asyncio.run(run())
+    return deltas
+
+
+def summary(delta):
+    return {
+        'joined': [d.mac for d in delta.joined],
+        'left': [d.mac for d in delta.left],
+        'ip_changed': [(d.mac, d.ip, old) for d, old in delta.ip_changed],
+    }
+
+
+def test_reachable_joins_and_failed_leaves(service):
+    deltas = replay(service, [
+        build_neighbour_message("192.168.1.20", PHONE, NUD_REACHABLE),
+        build_neighbour_message("192.168.1.20", PHONE, NUD_REACHABLE),   # refresco: sin delta
+        build_neighbour_message("192.168.1.20", PHONE, NUD_FAILED),
+    ])
+
+    assert [summary(d) for d in deltas] == [
+        {'joined': [PHONE], 'left': [], 'ip_changed': []},
+        {'joined': [], 'left': [PHONE], 'ip_changed': []},
+    ]
+    assert all(d.source == "netlink" for d in deltas)
+    assert not service.get_device_by_mac(PHONE).is_online
+
+
+def test_stale_only_probes(service):
+    deltas = replay(service, [
+        build_neighbour_message("192.168.1.20", PHONE, NUD_STALE),
+        build_neighbour_message("192.168.1.20", PHONE, NUD_DELAY),
+    ])
+
+    assert deltas == []
+    assert service.get_device_by_mac(PHONE) is None
+    # Una sola sonda por IP dentro del intervalo
+    assert service._pinger.probed == ["192.168.1.20"]
+
+
+def test_stale_then_probe_outcome(service):
+    deltas = replay(service, [
+        build_neighbour_message("192.168.1.20", PHONE, NUD_STALE),
+        build_neighbour_message("192.168.1.20", PHONE, NUD_REACHABLE),   # la sonda respondió
+        build_neighbour_message("192.168.1.21", LAPTOP, NUD_REACHABLE),
+        build_neighbour_message("192.168.1.21", LAPTOP, NUD_STALE),
+        build_neighbour_message("192.168.1.21", LAPTOP, NUD_FAILED),     # la sonda no
+    ])
+
+    assert [summary(d) for d in deltas] == [
+        {'joined': [PHONE], 'left': [], 'ip_changed': []},
+        {'joined': [LAPTOP], 'left': [], 'ip_changed': []},
+        {'joined': [], 'left': [LAPTOP], 'ip_changed': []},
+    ]
+
+
+def test_ip_change_of_online_device(service):
+    deltas = replay(service, [
+        build_neighbour_message("192.168.1.20", PHONE, NUD_REACHABLE),
+        build_neighbour_message("192.168.1.33", PHONE, NUD_REACHABLE),
+        # La entrada vieja desaparece después: ya no es la IP del dispositivo
+        build_neighbour_message("192.168.1.20", PHONE, NUD_FAILED),
+    ])
+
+    assert [summary(d) for d in deltas] == [
+        {'joined': [PHONE], 'left': [], 'ip_changed': []},
+        {'joined': [], 'left': [], 'ip_changed': [(PHONE, "192.168.1.33", "192.168.1.20")]},
+    ]
+    assert service.get_device_by_mac(PHONE).is_online
+
+
+def test_delneigh_and_foreign_networks(service):
+    deltas = replay(service, [
+        build_neighbour_message("192.168.1.40", msg_type=RTM_DELNEIGH),              # desconocido
+        build_neighbour_message("10.9.9.9", LAPTOP, NUD_REACHABLE),                  # fuera de la LAN
+        build_neighbour_message("192.168.1.40", LAPTOP, NUD_PERMANENT),
+        build_neighbour_message("192.168.1.40", LAPTOP, msg_type=RTM_DELNEIGH),
+    ])
+
+    assert [summary(d) for d in deltas] == [
+        {'joined': [LAPTOP], 'left': [], 'ip_changed': []},
+        {'joined': [], 'left': [LAPTOP], 'ip_changed': []},
+    ]
+
+
+def feed(service: NetworkService, *messages):
+    for message in messages:
+        for event in parse_neighbour_messages(message):
+            service._on_neighbour_event(event)
+
+
+def age_probes(service: NetworkService, seconds: float):
+    for ip in service._neighbour_probes:
+        service._neighbour_probes[ip] -= seconds
+
+
+def test_online_neighbours_are_probed_less_often(service):
+    async def run():
+        feed(service,
+             build_neighbour_message("192.168.1.20", PHONE, NUD_REACHABLE),
+             build_neighbour_message("192.168.1.20", PHONE, NUD_STALE),
+             build_neighbour_message("192.168.1.21", LAPTOP, NUD_STALE))
+        age_probes(service, 60)
+        # Pasado el intervalo corto solo se vuelve a sondear al que no está online
+        feed(service,
+             build_neighbour_message("192.168.1.20", PHONE, NUD_STALE),
+             build_neighbour_message("192.168.1.21", LAPTOP, NUD_STALE))
+        age_probes(service, network.NEIGHBOUR_ONLINE_PROBE_INTERVAL)
+        feed(service, build_neighbour_message("192.168.1.20", PHONE, NUD_STALE))
+        await asyncio.gather(*service._probe_tasks)
+
+    asyncio.run(run())
+    assert service._pinger.probed == ["192.168.1.20", "192.168.1.21", "192.168.1.21", "192.168.1.20"]
+
+
+def test_probe_memory_is_bounded(service, monkeypatch):
+    monkeypatch.setattr(network, "NEIGHBOUR_PROBES_MAX", 8)
+
+    async def run():
+        for i in range(1, 21):
+            service._probe_neighbour(f"192.168.1.{i}")
+        await asyncio.gather(*service._probe_tasks)
+        assert list(service._neighbour_probes) == [f"192.168.1.{i}" for i in range(13, 21)]
+
+        # Las entradas que ya no limitan ninguna sonda se olvidan aunque sobre sitio
+        age_probes(service, network.NEIGHBOUR_ONLINE_PROBE_INTERVAL + 1)
+        service._probe_neighbour("192.168.1.100")
+        await asyncio.gather(*service._probe_tasks)
+        assert list(service._neighbour_probes) == ["192.168.1.100"]
+
+    asyncio.run(run())
+    assert len(service._pinger.probed) == 21
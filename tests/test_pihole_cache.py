@@ -0,0 +1,77 @@
+"""Cache de respuestas GET de PiholeService: peticiones compartidas e invalidación."""
+import asyncio
+
+from services.pihole import PiholeService
+
+
+class ControlledApi:
+    """Sustituye a _fetch_async: cada GET espera a que el test lo libere."""
+
+    def __init__(self):
+        self.calls = []
+        self.pending = []
+
+    async def fetch(self, endpoint):
+        self.calls.append(endpoint)
+        gate = asyncio.get_running_loop().create_future()
+        self.pending.append(gate)
+        return await gate
+
+    def release(self, index, data):
+        self.pending[index].set_result(data)
+
+
+async def started(api, count):
+    """Cede al loop hasta que haya `count` GET en vuelo."""
+    for _ in range(20):
+        if len(api.pending) >= count:
+            return
+        await asyncio.sleep(0)
+    raise AssertionError(f"{len(api.pending)} peticiones en vuelo, se esperaban {count}")
+
+
+def make_service():
+    service = PiholeService()
+    api = ControlledApi()
+    service._fetch_async = api.fetch
+    return service, api
+
+
+def test_concurrent_gets_share_one_request():
+    service, api = make_service()
+
+    async def run():
+        first = asyncio.ensure_future(service._api_get_async("stats/summary"))
+        second = asyncio.ensure_future(service._api_get_async("stats/summary"))
+        await started(api, 1)
+        api.release(0, {"queries": 1})
+        assert await first == await second == {"queries": 1}
+        assert await service._api_get_async("stats/summary") == {"queries": 1}
+
+    asyncio.run(run())
+    assert api.calls == ["stats/summary"]
+    assert service.cache_stats() == {"hits": 2, "misses": 1, "entries": 1}
+
+
+def test_invalidate_drops_inflight_request():
+    service, api = make_service()
+
+    async def run():
+        stale = asyncio.ensure_future(service._api_get_async("dns/blocking"))
+        await started(api, 1)
+
+        # Cambio de estado mientras la lectura anterior sigue en vuelo
+        service.invalidate_cache()
+        fresh = asyncio.ensure_future(service._api_get_async("dns/blocking"))
+        await started(api, 2)
+        assert api.calls == ["dns/blocking", "dns/blocking"]
+
+        api.release(1, {"blocking": "disabled"})
+        api.release(0, {"blocking": "enabled"})
+        # Quien esperaba la vieja recibe su respuesta, pero no queda en cache
+        assert await stale == {"blocking": "enabled"}
+        assert await fresh == {"blocking": "disabled"}
+        assert await service._api_get_async("dns/blocking") == {"blocking": "disabled"}
+
+    asyncio.run(run())
+    assert len(api.calls) == 2
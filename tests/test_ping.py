@@ -0,0 +1,61 @@
+"""Resolución de destinos de ping/traceroute y elección del camino ICMP o `ping`."""
+import asyncio
+import socket
+
+import pytest
+
+from services.network import IcmpPinger, PingResult, resolve_ipv4
+
+RECORDS = {
+    "dual.test": [(socket.AF_INET, "192.0.2.10"), (socket.AF_INET6, "2001:db8::10")],
+    "v6only.test": [(socket.AF_INET6, "2001:db8::20")],
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_dns(monkeypatch):
+    def getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+        found = [
+            (fam, type, 0, '', (addr, 0) if fam == socket.AF_INET else (addr, 0, 0, 0))
+            for fam, addr in RECORDS.get(host, [])
+            if family in (0, fam)
+        ]
+        if not found:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return found
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+
+
+def test_resolve_ipv4():
+    async def run():
+        assert await resolve_ipv4("192.0.2.1") == "192.0.2.1"
+        assert await resolve_ipv4("2001:db8::1") is None
+        assert await resolve_ipv4("dual.test") == "192.0.2.10"
+        assert await resolve_ipv4("v6only.test") is None
+        with pytest.raises(socket.gaierror):
+            await resolve_ipv4("missing.test")
+
+    asyncio.run(run())
+
+
+def test_ipv6_only_host_falls_back_to_ping_command():
+    pinger = IcmpPinger()
+    calls = []
+
+    async def subprocess(target, count, interval, timeout):
+        calls.append(target)
+        return PingResult.from_rtts(target, "2001:db8::20", count, [1.0] * count)
+
+    pinger._ping_subprocess = subprocess
+
+    async def run():
+        v6 = await pinger.ping("v6only.test", count=2)
+        missing = await pinger.ping("missing.test", count=2)
+        return v6, missing
+
+    v6, missing = asyncio.run(run())
+
+    assert calls == ["v6only.test"]
+    assert v6.ok
+    assert not missing.ok and missing.sent == 2
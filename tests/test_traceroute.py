@@ -0,0 +1,59 @@
+"""UdpTracer y el parseo de `traceroute -n`."""
+import asyncio
+
+from services.network import (
+    ICMP_DEST_UNREACH, ICMP_TIME_EXCEEDED, TracerouteHop, UdpTracer, parse_traceroute_output,
+)
+
+TARGET = "203.0.113.9"
+
+
+def test_only_port_unreachable_from_target_reaches_it():
+    hop = UdpTracer._hop(6, TARGET, TARGET, ICMP_DEST_UNREACH, 3, 12.5)
+    assert hop == TracerouteHop(6, TARGET, 12.5, reached=True)
+
+
+def test_time_exceeded_is_a_plain_hop():
+    hop = UdpTracer._hop(2, TARGET, "10.0.0.1", ICMP_TIME_EXCEEDED, 0, 3.0)
+    assert (hop.reached, hop.flag) == (False, "")
+
+
+def test_other_unreachables_are_flagged_not_reached():
+    cases = {
+        ("10.0.0.1", 1): "!H",      # host inalcanzable según un router
+        ("10.0.0.1", 0): "!N",
+        ("10.0.0.1", 13): "!X",     # filtrado administrativamente
+        (TARGET, 1): "!H",          # incluso si lo envía el destino
+        (TARGET, 2): "!P",
+        ("10.0.0.1", 3): "",        # port-unreachable de otra dirección
+    }
+    for (offender, code), flag in cases.items():
+        hop = UdpTracer._hop(4, TARGET, offender, ICMP_DEST_UNREACH, code, 8.0)
+        assert (hop.reached, hop.flag) == (False, flag), (offender, code)
+
+
+def test_trace_to_loopback():
+    async def run():
+        return [hop async for hop in UdpTracer(max_hops=5, wait=1.0).trace("127.0.0.1")]
+
+    hops = asyncio.run(run())
+
+    assert len(hops) == 1
+    assert (hops[0].hop, hops[0].ip, hops[0].reached, hops[0].flag) == (1, "127.0.0.1", True, "")
+
+
+def test_parse_traceroute_output_flags():
+    output = (
+        "traceroute to 203.0.113.9 (203.0.113.9), 15 hops max, 60 byte packets\n"
+        " 1  192.168.1.1  0.512 ms  0.470 ms  0.455 ms\n"
+        " 2  * * *\n"
+        " 3  10.0.0.1  9.871 ms !H  9.802 ms !H  9.799 ms !H\n"
+    )
+
+    hops = parse_traceroute_output(output)
+
+    assert [(h.hop, h.ip, h.rtt, h.flag) for h in hops] == [
+        (1, "192.168.1.1", 0.512, ""),
+        (2, "*", None, ""),
+        (3, "10.0.0.1", 9.871, "!H"),
+    ]
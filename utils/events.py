@@ -0,0 +1,67 @@
+"""Bus de eventos en proceso (pub/sub sobre asyncio)."""
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable, Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """
+    Publicación/suscripción por tema dentro del proceso.
+
+    Los suscriptores síncronos se llaman en el momento de publicar (el
+    estado que mantienen queda al día antes de que vuelva publish); los
+    asíncronos se lanzan como tareas del loop en curso.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Callable[[Any], Any]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def subscribe(self, topic: str, handler: Callable[[Any], Any]) -> Callable[[], None]:
+        """
+        Suscribe un handler (función o corrutina) a un tema.
+
+        Returns:
+            Función que cancela la suscripción
+        """
+        self._subscribers.setdefault(topic, []).append(handler)
+
+        def unsubscribe():
+            handlers = self._subscribers.get(topic, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+        return unsubscribe
+
+    def publish(self, topic: str, event: Any) -> int:
+        """
+        Entrega el evento a los suscriptores del tema.
+
+        Returns:
+            Número de suscriptores notificados
+        """
+        handlers = list(self._subscribers.get(topic, ()))
+        for handler in handlers:
+            try:
+                if inspect.iscoroutinefunction(handler):
+                    task = asyncio.get_running_loop().create_task(handler(event))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._task_done)
+                else:
+                    handler(event)
+            except Exception as e:
+                logger.error(f"Error en suscriptor de '{topic}': {e}")
+        return len(handlers)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error en suscriptor asíncrono: {task.exception()}")
+
+    async def drain(self):
+        """Espera a que terminen los suscriptores asíncronos en curso."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
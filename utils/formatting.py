@@ -1,7 +1,7 @@
 """Formateo de mensajes para Telegram."""
 import re
 from datetime import timedelta
-from typing import Optional
+from typing import List, Optional
 
 
 def escape_md(text: str) -> str:
@@ -155,6 +155,25 @@ def get_device_icon(vendor: str, hostname: str = "") -> str:
     return "📶"
 
 
+def sparkline(values: List[Optional[float]], low: Optional[float] = None, high: Optional[float] = None) -> str:
+    """Mini gráfico con bloques Unicode (huecos sin datos como espacio)."""
+    blocks = "▁▂▃▄▅▆▇█"
+    present = [v for v in values if v is not None]
+    if not present:
+        return ""
+    low = min(present) if low is None else low
+    high = max(present) if high is None else high
+    span = (high - low) or 1.0
+    chars = []
+    for v in values:
+        if v is None:
+            chars.append(" ")
+            continue
+        level = int((min(max(v, low), high) - low) / span * (len(blocks) - 1))
+        chars.append(blocks[level])
+    return "".join(chars)
+
+
 def get_temp_icon(temp: float) -> str:
     """Devuelve emoji según temperatura."""
     if temp >= 80:
@@ -0,0 +1,149 @@
+"""Registro IEEE OUI compacto (MA-L/MA-M/MA-S) consultado vía mmap."""
+import csv
+import io
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'POUI'
+VERSION = 1
+
+# (bits del prefijo, dígitos hex) del más largo al más corto: MA-S, MA-M, MA-L
+PREFIX_SIZES = ((36, 9), (28, 7), (24, 6))
+
+_HEADER = struct.Struct('<4sHxx3I')    # magic, versión, nº entradas por tabla
+_RECORD = struct.Struct('<QI')         # prefijo, offset del nombre
+
+
+def parse_ieee_csv(text: str) -> Iterator[Tuple[str, str]]:
+    """(prefijo hex, organización) de un CSV del registro IEEE (oui/mam/oui36.csv)."""
+    for row in csv.DictReader(io.StringIO(text)):
+        assignment = (row.get('Assignment') or '').strip().upper()
+        name = ' '.join((row.get('Organization Name') or '').split())
+        if assignment and name:
+            yield assignment, name
+
+
+def build_registry(entries: Iterable[Tuple[str, str]], path: Path) -> int:
+    """
+    Escribe el fichero binario: cabecera, tres tablas ordenadas de
+    (prefijo, offset) y los nombres internados (longitud + UTF-8).
+
+    Returns:
+        Número de prefijos escritos
+    """
+    tables: Dict[int, Dict[int, str]] = {digits: {} for _, digits in PREFIX_SIZES}
+    for prefix, name in entries:
+        prefix = prefix.replace(':', '').replace('-', '').upper()
+        if len(prefix) in tables:
+            tables[len(prefix)][int(prefix, 16)] = name
+
+    strings = bytearray()
+    offsets: Dict[str, int] = {}
+    records: List[bytes] = []
+    for _, digits in PREFIX_SIZES:
+        for value, name in sorted(tables[digits].items()):
+            if name not in offsets:
+                encoded = name.encode()[:255]
+                offsets[name] = len(strings)
+                strings += bytes([len(encoded)]) + encoded
+            records.append(_RECORD.pack(value, offsets[name]))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, *(len(tables[d]) for _, d in PREFIX_SIZES)))
+        f.writelines(records)
+        f.write(strings)
+    os.replace(tmp, path)
+    return len(records)
+
+
+class OuiRegistry:
+    """
+    Búsqueda de fabricante por MAC con el prefijo más largo (36/28/24 bits).
+
+    El fichero se proyecta con mmap y se consulta con búsqueda binaria:
+    no se carga en memoria y solo se tocan las páginas visitadas.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, *counts = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"{path}: formato OUI no reconocido")
+
+        self._tables: List[Tuple[int, int, int]] = []    # (dígitos, offset, nº entradas)
+        offset = _HEADER.size
+        for (_, digits), count in zip(PREFIX_SIZES, counts):
+            self._tables.append((digits, offset, count))
+            offset += count * _RECORD.size
+        self._strings = offset
+        self._names: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return sum(count for _, _, count in self._tables)
+
+    def _search(self, base: int, count: int, key: int) -> Optional[int]:
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value, name_offset = _RECORD.unpack_from(self._mm, base + mid * _RECORD.size)
+            if value == key:
+                return name_offset
+            if value < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _name(self, offset: int) -> str:
+        name = self._names.get(offset)
+        if name is None:
+            start = self._strings + offset
+            length = self._mm[start]
+            name = self._names[offset] = self._mm[start + 1:start + 1 + length].decode(errors='replace')
+        return name
+
+    def lookup(self, mac: str) -> str:
+        """Fabricante de la MAC ('' si no está registrada)."""
+        digits = mac.replace(':', '').replace('-', '').replace('.', '')
+        if len(digits) < 9:
+            return ""
+        try:
+            int(digits[:9], 16)
+        except ValueError:
+            return ""
+        for length, base, count in self._tables:
+            offset = self._search(base, count, int(digits[:length], 16))
+            if offset is not None:
+                return self._name(offset)
+        return ""
+
+    def close(self):
+        self._mm.close()
+
+
+_registries: Dict[str, Optional[OuiRegistry]] = {}
+
+
+def shared_registry(path: str) -> Optional[OuiRegistry]:
+    """Registro abierto una sola vez por proceso (None si no existe el fichero)."""
+    if path not in _registries:
+        registry = None
+        if path and os.path.exists(path):
+            try:
+                registry = OuiRegistry(Path(path))
+                logger.debug(f"Registro OUI cargado: {len(registry)} prefijos")
+            except (OSError, ValueError) as e:
+                logger.error(f"Error abriendo registro OUI {path}: {e}")
+        _registries[path] = registry
+    return _registries[path]